@@ -0,0 +1,292 @@
+# ann.py
+import asyncio
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from gestures import FRAME_DIM, normalize
+
+
+def spherical_kmeans(x: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    # k-means on the unit sphere (cosine); x rows are unit-length
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(x @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        empty = ~sums.any(axis=1)
+        if empty.any():  # re-seed empty clusters from random points
+            sums[empty] = x[rng.choice(len(x), size=int(empty.sum()), replace=False)]
+        centroids = normalize(sums).astype(np.float32)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index over unit-length vectors (cosine similarity).
+
+    Vectors are bucketed by their nearest of `nlist` centroids; a search only
+    scans the `nprobe` buckets whose centroids are closest to the query, so
+    nprobe trades recall for latency. Until `train_min` vectors exist the index
+    is a single bucket (exact search).
+    """
+
+    def __init__(self, dim: int = FRAME_DIM, nprobe: int = 8, train_min: int = 1024):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.train_min = train_min
+        self.centroids = np.zeros((1, dim), dtype=np.float32)
+        self.trained_at = 0          # vector count when the centroids were fitted
+        self._vecs: List[np.ndarray] = [np.zeros((16, dim), dtype=np.float32)]
+        self._ids: List[np.ndarray] = [np.zeros(16, dtype=np.int64)]
+        self._sizes: List[int] = [0]
+        self.meta: List[Tuple[str, str]] = []  # id -> (user_id, name)
+
+    def __len__(self) -> int:
+        return len(self.meta)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def _append(self, lst: int, vecs: np.ndarray, ids: np.ndarray) -> None:
+        size, n = self._sizes[lst], len(vecs)
+        cap = len(self._ids[lst])
+        if size + n > cap:  # amortised growth
+            new_cap = max(cap * 2, size + n)
+            grown_v = np.zeros((new_cap, self.dim), dtype=np.float32)
+            grown_i = np.zeros(new_cap, dtype=np.int64)
+            grown_v[:size], grown_i[:size] = self._vecs[lst][:size], self._ids[lst][:size]
+            self._vecs[lst], self._ids[lst] = grown_v, grown_i
+        self._vecs[lst][size:size + n] = vecs
+        self._ids[lst][size:size + n] = ids
+        self._sizes[lst] = size + n
+
+    def _all(self) -> Tuple[np.ndarray, np.ndarray]:
+        vecs = np.concatenate([v[:s] for v, s in zip(self._vecs, self._sizes)])
+        ids = np.concatenate([i[:s] for i, s in zip(self._ids, self._sizes)])
+        order = np.argsort(ids)
+        return vecs[order], ids[order]
+
+    def _reset_lists(self, nlist: int) -> None:
+        self._vecs = [np.zeros((16, self.dim), dtype=np.float32) for _ in range(nlist)]
+        self._ids = [np.zeros(16, dtype=np.int64) for _ in range(nlist)]
+        self._sizes = [0] * nlist
+
+    def _assign(self, vecs: np.ndarray, ids: np.ndarray) -> None:
+        lists = np.argmax(vecs @ self.centroids.T, axis=1) if self.nlist > 1 else np.zeros(len(vecs), dtype=np.int64)
+        for lst in np.unique(lists):
+            mask = lists == lst
+            self._append(int(lst), vecs[mask], ids[mask])
+
+    def train(self) -> None:
+        # (re)fit ~sqrt(n) centroids and redistribute every stored vector
+        vecs, ids = self._all()
+        n = len(vecs)
+        if n < self.train_min:
+            return
+        nlist = int(np.clip(np.sqrt(n), 8, 4096))
+        sample = vecs if n <= 64 * nlist else vecs[np.random.default_rng(0).choice(n, 64 * nlist, replace=False)]
+        self.centroids = spherical_kmeans(sample, nlist)
+        self._reset_lists(nlist)
+        self._assign(vecs, ids)
+        self.trained_at = n
+
+    def needs_training(self) -> bool:
+        # the data has outgrown the centroids (or first crosses train_min)
+        return len(self) >= self.train_min and len(self) >= 4 * max(self.trained_at, self.train_min // 4)
+
+    def add(self, vecs: np.ndarray, meta: Sequence[Tuple[str, str]], train: bool = True) -> None:
+        # train=False leaves a due refit to the caller (k-means is too slow for the event loop)
+        vecs = normalize(np.asarray(vecs, dtype=np.float32).reshape(-1, self.dim))
+        ids = np.arange(len(self.meta), len(self.meta) + len(vecs), dtype=np.int64)
+        self.meta.extend(meta)
+        self._assign(vecs, ids)
+        if train and self.needs_training():
+            self.train()
+
+    def search(self, query: np.ndarray, k: int = 5, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        if not len(self):
+            return []
+        q = normalize(np.asarray(query, dtype=np.float32).reshape(-1))
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        if nprobe < self.nlist:
+            probe = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+        else:
+            probe = range(self.nlist)
+        scores, ids = [], []
+        for lst in probe:
+            size = self._sizes[lst]
+            if size:
+                scores.append(self._vecs[lst][:size] @ q)
+                ids.append(self._ids[lst][:size])
+        if not scores:
+            return []
+        scores, ids = np.concatenate(scores), np.concatenate(ids)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def search_names(self, query: np.ndarray, k: int = 5, nprobe: Optional[int] = None) -> List[Dict]:
+        # best score per (user_id, name). Many samples of one sign can fill any fixed
+        # over-fetch, so widen it until there are k distinct signs or the probed lists run out
+        fetch = k * 4
+        while True:
+            hits = self.search(query, fetch, nprobe)
+            out: Dict[Tuple[str, str], float] = {}
+            for i, score in hits:
+                key = self.meta[i]
+                if key not in out:
+                    out[key] = score
+                if len(out) == k:
+                    break
+            if len(out) == k or len(hits) < fetch:
+                return [{"user_id": u, "name": n, "score": s} for (u, n), s in out.items()]
+            fetch *= 4
+
+    def snapshot(self) -> Dict:
+        # consistent copy of everything save() writes; cheap enough to take on the event loop
+        vecs, _ = self._all()
+        return {"centroids": self.centroids.copy(), "vecs": vecs, "trained_at": self.trained_at,
+                "meta": json.dumps(self.meta)}
+
+    @staticmethod
+    def write(path: str, snap: Dict) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, centroids=snap["centroids"], vecs=snap["vecs"], trained_at=snap["trained_at"],
+                     meta=np.array(snap["meta"]))
+        os.replace(tmp, path)
+
+    def save(self, path: str) -> None:
+        self.write(path, self.snapshot())
+
+    @classmethod
+    def load(cls, path: str, nprobe: int = 8, train_min: int = 1024) -> "IVFIndex":
+        with np.load(path) as data:
+            index = cls(data["centroids"].shape[1], nprobe, train_min)
+            index.centroids = data["centroids"]
+            index.trained_at = int(data["trained_at"])
+            index.meta = [tuple(m) for m in json.loads(str(data["meta"]))]
+            vecs = data["vecs"]
+        index._reset_lists(index.nlist)
+        index._assign(vecs, np.arange(len(vecs), dtype=np.int64))
+        return index
+
+
+class SharedDictionary:
+    """Community sign dictionary: an IVFIndex over every user's gesture embeddings.
+
+    Built from storage on first use (or loaded from `path` and checked against
+    storage by verify()), kept current by add() on every save, and persisted to
+    `path` after rebuilds and on shutdown. Retraining the coarse quantiser is a
+    rebuild in a worker thread, never k-means on the event loop.
+    """
+
+    def __init__(self, storage, path: str = "", nprobe: int = 8, train_min: int = 1024):
+        self.storage = storage
+        self.path = path
+        self.nprobe = nprobe
+        self.train_min = train_min
+        self.index: Optional[IVFIndex] = None
+        self._build: Optional[asyncio.Task] = None
+        self._saving: Optional[asyncio.Task] = None
+        self._pending: List[Tuple[Optional[int], str, str, np.ndarray]] = []
+
+    def load(self) -> bool:
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            self.index = IVFIndex.load(self.path, self.nprobe, self.train_min)
+            return True
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def save(self) -> None:
+        if self.path and self.index is not None:
+            self.index.save(self.path)
+
+    def _build_index(self, rows: List[Dict]) -> IVFIndex:
+        rows = [r for r in rows if r.get("embedding") is not None]
+        index = IVFIndex(FRAME_DIM, self.nprobe, train_min=self.train_min)
+        if rows:  # add() trains the coarse quantiser once there is enough data
+            index.add(np.stack([r["embedding"] for r in rows]), [(r["user_id"], r["name"]) for r in rows])
+        return index
+
+    async def _rebuild(self) -> IVFIndex:
+        self._pending = []
+        rows = await self.storage.all_gesture_embeddings()
+        index = await asyncio.to_thread(self._build_index, rows)
+        # saves that landed while we were reading/training, minus those the read already
+        # saw (by row id) so the index size keeps matching gesture_count() for verify().
+        # No await between here and publishing the index, so nothing can slip into _pending unseen.
+        seen = {r["id"] for r in rows if r.get("id") is not None}
+        for row_id, user_id, name, vec in self._pending:
+            if row_id is None or row_id not in seen:
+                index.add(vec, [(user_id, name)], train=False)
+        self._pending = []
+        self.index = index
+        self._save_in_background()
+        return index
+
+    def _save_in_background(self) -> None:
+        # the snapshot is taken now, on the loop; adds after it go straight into the live index
+        if not self.path or self.index is None:
+            return
+        snap = self.index.snapshot()
+        previous = self._saving
+
+        async def write():
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)  # keep writes in order
+            await asyncio.to_thread(IVFIndex.write, self.path, snap)
+
+        self._saving = asyncio.get_running_loop().create_task(write())
+
+    async def flush(self) -> None:
+        # wait for the last background save (tests, shutdown)
+        if self._saving is not None:
+            await asyncio.gather(self._saving, return_exceptions=True)
+
+    async def rebuild(self) -> IVFIndex:
+        if self._build is None or self._build.done():
+            self._build = asyncio.get_running_loop().create_task(self._rebuild())
+        return await asyncio.shield(self._build)
+
+    async def ready(self) -> IVFIndex:
+        if self.index is not None:
+            return self.index
+        return await self.rebuild()
+
+    async def verify(self) -> None:
+        # an index loaded from `path` may predate rows written since (or by another host)
+        if self.index is None:
+            return
+        stored = await self.storage.gesture_count()
+        if stored != len(self.index):
+            await self.rebuild()
+
+    def add(self, user_id: str, name: str, vec: np.ndarray, row_id: Optional[int] = None) -> None:
+        # row_id: the stored row's id, so a build that already read it doesn't add it twice
+        if self._build is not None and not self._build.done():
+            self._pending.append((row_id, user_id, name, vec))
+        elif self.index is not None:
+            self.index.add(vec, [(user_id, name)], train=False)
+            if self.index.needs_training() and (self._build is None or self._build.done()):
+                self.rebuild_in_background()
+
+    def rebuild_in_background(self) -> None:
+        task = asyncio.get_running_loop().create_task(self.rebuild())
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())  # a failed build is retried on next use
+
+    async def search(self, query: np.ndarray, k: int = 5, nprobe: Optional[int] = None) -> List[Dict]:
+        return (await self.ready()).search_names(query, k, nprobe)
+
+    def stats(self) -> Dict:
+        if self.index is None:
+            return {"ready": False}
+        return {"ready": True, "vectors": len(self.index), "nlist": self.index.nlist,
+                "nprobe": self.nprobe, "trained_at": self.index.trained_at}
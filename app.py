@@ -109,7 +109,7 @@ with st.sidebar:
     tts_rate = st.slider("Voice speed", 0.5, 2.0, 1.0, 0.1)
     tts_pitch = st.slider("Voice pitch", 0.0, 2.0, 1.0, 0.1)
 
-    autorefresh = st.toggle("Auto-refresh chat (2s)", value=True)
+    autorefresh = st.toggle("Live chat updates", value=True)
     translate_toggle = st.toggle("Show translations (TA + HI)", value=True)
 
 # ===================== STYLES ==========================
@@ -234,28 +234,32 @@ with col1:
   const peers = {{}};
 
   // ===== Custom gesture library =====
-  // Each entry: {{ name: string, vecs: [Float32Array] }}
+  // Each entry: {{ name: string, count: number }}; scoring happens in the recogniser worker
   let GESTURE_LIB = [];
-  // runtime window buffer (36 frames of 63-dim vectors)
-  let WIN = [];
+  // versioned 63 -> K projection the backend stores templates in; kept for this page's
+  // lifetime and re-sent by /custom_gesture/model only when its version changes
+  let PROJECTION = {{ version: "", components: null }};
   let customOn = false;
-  let cooldownUntil = 0;
 
   function setStatus(t) {{ statusEl.textContent = "Status: " + t; }}
 
   async function apiSave(content, emoji="") {{
     try {{
-      await fetch(${{BACKEND}}/message?user_id=${{encodeURIComponent(USER_ID)}}&content=${{encodeURIComponent(content)}}&emoji=${{encodeURIComponent(emoji)}}&language=en, {{ method: 'POST' }});
+      await fetch(`${{BACKEND}}/message?user_id=${{encodeURIComponent(USER_ID)}}&content=${{encodeURIComponent(content)}}&emoji=${{encodeURIComponent(emoji)}}&language=en&source=sign`, {{ method: 'POST' }});
     }} catch (e) {{ console.error(e); }}
   }}
 
-  async function translate(text, lang) {{
+  // one request for all target languages; returns {{ lang: text }}
+  async function translateAll(text, langs) {{
     try {{
-      const r = await fetch(${{BACKEND}}/translate?text=${{encodeURIComponent(text)}}&lang=${{lang}});
-      if (!r.ok) return "";
+      const r = await fetch(`${{BACKEND}}/translate/batch`, {{
+        method: 'POST', headers: {{ 'Content-Type': 'application/json' }},
+        body: JSON.stringify({{ texts: [text], langs }})
+      }});
+      if (!r.ok) return {{}};
       const j = await r.json();
-      return j.translated || "";
-    }} catch(e){{ return ""; }}
+      return (j.translations || {{}})[text] || {{}};
+    }} catch(e){{ return {{}}; }}
   }}
 
   function speak(text) {{
@@ -291,6 +295,11 @@ with col1:
 
   function broadcastCaption(text, emoji="") {{
     localCap.innerText = text + (emoji ? " " + emoji : "");
+    // the room socket relays to everyone and saves to history in one message
+    if (ws && ws.readyState === WebSocket.OPEN) {{
+      ws.send(JSON.stringify({{ type:"caption", text, emoji }}));
+      return;
+    }}
     apiSave(text, emoji);
     Object.values(peers).forEach(p => {{
       if (p.data && p.data.open) p.data.send({{ type:"caption", text, emoji }});
@@ -303,9 +312,8 @@ with col1:
     const line = (msg.text || "") + (msg.emoji ? " " + msg.emoji : "");
     p.capEl.innerText = line;
     (async () => {{
-      const ta = await translate(msg.text || "", "ta");
-      const hi = await translate(msg.text || "", "hi");
-      p.transEl.innerHTML = TA: ${{ta}}<br/>HI: ${{hi}};
+      const t = await translateAll(msg.text || "", ["ta", "hi"]);
+      p.transEl.innerHTML = `TA: ${{t.ta || ""}}<br/>HI: ${{t.hi || ""}}`;
     }})();
     speak(msg.text || "");
   }}
@@ -345,6 +353,32 @@ with col1:
   }}
 
   // ---- WS signalling ----
+  // server sends one "peers" snapshot after hello, then join/leave deltas with a
+  // version counter; a gap in versions means we missed one, so ask for a resync
+  let roomVersion = -1;
+
+  function callPeer(pid) {{
+    if (!pid || pid === myPeerId) return;
+    if (peers[pid] && (peers[pid].call || peers[pid].data)) return;
+    const outCall = peer.call(pid, localStream);
+    outCall.on('stream', (remote) => {{
+      const slot = ensureRemoteSlot(pid);
+      slot.videoEl.srcObject = remote;
+    }});
+    const dconn = peer.connect(pid);
+    dconn.on('data', (msg) => handleIncomingData(pid, msg));
+    peers[pid] = Object.assign(peers[pid] || {{}}, {{ call: outCall, data: dconn }});
+  }}
+
+  function dropPeer(pid) {{
+    const p = peers[pid];
+    if (!p) return;
+    try {{ p.call && p.call.close(); }} catch(e){{}}
+    try {{ p.data && p.data.close(); }} catch(e){{}}
+    if (p.videoEl) p.videoEl.closest('.card').remove();
+    delete peers[pid];
+  }}
+
   function joinRoomWS() {{
     ws = new WebSocket(wsRoomURL(ROOMCODE));
     ws.onopen = () => {{
@@ -352,23 +386,30 @@ with col1:
     }};
     ws.onmessage = (ev) => {{
       const m = JSON.parse(ev.data || '{{}}');
-      if (m.type === 'peers' && Array.isArray(m.peers)) {{
-        m.peers.forEach(pid => {{
-          if (!pid || pid === myPeerId) return;
-          if (peers[pid] && (peers[pid].call || peers[pid].data)) return;
-
-          const outCall = peer.call(pid, localStream);
-          outCall.on('stream', (remote) => {{
-            const slot = ensureRemoteSlot(pid);
-            slot.videoEl.srcObject = remote;
-          }});
-          const dconn = peer.connect(pid);
-          dconn.on('data', (msg) => handleIncomingData(pid, msg));
-          peers[pid] = Object.assign(peers[pid] || {{}}, {{ call: outCall, data: dconn }});
-        }});
+      if (m.type === 'ping') {{
+        ws.send(JSON.stringify({{ type:"pong" }}));
+      }} else if (m.type === 'caption') {{
+        handleIncomingData(m.from, m);
+      }} else if (m.type === 'caption_repeat' && peers[m.from] && peers[m.from].capEl) {{
+        // the same sign again within the dedup window: show the count, don't re-speak it
+        peers[m.from].capEl.innerText = (m.text || "") + " ×" + (m.repeat + 1);
+      }} else if (m.type === 'peers' && Array.isArray(m.peers)) {{
+        roomVersion = m.version;
+        Object.keys(peers).forEach(pid => {{ if (!m.peers.includes(pid)) dropPeer(pid); }});
+        m.peers.forEach(callPeer);
+      }} else if (m.type === 'join' || m.type === 'leave') {{
+        if (m.version !== roomVersion + 1) {{
+          ws.send(JSON.stringify({{ type:"sync" }}));
+          return;
+        }}
+        roomVersion = m.version;
+        // newcomers call everyone in their snapshot, so existing members just wait
+        if (m.type === 'leave') dropPeer(m.peerId);
+      }} else if (m.type === 'error' && m.reason === 'room_full') {{
+        setStatus("Room is full");
       }}
     }};
-    ws.onclose = () => setStatus("Room socket closed");
+    ws.onclose = (ev) => {{ if (ev.code !== 4001) setStatus("Room socket closed"); }};
   }}
 
   // ---- Buttons ----
@@ -435,50 +476,120 @@ with col1:
     }});
   }}
 
-  function meanVec(frames) {{
-    // frames: array of 63-length arrays
-    const d = 63;
-    const out = new Float32Array(d);
-    for (let i=0;i<frames.length;i++) {{
-      const f = frames[i];
-      for (let j=0;j<d;j++) out[j] += f[j];
+  // Custom recognition runs off the UI thread. The function below is self-contained:
+  // its source is what the Web Worker executes (and the fallback if workers are blocked).
+  function recognizerCore(emit) {{
+    const D = 63, W = 36, MIN_CONFIDENCE = 0.6, COOLDOWN_MS = 1500;
+    const ring = new Float32Array(W * D);   // last W frames, written in place
+    const sum = new Float64Array(D);        // running sum of the ring
+    let pos = 0, count = 0, cooldownUntil = 0;
+    // the user's classifier (GET /custom_gesture/model): one centroid per sign, in the
+    // K-dimensional space of its projection (K x 63, row-major)
+    let K = D, proj = null, cur = new Float32Array(D);
+    let names = [], centroids = new Float32Array(0), invVar = new Float32Array(D), temp = 1, reject = 0;
+
+    function reset() {{ sum.fill(0); pos = 0; count = 0; }}
+
+    function setModel(m) {{
+      K = m.dim; proj = m.projection; cur = new Float32Array(K);
+      names = m.names; centroids = m.centroids; invVar = m.invVar;
+      temp = m.temperature; reject = m.reject;
+      reset();
     }}
-    const inv = 1 / Math.max(frames.length, 1);
-    for (let j=0;j<d;j++) out[j] *= inv;
-    return out;
+
+    function push(f) {{
+      const off = pos * D;
+      if (count === W) {{ for (let j = 0; j < D; j++) sum[j] -= ring[off + j]; }}
+      else count++;
+      for (let j = 0; j < D; j++) {{ ring[off + j] = f[j]; sum[j] += f[j]; }}
+      pos = (pos + 1) % W;
+      if (pos === 0) {{  // re-sum once per lap so float error can't accumulate
+        sum.fill(0);
+        for (let i = 0; i < W * D; i++) sum[i % D] += ring[i];
+      }}
+      if (count < W || !names.length || performance.now() < cooldownUntil) return;
+      // window sum (same direction as the mean) projected to K dims and made unit length,
+      // then compared with each centroid: O(K x 63 + signs x K)
+      let n = 0;
+      for (let i = 0; i < K; i++) {{
+        let v = 0;
+        if (proj) {{ for (let j = 0, o = i * D; j < D; j++) v += proj[o + j] * sum[j]; }}
+        else v = sum[i];
+        cur[i] = v; n += v * v;
+      }}
+      const inv = 1 / (Math.sqrt(n) + 1e-9);
+      for (let i = 0; i < K; i++) cur[i] *= inv;
+      const logits = new Float64Array(names.length + 1);
+      let top = -reject / (2 * temp), best = -1;
+      logits[names.length] = top;  // "none of these"
+      for (let c = 0, o = 0; c < names.length; c++, o += K) {{
+        let d2 = 0;
+        for (let j = 0; j < K; j++) {{ const d = cur[j] - centroids[o + j]; d2 += d * d * invVar[j]; }}
+        logits[c] = -d2 / (2 * temp);
+        if (logits[c] > top) {{ top = logits[c]; best = c; }}
+      }}
+      if (best < 0) return;
+      let z = 0;
+      for (let c = 0; c < logits.length; c++) z += Math.exp(logits[c] - top);
+      const confidence = 1 / z;
+      if (confidence >= MIN_CONFIDENCE) {{
+        emit({{ type: "match", name: names[best], score: confidence }});
+        cooldownUntil = performance.now() + COOLDOWN_MS;
+        reset();  // start a fresh window so a held sign doesn't spam
+      }}
+    }}
+
+    return (m) => {{
+      if (m.type === "frame") push(m.f);
+      else if (m.type === "model") setModel(m);
+      else if (m.type === "reset") reset();
+    }};
   }}
 
-  function cosine(a, b) {{
-    let dot=0, na=0, nb=0;
-    for (let i=0;i<a.length;i++) {{
-      dot += a[i]*b[i];
-      na += a[i]*a[i];
-      nb += b[i]*b[i];
+  function onRecognizer(m) {{
+    if (m.type === "match" && customOn) broadcastCaption(m.name, "🖐");
+  }}
+
+  let recognizer = null;  // {{ post(msg, transfer) }}
+  function startRecognizer() {{
+    if (recognizer) return recognizer;
+    try {{
+      const src = `const handle = (${{recognizerCore.toString()}})((m) => self.postMessage(m));\n` +
+                  `self.onmessage = (e) => handle(e.data);`;
+      const url = URL.createObjectURL(new Blob([src], {{ type: "text/javascript" }}));
+      const w = new Worker(url);
+      URL.revokeObjectURL(url);
+      w.onmessage = (e) => onRecognizer(e.data);
+      recognizer = {{ post: (m, transfer) => w.postMessage(m, transfer || []) }};
+    }} catch (e) {{
+      console.warn("recognizer worker unavailable, running inline", e);
+      const handle = recognizerCore(onRecognizer);
+      recognizer = {{ post: (m) => handle(m) }};
     }}
-    return dot / (Math.sqrt(na)*Math.sqrt(nb) + 1e-9);
+    return recognizer;
   }}
 
   async function loadGestureLibrary() {{
     try {{
-      const url = ${{BACKEND}}/custom_gesture/samples?user_id=${{encodeURIComponent(USER_ID)}};
+      // the per-user classifier trained by the backend from the saved samples; the
+      // projection matrix is only sent when ours is missing or out of date
+      const url = `${{BACKEND}}/custom_gesture/model?user_id=${{encodeURIComponent(USER_ID)}}` +
+                  `&projection=${{encodeURIComponent(PROJECTION.version)}}`;
       const r = await fetch(url);
       if (!r.ok) throw new Error("fetch failed");
-      const rows = await r.json(); // each: {{name, seq_json}}
-      const lib = [];
-      for (const row of rows) {{
-        const name = row.name || "custom";
-        const seq = (row.seq_json && row.seq_json.frames) || [];
-        const frames = seq.map(fr => Float32Array.from(fr)); // 36x63 flattened
-        const v = meanVec(frames);
-        lib.push({{ name, vecs: [v] }});
-      }}
-      // merge by name
-      const byName = {{}};
-      for (const g of lib) {{
-        if (!byName[g.name]) byName[g.name] = {{ name:g.name, vecs:[] }};
-        byName[g.name].vecs.push(...g.vecs);
+      const j = await r.json(); // {{version, dim, projection, names, counts, centroids: [[dim floats] per sign], inv_var, temperature, reject}}
+      if (j.projection_matrix) {{
+        const p = j.projection_matrix; // {{version, dim, components: [[63 floats] x dim]}}
+        PROJECTION = {{ version: p.version, components: Float32Array.from(p.components.flat()) }};
       }}
-      GESTURE_LIB = Object.values(byName);
+      GESTURE_LIB = (j.names || []).map((name, i) => ({{ name, count: j.counts[i] }}));
+      // centroids go to the recogniser as one flat matrix; the buffer is transferred
+      const centroids = new Float32Array(GESTURE_LIB.length * j.dim);
+      (j.centroids || []).forEach((c, i) => centroids.set(c, i * j.dim));
+      startRecognizer().post({{ type: "model", dim: j.dim, names: j.names || [], centroids,
+                               projection: j.projection === "identity" ? null : PROJECTION.components,
+                               invVar: Float32Array.from(j.inv_var), temperature: j.temperature,
+                               reject: j.reject }}, [centroids.buffer]);
       renderGestureChips();
       customOn = GESTURE_LIB.length > 0;
       setStatus(customOn ? "Gestures ON (custom loaded)" : "Gestures ON");
@@ -494,7 +605,7 @@ with col1:
   // ---- MediaPipe Hands (quick + custom) ----
   let camera = null;
   const videoGhost = document.createElement('video');
-  const hands = new Hands({{ locateFile: (f) => https://cdn.jsdelivr.net/npm/@mediapipe/hands/${{f}} }});
+  const hands = new Hands({{ locateFile: (f) => `https://cdn.jsdelivr.net/npm/@mediapipe/hands/${{f}}` }});
   hands.setOptions({{
     maxNumHands: 1, modelComplexity: 1, minDetectionConfidence: 0.7, minTrackingConfidence: 0.7
   }});
@@ -518,31 +629,21 @@ with col1:
     return out;
   }}
 
-  function tryCustomRecognition() {{
-    if (!customOn) return;
-    if (Date.now() < cooldownUntil) return;
-    if (WIN.length < 36) return;
-    // make current mean vector
-    const cur = meanVec(WIN);
-    // find nearest gesture by max cosine over all samples
-    let bestName = "";
-    let bestScore = -1;
-    for (const g of GESTURE_LIB) {{
-      for (const v of g.vecs) {{
-        const s = cosine(cur, v);
-        if (s > bestScore) {{ bestScore = s; bestName = g.name; }}
-      }}
-    }}
-    // threshold to avoid noise
-    if (bestScore >= 0.92) {{
-      broadcastCaption(bestName, "🖐");
-      cooldownUntil = Date.now() + 1500; // 1.5s cooldown
-      WIN = []; // reset window so it doesn’t spam
-    }}
+  // quick signs are edge-triggered: one caption when a sign has been stable for
+  // QUICK_STABLE frames, then nothing until the hand shows something else
+  const QUICK_EMOJI = {{ "Yes": "👍", "No": "👎", "Hello": "✌" }};
+  const QUICK_STABLE = 3;
+  let quickLabel = "", quickRun = 0, quickSent = "";
+  function quickEdge(label) {{
+    if (label === quickLabel) quickRun++;
+    else {{ quickLabel = label; quickRun = 1; }}
+    if (quickRun < QUICK_STABLE || quickLabel === quickSent) return "";
+    quickSent = quickLabel;  // a stable "" (no sign) re-arms the same sign
+    return quickLabel;
   }}
 
   hands.onResults((results) => {{
-    if (!results.multiHandLandmarks || results.multiHandLandmarks.length===0) return;
+    if (!results.multiHandLandmarks || results.multiHandLandmarks.length===0) {{ quickEdge(""); return; }}
 
     // ===== Hard-coded quick signs =====
     const lm = results.multiHandLandmarks[0];
@@ -558,17 +659,15 @@ with col1:
     const dx = Math.abs(lm[8].x - lm[12].x);
     const vSign = idxExt && midExt && ringF && pinkF && dx > 0.05;
 
-    if (thumbUp)      {{ broadcastCaption("Yes", "👍"); return; }}
-    if (thumbDown)    {{ broadcastCaption("No", "👎"); return; }}
-    if (vSign)        {{ broadcastCaption("Hello", "✌"); return; }}
-
-    // ===== Custom window-building =====
-    const n = normalize(lm);
-    const f63 = flatten63(n);
-    WIN.push(Array.from(f63));
-    if (WIN.length > 36) WIN.shift();
+    const quick = thumbUp ? "Yes" : thumbDown ? "No" : vSign ? "Hello" : "";
+    const fire = quickEdge(quick);
+    if (fire) broadcastCaption(fire, QUICK_EMOJI[fire]);
+    if (quick) return;
 
-    tryCustomRecognition();
+    // ===== Custom recognition (in the worker) =====
+    if (!customOn) return;
+    const f63 = flatten63(normalize(lm));
+    recognizer.post({{ type: "frame", f: f63 }}, [f63.buffer]);
   }});
 
   document.getElementById('startGest').onclick = async () => {{
@@ -586,7 +685,7 @@ with col1:
   document.getElementById('stopGest').onclick = () => {{
     if (camera) camera.stop();
     customOn = false;
-    WIN = [];
+    if (recognizer) recognizer.post({{ type: "reset" }});
     setStatus("Gestures OFF");
   }};
   </script>
@@ -678,7 +777,7 @@ with st.expander("🧪 Teach a custom sign (Personal Dictionary)", expanded=Fals
     e.textContent = t; e.className = cls;
   }}
   function setStat(done, total) {{
-    document.getElementById('teachStat').textContent = Recording samples… ${{done}}/${{total}};
+    document.getElementById('teachStat').textContent = `Recording samples… ${{done}}/${{total}}`;
   }}
 
   function normalize(pts) {{
@@ -689,20 +788,34 @@ with st.expander("🧪 Teach a custom sign (Personal Dictionary)", expanded=Fals
     return shifted.map(p => [p[0]/m, p[1]/m, p[2]/m]);
   }}
 
-  async function saveSample(sampleIdx, seqFrames) {{
-    try {{
-      const r = await fetch(${{BACKEND}}/custom_gesture/save?user_id=${{encodeURIComponent(USER_ID)}}&name=${{encodeURIComponent(NAME)}}&sample_idx=${{sampleIdx}}, {{
-        method:"POST", headers:{{"Content-Type":"application/json"}},
-        body: JSON.stringify({{ frames: seqFrames }})
-      }});
-      return r.ok;
-    }} catch(e) {{ return false; }}
+  // samples are buffered and uploaded in one request once the target is reached
+  let pending = [];
+
+  async function uploadSamples(samples, attempts = 4) {{
+    const url = `${{BACKEND}}/custom_gesture/save_batch?user_id=${{encodeURIComponent(USER_ID)}}&name=${{encodeURIComponent(NAME)}}`;
+    const body = JSON.stringify({{ samples }});
+    for (let i = 0; i < attempts; i++) {{
+      try {{
+        const r = await fetch(url, {{ method:"POST", headers:{{"Content-Type":"application/json"}}, body }});
+        if (r.ok) return true;
+        if (r.status < 500) return false;  // bad request: retrying won't help
+      }} catch(e) {{}}
+      await new Promise(ok => setTimeout(ok, 500 * 2 ** i));  // 0.5s, 1s, 2s, ...
+    }}
+    return false;
+  }}
+
+  async function finishTeach() {{
+    setMsg(`Uploading ${{pending.length}} samples…`, "warn");
+    const ok = await uploadSamples(pending);
+    if (ok) {{ pending = []; setMsg("Done! You can close this section.", "ok"); }}
+    else setMsg("Save failed (check backend URL)", "err");
   }}
 
-  const hands = new Hands({{ locateFile: f => https://cdn.jsdelivr.net/npm/@mediapipe/hands/${{f}} }});
+  const hands = new Hands({{ locateFile: f => `https://cdn.jsdelivr.net/npm/@mediapipe/hands/${{f}}` }});
   hands.setOptions({{ maxNumHands:1, modelComplexity:1, minDetectionConfidence:0.7, minTrackingConfidence:0.7 }});
 
-  hands.onResults(async (res) => {{
+  hands.onResults((res) => {{
     if (!teaching) return;
     if (!res.multiHandLandmarks || !res.multiHandLandmarks.length) {{
       setMsg("Show your hand to the camera and hold the sign steady…", "warn");
@@ -718,17 +831,16 @@ with st.expander("🧪 Teach a custom sign (Personal Dictionary)", expanded=Fals
       frames = [];
       count++;
       setStat(count, TARGET);
-      setMsg(Captured sample #${{count}} ✓, "ok");
+      setMsg(`Captured sample #${{count}} ✓`, "ok");
 
-      const ok = await saveSample(count, seq);
-      if (!ok) setMsg("Save failed (check backend URL)", "err");
+      pending.push({{ sample_idx: count, frames: seq }});
 
       if (count >= TARGET) {{
-        setMsg("Done! You can close this section.", "ok");
         teaching = false;
         try {{ camera.stop(); }} catch(_e) {{}}
         const v = document.getElementById('cam');
         try {{ v.srcObject && v.srcObject.getTracks().forEach(t => t.stop()); }} catch(_e) {{}}
+        finishTeach();
       }}
     }}
   }});
@@ -803,6 +915,7 @@ with col2:
         try:
             res = requests.delete(f"{BACKEND}/history/{st.session_state['user_id']}", timeout=10)
             if res.ok:
+                st.session_state.pop("history_cache", None)
                 st.success("Chat history cleared!")
         except Exception as e:
             st.error(f"Failed: {e}")
@@ -811,27 +924,66 @@ with col2:
     history_box = st.container()
 
 # ===================== HELPERS ========================
-def fetch_history(uid: str):
+HISTORY_PAGE = 500
+
+def row_cursor(row) -> str:
+    # the backend's "timestamp|id" cursor; a bare timestamp still works for rows without an id
+    ts, row_id = row.get("timestamp", ""), row.get("id")
+    return f"{ts}|{row_id}" if row_id is not None else ts
+
+def fetch_history(uid: str, _resync: bool = False):
+    # keep a local copy and only pull rows newer than what we already have
+    cache = st.session_state.get("history_cache")
+    if not cache or cache.get("uid") != uid or _resync:
+        cache = {"uid": uid, "items": [], "etag": ""}
+        st.session_state["history_cache"] = cache
+    items = cache["items"]
+    since = row_cursor(items[-1]) if items else ""
+    headers = {"If-None-Match": cache["etag"]} if cache["etag"] else {}
+    new, etag, total = [], "", None
     try:
-        r = requests.get(f"{BACKEND}/history/{uid}", timeout=10)
-        return r.json() if r.ok else []
+        while True:
+            params = {"limit": HISTORY_PAGE}
+            if since:
+                params["since"] = since
+            r = requests.get(f"{BACKEND}/history/{uid}", params=params, headers=headers, timeout=10)
+            if r.status_code == 304 or not r.ok:
+                return items
+            new.extend(r.json())
+            etag = r.headers.get("ETag", "")
+            total = r.headers.get("X-History-Count")
+            since = r.headers.get("X-Next-Cursor", "")
+            if not since:
+                break
+            headers = {}
     except Exception:
-        return []
-
-def translate_line(text: str, lang: str):
+        return items
+    merged = items + new
+    if total is not None and int(total) != len(merged) and not _resync:
+        return fetch_history(uid, _resync=True)  # cleared or edited elsewhere
+    cache["items"], cache["etag"] = merged, etag
+    return merged
+
+def translate_batch(texts, langs):
+    # one round-trip for every (text, lang) pair; backend dedupes and caches
+    texts = [t for t in dict.fromkeys(texts) if t]
+    if not texts:
+        return {}
     try:
-        r = requests.get(f"{BACKEND}/translate", params={"text": text, "lang": lang}, timeout=10)
+        r = requests.post(f"{BACKEND}/translate/batch", json={"texts": texts, "langs": langs}, timeout=15)
         if r.ok:
-            return r.json().get("translated", "")
+            return r.json().get("translations", {})
     except Exception:
         pass
-    return ""
+    return {}
 
 def render_messages(items):
     if not items:
         st.info("No messages yet. Start by sending one.")
         return
-    items = sorted(items, key=lambda x: x.get("timestamp", ""))
+    translations = {}
+    if translate_toggle:
+        translations = translate_batch([(row.get("content") or "").strip() for row in items], ["ta", "hi"])
     for row in items:
         content = (row.get("content") or "").strip()
         emoji = row.get("emoji", "")
@@ -853,8 +1005,8 @@ def render_messages(items):
         )
 
         if translate_toggle and content:
-            ta = translate_line(content, "ta")
-            hi = translate_line(content, "hi")
+            ta = translations.get(content, {}).get("ta", "")
+            hi = translations.get(content, {}).get("hi", "")
             if ta or hi:
                 st.markdown(
                     f"""<div class="msg-translate">
@@ -879,6 +1031,56 @@ if st.session_state.get("_force_reload"):
     st.session_state["_force_reload"] = False
     st.rerun()
 
+def close_stream():
+    s = st.session_state.pop("_stream", None)
+    if s:
+        try:
+            s["resp"].close()
+        except Exception:
+            pass
+
+def wait_for_messages(uid: str, since: str, max_wait: float = 25.0) -> bool:
+    # Block on the backend's SSE stream until a new message (or clear) arrives.
+    # The connection lives in session state across reruns; the server sends a
+    # keepalive every second, which we use to tick the live indicator so that
+    # Streamlit can interrupt this run when the user interacts with a widget.
+    s = st.session_state.get("_stream")
+    if not s or s["uid"] != uid:
+        close_stream()
+        try:
+            resp = requests.get(
+                f"{BACKEND}/stream/{uid}",
+                params={"since": since, "keepalive": 1},
+                stream=True,
+                timeout=(5, 15),
+            )
+            resp.raise_for_status()
+        except Exception:
+            time.sleep(2)  # backend down: fall back to a slow poll
+            return False
+        s = {"uid": uid, "resp": resp, "lines": resp.iter_lines(decode_unicode=True)}
+        st.session_state["_stream"] = s
+
+    live = st.empty()
+    deadline = time.time() + max_wait
+    try:
+        for line in s["lines"]:
+            if line.startswith("event:") and line.split(":", 1)[1].strip() in ("message", "cleared", "resync"):
+                if "resync" in line:
+                    close_stream()
+                return True
+            if line.startswith(":"):
+                live.caption(f"🟢 live · {datetime.now().strftime('%H:%M:%S')}")
+            if time.time() > deadline:
+                return False
+    except Exception:
+        pass
+    close_stream()
+    return False
+
 if autorefresh:
-    time.sleep(2)
-    st.rerun()
\ No newline at end of file
+    newest = row_cursor(items[-1]) if items else ""
+    wait_for_messages(st.session_state["user_id"], newest)
+    st.rerun()
+else:
+    close_stream()
\ No newline at end of file
@@ -0,0 +1,232 @@
+# backplane.py
+import asyncio
+import fcntl
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+log = logging.getLogger("signcall.backplane")
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class Backplane(ABC):
+    """Pub/sub channel shared by every room server (worker process or host).
+
+    publish() sends a JSON-serialisable dict to all subscribers, the publisher
+    included; each subscriber sees messages in the same order. Delivery is
+    best-effort: a subscriber that was disconnected misses messages and relies
+    on the periodic room state broadcast to catch up.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def start(self, handler: Handler) -> None:
+        ...
+
+    @abstractmethod
+    async def publish(self, msg: Dict[str, Any]) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryBackplane(Backplane):
+    """In-process backplane: a single worker, or several registries in one test."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._handlers: List[Handler] = []
+
+    async def start(self, handler: Handler) -> None:
+        self._handlers.append(handler)
+        await handler({"op": "_connected"})
+
+    async def publish(self, msg: Dict[str, Any]) -> None:
+        # round-trip through JSON so nothing relies on shared objects
+        data = json.loads(json.dumps(msg))
+        for handler in list(self._handlers):
+            try:
+                await handler(data)
+            except Exception:
+                log.exception("backplane handler failed")
+
+    async def close(self) -> None:
+        self._handlers.clear()
+
+
+class SocketBackplane(Backplane):
+    """Newline-delimited JSON relayed through a hub on a unix or TCP socket.
+
+    The first process to bind the address hosts the hub (and connects to it
+    like everyone else); the rest connect as clients. If the hub goes away the
+    survivors reconnect and one of them takes over, so `uvicorn --workers N`
+    needs nothing but a shared socket path, and hosts can share a tcp:// hub.
+    """
+
+    name = "socket"
+    MAX_BUFFER = 4 << 20  # hub drops subscribers that fall this far behind
+
+    def __init__(self, url: str, reconnect: float = 0.5):
+        parsed = urlparse(url)
+        self.scheme = parsed.scheme
+        if self.scheme == "unix":
+            self.path = parsed.path
+        elif self.scheme == "tcp":
+            self.host, self.port = parsed.hostname or "127.0.0.1", parsed.port or 7979
+        else:
+            raise ValueError(f"unsupported backplane url: {url}")
+        self.reconnect = reconnect
+        self._handler: Optional[Handler] = None
+        self._task: Optional[asyncio.Task] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._lock_fd: Optional[int] = None
+        self._hub_clients: Set[asyncio.StreamWriter] = set()
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._connected = asyncio.Event()
+        self._closing = False
+
+    @property
+    def is_hub(self) -> bool:
+        return self._server is not None
+
+    async def start(self, handler: Handler) -> None:
+        self._handler = handler
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        try:
+            await asyncio.wait_for(self._connected.wait(), 5.0)
+        except asyncio.TimeoutError:
+            log.warning("backplane not connected yet; continuing in the background")
+
+    # ---- hub ----
+    async def _serve(self) -> None:
+        if self.scheme == "unix":
+            # only the holder of the lock file may replace a stale socket file
+            if self._lock_fd is None:
+                fd = os.open(self.path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    os.close(fd)
+                    raise
+                self._lock_fd = fd
+            if os.path.exists(self.path):
+                os.unlink(self.path)  # stale: nobody answered on it
+            self._server = await asyncio.start_unix_server(self._hub_client, path=self.path)
+        else:
+            self._server = await asyncio.start_server(self._hub_client, self.host, self.port)
+        log.info("backplane hub listening")
+
+    async def _hub_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._hub_clients.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for w in list(self._hub_clients):
+                    if w.transport.get_write_buffer_size() > self.MAX_BUFFER:
+                        self._hub_clients.discard(w)
+                        w.close()
+                    else:
+                        w.write(line)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._hub_clients.discard(writer)
+            writer.close()
+
+    # ---- client ----
+    async def _open(self):
+        if self.scheme == "unix":
+            return await asyncio.open_unix_connection(self.path, limit=self.MAX_BUFFER)
+        return await asyncio.open_connection(self.host, self.port, limit=self.MAX_BUFFER)
+
+    async def _connect(self):
+        try:
+            return await self._open()
+        except OSError:
+            pass
+        try:
+            await self._serve()
+        except OSError:
+            pass  # lost the race to another process: it is the hub now
+        return await self._open()
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                reader, writer = await self._connect()
+            except OSError:
+                await asyncio.sleep(self.reconnect)
+                continue
+            self._writer = writer
+            self._connected.set()
+            try:
+                await self._handler({"op": "_connected"})
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    try:
+                        msg = json.loads(line)
+                    except ValueError:
+                        continue
+                    try:
+                        await self._handler(msg)
+                    except Exception:
+                        log.exception("backplane handler failed")
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                pass
+            finally:
+                self._writer = None
+                self._connected.clear()
+                writer.close()
+            if not self._closing:
+                log.warning("backplane disconnected; reconnecting")
+                await asyncio.sleep(self.reconnect)
+
+    async def publish(self, msg: Dict[str, Any]) -> None:
+        writer = self._writer
+        if writer is None:
+            return  # best-effort: the next state broadcast repairs the gap
+        try:
+            writer.write(json.dumps(msg, separators=(",", ":")).encode("utf-8") + b"\n")
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def close(self) -> None:
+        self._closing = True
+        if self._server is not None:
+            # let the hub relay what is already in flight (e.g. our own goodbye) before it goes away
+            await asyncio.sleep(0.1)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self._server is not None:
+            self._server.close()
+            for w in list(self._hub_clients):
+                w.close()
+            if self.scheme == "unix" and os.path.exists(self.path):
+                os.unlink(self.path)
+            self._server = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+
+def open_backplane(url: str) -> Backplane:
+    # "" / "memory://" -> single process; "unix:///path.sock" or "tcp://host:port" -> shared hub
+    if not url or url.startswith("memory:"):
+        return MemoryBackplane()
+    return SocketBackplane(url)
@@ -0,0 +1,181 @@
+# classifier.py
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from gestures import TemplateSet, query_vector
+
+# Before there is any within-class spread to measure (one sample per sign), assume
+# samples of one sign sit at cosine ~0.92 from each other -- the old fixed threshold.
+SAME_SIGN_SPREAD = (2 - 2 * 0.92) / 2
+VAR_FLOOR = 1e-5
+# T = 1 is the Gaussian posterior itself; calibration only ever softens it, since on a
+# handful of separable samples the leave-one-out optimum would otherwise run off to 0
+TEMPERATURES = np.logspace(0, 2, 21)
+
+
+class GestureClassifier:
+    """Nearest shrunken centroid over one user's sample embeddings, with calibrated confidence.
+
+    Per sign it keeps the sample count, sum and sum of squares of the unit
+    embeddings in a TemplateSet, so new samples are folded in by update() in
+    O(63) each. From those it derives centroids shrunk towards the global mean
+    (`shrinkage` pseudo-samples) and a pooled per-dimension variance shrunk
+    towards its average (`var_prior` pseudo degrees of freedom). Scores are
+    softmax probabilities over -d2 / 2T, where d2 is the variance-scaled
+    squared distance to each centroid, plus a "none of these" class at the
+    distance that leave-one-out training samples stay within `reject_quantile`
+    of the time. The temperature T is fitted by leave-one-out log-loss.
+    Inference is O(signs), independent of the number of samples, and runs in
+    the TemplateSet's (possibly PCA-reduced) space.
+    """
+
+    def __init__(self, templates: TemplateSet, shrinkage: float = 1.0, var_prior: float = 10.0,
+                 reject_quantile: float = 0.99):
+        self.templates = templates
+        self.shrinkage = shrinkage
+        self.var_prior = var_prior
+        self.reject_quantile = reject_quantile
+        self.dim = dim = templates.dim
+        self.counts = np.zeros(0, dtype=np.float64)
+        self.sums = np.zeros((0, dim), dtype=np.float64)
+        self.sumsq = np.zeros((0, dim), dtype=np.float64)
+        self._seen = 0        # template rows folded into the statistics
+        self._fitted = False  # centroids / variance / calibration reflect _seen rows
+        self.centroids = np.zeros((0, dim), dtype=np.float32)
+        self.inv_var = np.full(dim, dim / SAME_SIGN_SPREAD, dtype=np.float32)
+        self.temperature = 1.0
+        self.reject = self._chi2()
+        self.version = 0      # samples the fitted model was trained on; grows with every save
+        self.update()
+
+    def _chi2(self) -> float:
+        return float(self.dim + 2.33 * math.sqrt(2 * self.dim))  # ~99th percentile of chi-square(dim)
+
+    @property
+    def names(self) -> List[str]:
+        return self.templates.names
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def update(self) -> None:
+        # fold in template rows added since the last call; the refit itself is lazy
+        ts = self.templates
+        if self._seen == len(ts):
+            return
+        grow = len(ts.names) - len(self.counts)
+        if grow > 0:
+            self.counts = np.concatenate([self.counts, np.zeros(grow)])
+            self.sums = np.vstack([self.sums, np.zeros((grow, self.dim))])
+            self.sumsq = np.vstack([self.sumsq, np.zeros((grow, self.dim))])
+        rows = ts.matrix[self._seen:].astype(np.float64)
+        labels = ts.labels[self._seen:]
+        np.add.at(self.counts, labels, 1)
+        np.add.at(self.sums, labels, rows)
+        np.add.at(self.sumsq, labels, rows * rows)
+        self._seen = len(ts)
+        self._fitted = False
+
+    def _centroids(self, sums: np.ndarray, counts: np.ndarray, mean: np.ndarray) -> np.ndarray:
+        return (sums + self.shrinkage * mean) / (counts + self.shrinkage)[..., None]
+
+    def fit(self) -> None:
+        self.update()
+        if self._fitted:
+            return
+        self._fitted = True
+        self.version = self._seen
+        if not len(self):
+            return
+        n = self.counts.sum()
+        mean = self.sums.sum(axis=0) / n
+        self.centroids = self._centroids(self.sums, self.counts, mean).astype(np.float32)
+        # pooled within-class variance per dimension, shrunk towards its average
+        dof = n - len(self)
+        scatter = (self.sumsq - self.sums ** 2 / self.counts[:, None]).sum(axis=0)
+        if dof > 0:
+            within = np.maximum(scatter / dof, 0)
+            prior = max(float(within.mean()), VAR_FLOOR)
+            var = (dof * within + self.var_prior * prior) / (dof + self.var_prior)
+        else:
+            var = np.full(self.dim, SAME_SIGN_SPREAD / self.dim)
+        self.inv_var = (1 / np.maximum(var, VAR_FLOOR)).astype(np.float32)
+        self._calibrate(mean)
+
+    def _calibrate(self, mean: np.ndarray) -> None:
+        # leave-one-out: each sample against centroids rebuilt without it
+        ts = self.templates
+        x = ts.matrix[:self._seen].astype(np.float64)
+        y = ts.labels[:self._seen]
+        ok = self.counts[y] >= 2
+        chi2 = self._chi2()  # fallback, and the least the threshold may be
+        if not ok.any():
+            self.temperature, self.reject = 1.0, float(chi2)
+            return
+        x, y = x[ok], y[ok]
+        d2 = self._d2(x, self.centroids.astype(np.float64))
+        own = self._centroids(self.sums[y] - x, self.counts[y] - 1, mean)
+        d2[np.arange(len(y)), y] = (((x - own) ** 2) * self.inv_var).sum(axis=1)
+        own_d2 = d2[np.arange(len(y)), y]
+        self.reject = float(max(np.quantile(own_d2, self.reject_quantile), chi2))
+        if len(self) < 2:
+            self.temperature = 1.0
+            return
+        best_t, best_nll = 1.0, math.inf
+        for t in TEMPERATURES:
+            logits = -d2 / (2 * t)
+            logits -= logits.max(axis=1, keepdims=True)
+            nll = float((np.log(np.exp(logits).sum(axis=1)) - logits[np.arange(len(y)), y]).mean())
+            if nll < best_nll:
+                best_t, best_nll = float(t), nll
+        self.temperature = best_t
+
+    def _d2(self, queries: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        # variance-scaled squared distances, (m, signs), via |q|^2 - 2 q.c + |c|^2 in the scaled space
+        iv = self.inv_var.astype(queries.dtype)
+        return np.maximum(((queries ** 2) * iv).sum(axis=1)[:, None] - 2 * (queries * iv) @ centroids.T
+                          + ((centroids ** 2) * iv).sum(axis=1)[None, :], 0)
+
+    def probabilities(self, queries: np.ndarray) -> np.ndarray:
+        """(m, signs + 1) probabilities; the last column is "none of these"."""
+        self.fit()
+        q = self.templates.project(np.atleast_2d(queries))
+        logits = np.empty((len(q), len(self) + 1), dtype=np.float64)
+        logits[:, :-1] = -self._d2(q.astype(np.float64), self.centroids.astype(np.float64)) / (2 * self.temperature)
+        logits[:, -1] = -self.reject / (2 * self.temperature)
+        logits -= logits.max(axis=1, keepdims=True)
+        p = np.exp(logits)
+        return p / p.sum(axis=1, keepdims=True)
+
+    def top_k(self, query: np.ndarray, k: int = 3) -> List[Tuple[str, float]]:
+        if not len(self):
+            return []
+        p = self.probabilities(query)[0, :-1]
+        k = min(k, len(p))
+        top = np.argsort(-p)[:k]
+        return [(self.names[i], float(p[i])) for i in top]
+
+    def export(self) -> Dict[str, Any]:
+        # everything a client needs to run the same model
+        self.fit()
+        projection = self.templates.projection
+        return {"version": self.version, "dim": self.dim,
+                "projection": projection.version if projection is not None else "identity",
+                "names": list(self.names),
+                "counts": self.counts.astype(int).tolist(),
+                "centroids": np.round(self.centroids, 6).tolist(),
+                "inv_var": np.round(self.inv_var, 4).tolist(),
+                "temperature": self.temperature, "reject": round(self.reject, 4)}
+
+
+def classify(model: GestureClassifier, frames: Optional[Any] = None, vector: Optional[Any] = None,
+             k: int = 3, min_confidence: float = 0.6) -> Dict[str, Any]:
+    matches = model.top_k(query_vector(frames, vector), k)
+    best = matches[0] if matches and matches[0][1] >= min_confidence else None
+    return {
+        "recognized": best[0] if best else "",
+        "score": best[1] if best else 0.0,
+        "matches": [{"name": n, "score": s} for n, s in matches],
+    }
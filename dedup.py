@@ -0,0 +1,58 @@
+# dedup.py
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class CaptionDedup:
+    """Collapses a caption repeated by the same sender within `window` seconds.
+
+    The window slides: each repeat extends it, so a sign held for ten seconds
+    is one caption with a repeat count, not three hundred. A different caption
+    (or a pause longer than the window) starts a new run. A run can carry the
+    value its first caption produced (attach()), e.g. the saved row, so
+    repeats can answer with it. Keys are LRU-bounded.
+    """
+
+    def __init__(self, window: float = 1.5, max_keys: int = 10000):
+        self.window = window
+        self.max_keys = max_keys
+        # key -> (text, last, count, attached value)
+        self._runs: "OrderedDict[str, Tuple[str, float, int, Any]]" = OrderedDict()
+        self.passed = 0
+        self.collapsed = 0
+
+    def check(self, key: str, text: str, now: Optional[float] = None) -> int:
+        """0 if the caption should go out, else how many times this run repeated it so far."""
+        now = time.monotonic() if now is None else now
+        norm = text.strip().lower()
+        run = self._runs.get(key)
+        if run is not None and run[0] == norm and now - run[1] <= self.window:
+            count = run[2] + 1
+            self._runs[key] = (norm, now, count, run[3])
+            self._runs.move_to_end(key)
+            self.collapsed += 1
+            return count - 1
+        self._runs[key] = (norm, now, 1, None)
+        self._runs.move_to_end(key)
+        while len(self._runs) > self.max_keys:
+            self._runs.popitem(last=False)
+        self.passed += 1
+        return 0
+
+    def attach(self, key: str, value: Any) -> None:
+        run = self._runs.get(key)
+        if run is not None:
+            self._runs[key] = run[:3] + (value,)
+
+    def attached(self, key: str) -> Any:
+        run = self._runs.get(key)
+        return run[3] if run is not None else None
+
+    def forget(self, key: str) -> None:
+        # the caption that started the run never went out: let the next one through
+        self._runs.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"window_ms": int(self.window * 1000), "senders": len(self._runs),
+                "passed": self.passed, "collapsed": self.collapsed}
@@ -0,0 +1,162 @@
+# dtw.py
+import math
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from gestures import FRAME_DIM, WINDOW, as_frames
+
+
+def resample(frames: Any, n: int = WINDOW) -> np.ndarray:
+    # linear time-resampling so every sequence has the same length (needed by LB_Keogh)
+    arr = as_frames(frames)
+    if len(arr) == n:
+        return arr
+    src = np.linspace(0.0, len(arr) - 1, n)
+    lo = np.floor(src).astype(int)
+    hi = np.minimum(lo + 1, len(arr) - 1)
+    w = (src - lo)[:, None].astype(np.float32)
+    return arr[lo] * (1 - w) + arr[hi] * w
+
+
+def dtw_distance(cost: np.ndarray, band: int, abandon_at: Any = math.inf) -> np.ndarray:
+    """Banded DTW for a batch of (n, m) cost matrices, one per candidate.
+
+    Restricted to a Sakoe-Chiba band of half-width `band`. A candidate is
+    abandoned (distance inf) as soon as every cell of a row exceeds its
+    `abandon_at` -- the final distance can only be larger.
+    """
+    c, n, m = cost.shape
+    limit = np.broadcast_to(np.asarray(abandon_at, dtype=np.float64), (c,))
+    alive = np.arange(c)
+    out = np.full(c, np.inf)
+    prev = np.full((c, m), np.inf)
+    for i in range(n):
+        cur = np.full((len(alive), m), np.inf)
+        lo, hi = max(0, i - band), min(m - 1, i + band)
+        for j in range(lo, hi + 1):
+            if i == 0:
+                step = cur[:, j - 1] if j else 0.0
+            elif j:
+                step = np.minimum(np.minimum(prev[:, j], prev[:, j - 1]), cur[:, j - 1])
+            else:
+                step = prev[:, 0]
+            cur[:, j] = cost[:, i, j] + step
+        keep = cur[:, lo:hi + 1].min(axis=1) <= limit
+        if not keep.all():  # drop abandoned candidates so later rows do less work
+            if not keep.any():
+                return out
+            cur, cost, limit, alive = cur[keep], cost[keep], limit[keep], alive[keep]
+        prev = cur
+    out[alive] = prev[:, m - 1]
+    return out
+
+
+class SequenceIndex:
+    """Per-user DTW matcher over resampled 36x63 sample sequences.
+
+    Each template keeps its LB_Keogh envelope (running min/max within the band);
+    a search computes LB_Kim and LB_Keogh for every template in one vectorised
+    pass, then runs banded, early-abandoning DTW in lower-bound order and stops
+    once the bound exceeds the k-th best distance found so far.
+    """
+
+    def __init__(self, band: int = 4, length: int = WINDOW):
+        self.band = band
+        self.length = length
+        self.names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+        self.labels = np.zeros(0, dtype=np.int32)
+        self.seqs = np.zeros((0, length, FRAME_DIM), dtype=np.float32)
+        self.upper = np.zeros_like(self.seqs)
+        self.lower = np.zeros_like(self.seqs)
+        self.dtw_runs = 0   # full DTW evaluations (possibly abandoned early)
+        self.pruned = 0     # templates skipped on their lower bound alone
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def nbytes(self) -> int:
+        return self.seqs.nbytes * 3 + self.labels.nbytes
+
+    def _label(self, name: str) -> int:
+        if name not in self._name_ids:
+            self._name_ids[name] = len(self.names)
+            self.names.append(name)
+        return self._name_ids[name]
+
+    def _envelope(self, seqs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        n, r = seqs.shape[1], self.band
+        upper = np.empty_like(seqs)
+        lower = np.empty_like(seqs)
+        for i in range(n):
+            win = seqs[:, max(0, i - r):min(n, i + r + 1)]
+            upper[:, i] = win.max(axis=1)
+            lower[:, i] = win.min(axis=1)
+        return upper, lower
+
+    def extend(self, names: List[str], frames: List[Any]) -> None:
+        if not frames:
+            return
+        seqs = np.stack([resample(f, self.length) for f in frames]).astype(np.float32)
+        upper, lower = self._envelope(seqs)
+        labels = np.fromiter((self._label(n) for n in names), dtype=np.int32, count=len(names))
+        self.labels = np.concatenate([self.labels, labels])
+        self.seqs = np.concatenate([self.seqs, seqs])
+        self.upper = np.concatenate([self.upper, upper])
+        self.lower = np.concatenate([self.lower, lower])
+
+    def lower_bounds(self, q: np.ndarray) -> np.ndarray:
+        # LB_Kim (first/last frame must align) and LB_Keogh (distance to the band envelope)
+        kim = ((self.seqs[:, 0] - q[0]) ** 2).sum(axis=1) + ((self.seqs[:, -1] - q[-1]) ** 2).sum(axis=1)
+        excess = np.maximum(q - self.upper, 0) + np.maximum(self.lower - q, 0)
+        keogh = (excess ** 2).sum(axis=(1, 2))
+        return np.maximum(kim, keogh)
+
+    def search(self, frames: Any, k: int = 3, chunk: int = 16) -> List[Tuple[str, float]]:
+        """Best DTW distance per sign name (mean squared landmark distance per frame)."""
+        if not len(self):
+            return []
+        q = resample(frames, self.length)
+        lbs = self.lower_bounds(q)
+        order = np.argsort(lbs)
+        best = np.full(len(self.names), np.inf)
+        kth = np.inf
+        start = 0
+        while start < len(order):
+            # batches double in size: the first few set a tight k-th best cheaply, the
+            # rest are aligned together so the per-cell Python overhead is paid once
+            idx = order[start:start + chunk]
+            start, chunk = start + len(idx), chunk * 2
+            if lbs[idx[0]] >= kth:  # bounds are sorted: nothing later can enter the top k
+                self.pruned += len(order) - start + len(idx)
+                break
+            # a template is only worth aligning if its bound beats both the current
+            # k-th best sign and the best distance already found for its own sign
+            limit = np.minimum(kth, best[self.labels[idx]])
+            keep = lbs[idx] < limit
+            self.pruned += int((~keep).sum())
+            idx, limit = idx[keep], limit[keep]
+            if not len(idx):
+                continue
+            t = self.seqs[idx]
+            # squared distances between every query frame and every template frame
+            cost = (q * q).sum(axis=1)[None, :, None] + (t * t).sum(axis=2)[:, None, :] - 2 * (t @ q.T).transpose(0, 2, 1)
+            self.dtw_runs += len(idx)
+            np.minimum.at(best, self.labels[idx], dtw_distance(np.maximum(cost, 0), self.band, limit))
+            if np.isfinite(best).sum() >= k:
+                kth = np.partition(best, k - 1)[k - 1]
+        k = min(k, len(self.names))
+        top = np.argsort(best)[:k]
+        return [(self.names[i], float(best[i]) / self.length) for i in top if np.isfinite(best[i])]
+
+
+def recognize_sequence(index: SequenceIndex, frames: Any, k: int = 3,
+                       max_distance: float = 2.0) -> Dict[str, Any]:
+    matches = index.search(frames, k)
+    best = matches[0] if matches and matches[0][1] <= max_distance else None
+    return {
+        "recognized": best[0] if best else "",
+        "distance": best[1] if best else None,
+        "matches": [{"name": n, "distance": d} for n, d in matches],
+    }
@@ -1,6 +1,299 @@
-from deepface import DeepFace
-import cv2
+# emotion.py
+import asyncio
+import importlib.util
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import numpy as np
+
+log = logging.getLogger("signcall.emotion")
+
+# DeepFace (and the OpenCV that ships with it) is optional: only the worker processes import it
+AVAILABLE = importlib.util.find_spec("deepface") is not None
+
+Item = Tuple[str, bytes, Tuple[int, ...]]  # ("jpeg" | "raw", payload, raw frame shape)
+
+_detector = "opencv"
+
+
+def _init_worker(detector: str = "opencv") -> None:
+    # runs once per worker: load the model and push one frame through it, so the
+    # first real request doesn't pay for TensorFlow start-up and weight loading
+    global _detector
+    _detector = detector
+    from deepface import DeepFace
+    DeepFace.build_model("Emotion")
+    # through the configured detector, so it is built here rather than on the first real frame
+    DeepFace.analyze(np.zeros((224, 224, 3), dtype=np.uint8), actions=["emotion"],
+                     enforce_detection=False, detector_backend=detector, silent=True)
+
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+
+def decode_frame(kind: str, payload: bytes, shape: Tuple[int, ...] = ()) -> np.ndarray:
+    if kind == "jpeg":
+        import cv2
+        img = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("could not decode image")
+        return img
+    arr = np.frombuffer(payload, dtype=np.uint8)
+    if len(shape) != 3 or shape[2] != 3 or arr.size != shape[0] * shape[1] * 3:
+        raise ValueError("raw frames must be height x width x 3 bytes (BGR)")
+    return arr.reshape(shape)
+
+
+def _analyze_one(img: np.ndarray) -> Dict[str, Any]:
+    from deepface import DeepFace
+    res = DeepFace.analyze(img, actions=["emotion"], enforce_detection=False,
+                           detector_backend=_detector, silent=True)[0]
+    return {
+        "emotion": res["dominant_emotion"],
+        "scores": {k: round(float(v), 2) for k, v in res["emotion"].items()},
+        "face": {k: int(v) for k, v in (res.get("region") or {}).items() if isinstance(v, (int, float))},
+    }
+
+
+def _analyze_item(item: Item) -> Dict[str, Any]:
+    # frames travel compressed and are decoded in the worker
+    kind, payload, shape = item
+    try:
+        return _analyze_one(decode_frame(kind, payload, shape))
+    except Exception as e:
+        return {"error": str(e)}
+
 
 def detect_emotion(frame):
+    # single-frame, in-process helper (kept for scripts); the service below is the fast path
+    from deepface import DeepFace
     result = DeepFace.analyze(frame, actions=['emotion'])
     return result[0]['dominant_emotion']
+
+
+class EmotionBusy(Exception):
+    pass
+
+
+THUMB = 32  # change detection compares 32x32 grayscale thumbnails of the face region
+
+
+def thumbnail(kind: str, payload: bytes, shape: Tuple[int, ...] = (),
+              roi: Optional[Dict[str, int]] = None) -> np.ndarray:
+    # cheap: JPEGs are decoded at 1/4 scale straight to grayscale
+    scale = 4
+    if kind == "jpeg":
+        import cv2
+        gray = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+        if gray is None:
+            raise ValueError("could not decode image")
+    else:
+        gray = decode_frame(kind, payload, shape)[::scale, ::scale].mean(axis=2)
+    if roi and roi.get("w") and roi.get("h"):
+        x0, y0 = max(roi["x"] // scale, 0), max(roi["y"] // scale, 0)
+        crop = gray[y0:y0 + max(roi["h"] // scale, 1), x0:x0 + max(roi["w"] // scale, 1)]
+        if crop.size:
+            gray = crop
+    ys = np.linspace(0, gray.shape[0] - 1, THUMB).astype(int)
+    xs = np.linspace(0, gray.shape[1] - 1, THUMB).astype(int)
+    return gray[np.ix_(ys, xs)].astype(np.float32)
+
+
+class EmotionStream:
+    """Continuous emotion for one video stream, analysing only keyframes.
+
+    A frame becomes a keyframe when the face region (the last detected box)
+    changed by more than `threshold` mean grey levels since the previous
+    keyframe, or after `max_gap` frames regardless. Everything else reuses
+    the last result. Only one keyframe is analysed at a time; frames arriving
+    meanwhile are skipped. Scores are smoothed with an exponential moving
+    average (`alpha` weights the newest keyframe) so the label doesn't flicker.
+    """
+
+    def __init__(self, service: "EmotionService", threshold: float = 6.0, max_gap: int = 30,
+                 alpha: float = 0.4, on_result=None):
+        self.service = service
+        self.threshold = threshold
+        self.max_gap = max_gap
+        self.alpha = alpha
+        self.on_result = on_result  # async callback(result) after every analysed keyframe
+        self.scores: Dict[str, float] = {}
+        self.face: Dict[str, int] = {}
+        self._ref: Optional[np.ndarray] = None
+        self._rebase = False  # face box moved: the next frame becomes the reference, unanalysed
+        self._since_key = 0
+        self._busy: Optional[asyncio.Task] = None
+        self.frames = 0
+        self.keyframes = 0
+
+    @property
+    def emotion(self) -> str:
+        return max(self.scores, key=self.scores.get) if self.scores else ""
+
+    def result(self) -> Dict[str, Any]:
+        return {"emotion": self.emotion, "scores": {k: round(v, 2) for k, v in self.scores.items()},
+                "face": self.face, "frames": self.frames, "keyframes": self.keyframes}
+
+    async def push(self, kind: str, payload: bytes, shape: Tuple[int, ...] = ()) -> bool:
+        # returns True if the frame was sent for analysis
+        self.frames += 1
+        self.service.stream_frames += 1
+        self._since_key += 1
+        if self._busy is not None and not self._busy.done():
+            return False
+        thumb = await asyncio.to_thread(thumbnail, kind, payload, shape, self.face)
+        if self._rebase:
+            self._ref, self._rebase = thumb, False
+            return False
+        changed = np.inf if self._ref is None else float(np.abs(thumb - self._ref).mean())
+        if changed < self.threshold and self._since_key < self.max_gap:
+            return False
+        self._ref, self._since_key = thumb, 0
+        self.keyframes += 1
+        self.service.stream_keyframes += 1
+        self._busy = asyncio.get_running_loop().create_task(self._analyze(kind, payload, shape))
+        return True
+
+    async def _analyze(self, kind: str, payload: bytes, shape: Tuple[int, ...]) -> None:
+        try:
+            res = await self.service.analyze(kind, payload, shape)
+        except EmotionBusy:
+            self._ref = None  # retry on the next frame
+            return
+        if "error" in res:
+            return
+        for k, v in res["scores"].items():
+            self.scores[k] = v if k not in self.scores else (1 - self.alpha) * self.scores[k] + self.alpha * v
+        if res.get("face", {}).get("w"):
+            if res["face"] != self.face:
+                self.face = res["face"]
+                self._rebase = True
+        if self.on_result is not None:
+            await self.on_result(self.result())
+
+    async def close(self) -> None:
+        if self._busy is not None:
+            self._busy.cancel()
+
+
+class EmotionService:
+    """Warm DeepFace workers behind an asyncio queue.
+
+    Each frame goes to the next free one of `workers` processes, each of which
+    loaded and warmed the model at start-up. DeepFace.analyze takes one image
+    at a time, so a worker gets one frame per round-trip: grouping frames
+    would only serialise them inside one process while the others sit idle.
+    At most `workers` frames are in flight; beyond `max_pending` queued
+    frames, analyze() raises EmotionBusy.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 256, detector: str = "opencv"):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.detector = detector
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._q: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready = False
+        self.error = ""  # why start() left the service disabled
+        self.frames = 0
+        self.errors = 0
+        self.warmup_s = 0.0
+        self.stream_frames = 0     # frames pushed through EmotionStreams
+        self.stream_keyframes = 0  # ... of which were analysed
+        self._latency: Deque[float] = deque(maxlen=512)
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    async def start(self) -> None:
+        if not AVAILABLE:
+            log.warning("deepface is not installed; emotion service disabled")
+            return
+        t0 = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            # spawn: TensorFlow doesn't survive fork() of a process with running threads
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker, initargs=(self.detector,))
+            # one task per worker makes the pool start (and warm) every process now
+            await asyncio.gather(*(loop.run_in_executor(self._pool, _worker_pid) for _ in range(self.workers)))
+        except Exception as e:
+            # emotion is optional: a worker that can't load the model (missing weights, an
+            # incompatible DeepFace, a BrokenProcessPool) disables the service, not the app
+            self.error = f"{type(e).__name__}: {e}"
+            log.exception("emotion service failed to start; disabled")
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            return
+        self.warmup_s = time.perf_counter() - t0
+        self._q = asyncio.Queue(self.max_pending)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._task = loop.create_task(self._run())
+        self._ready = True
+        log.info("emotion service warm in %.1fs with %d workers", self.warmup_s, self.workers)
+
+    async def analyze(self, kind: str, payload: bytes, shape: Tuple[int, ...] = ()) -> Dict[str, Any]:
+        if not self._ready:
+            raise EmotionBusy("emotion service is not running")
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            self._q.put_nowait(((kind, payload, tuple(shape)), fut, time.perf_counter()))
+        except asyncio.QueueFull:
+            raise EmotionBusy("emotion queue is full")
+        return await fut
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()  # wait for a free worker before taking the next frame
+            item, fut, t0 = await self._q.get()
+            if fut.done():  # caller went away while it was queued
+                self._slots.release()
+                continue
+            loop.create_task(self._dispatch(item, fut, t0))
+
+    async def _dispatch(self, item: Item, fut: asyncio.Future, t0: float) -> None:
+        try:
+            res = await asyncio.get_running_loop().run_in_executor(self._pool, _analyze_item, item)
+        except Exception as e:
+            res = {"error": f"worker failed: {e}"}
+        finally:
+            self._slots.release()
+        self.frames += 1
+        self.errors += "error" in res
+        self._latency.append(time.perf_counter() - t0)
+        if not fut.done():
+            fut.set_result(res)
+
+    async def close(self) -> None:
+        self._ready = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        lat = sorted(self._latency)
+        pct = lambda p: round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 1) if lat else None
+        return {"ready": self._ready, "available": AVAILABLE, "error": self.error, "workers": self.workers,
+                "warmup_s": round(self.warmup_s, 2), "frames": self.frames,
+                "errors": self.errors,
+                "queued": self._q.qsize() if self._q is not None else 0,
+                "p50_ms": pct(0.5), "p95_ms": pct(0.95),
+                "stream_frames": self.stream_frames, "stream_keyframes": self.stream_keyframes}
@@ -0,0 +1,188 @@
+# gesture_cache.py
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+
+from classifier import GestureClassifier
+from dtw import SequenceIndex
+from gestures import TemplateSet, unpack_frames
+
+Row = Dict[str, Any]
+
+
+class UserGestures:
+    """Everything the dictionary routes need for one user, kept in memory."""
+
+    def __init__(self, rows: List[Row], projection=None):
+        self.loaded_at = time.monotonic()
+        self.counts: Dict[str, int] = {}
+        for r in rows:
+            self.counts[r["name"]] = self.counts.get(r["name"], 0) + 1
+        self.templates = TemplateSet.from_embeddings(rows, projection)  # reduced space if projected
+        self.model = GestureClassifier(self.templates)  # refits lazily after each add
+        self.samples: Optional[List[Row]] = None  # packed frames, loaded on first /samples
+        self.sequences: Optional[SequenceIndex] = None  # DTW index, built from samples on first use
+
+    def add(self, row: Row) -> None:
+        self.counts[row["name"]] = self.counts.get(row["name"], 0) + 1
+        self.templates.add(row["name"], row["embedding"])
+        self.model.update()
+        if self.samples is not None:
+            self.samples.append({"name": row["name"], "seq_bin": row["seq_bin"]})
+        if self.sequences is not None:
+            self.sequences.extend([row["name"]], [unpack_frames(row["seq_bin"])])
+
+    def nbytes(self) -> int:
+        size = self.templates.matrix.nbytes + self.templates.labels.nbytes + 64 * len(self.counts)
+        size += self.model.sums.nbytes * 3 + self.model.centroids.nbytes
+        if self.samples is not None:
+            size += sum(len(s["seq_bin"]) + 64 for s in self.samples)
+        if self.sequences is not None:
+            size += self.sequences.nbytes()
+        return size
+
+
+class GestureCache:
+    """Per-user gesture library index: LRU over users, bounded by count and bytes.
+
+    Saves are written through (add), so repeated library loads never touch the
+    database. Entries also expire after `ttl` seconds so that other workers'
+    writes become visible. Templates are kept in `projection`'s reduced space;
+    set_projection() drops every entry so they reload under the new one.
+    """
+
+    def __init__(self, storage, max_users: int = 1000, max_bytes: int = 64 << 20, ttl: float = 300.0,
+                 dtw_band: int = 4, projection=None):
+        self.storage = storage
+        self.dtw_band = dtw_band
+        self.projection = projection
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, UserGestures]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._stale: Set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _fresh(self, user_id: str) -> Optional[UserGestures]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.loaded_at > self.ttl:
+            self._drop(user_id)
+            return None
+        self._entries.move_to_end(user_id)
+        return entry
+
+    async def get(self, user_id: str) -> UserGestures:
+        entry = self._fresh(user_id)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        pending = self._loading.get(user_id)
+        if pending is not None:  # someone is already loading this user
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if pending.cancelled():
+                    return await self.get(user_id)
+                raise
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = fut
+        self._stale.discard(user_id)
+        try:
+            rows = await self.storage.gesture_embeddings(user_id)
+            entry = UserGestures(rows, self.projection)
+            if user_id not in self._stale:  # a save raced the load; serve it but don't keep it
+                self._put(user_id, entry)
+            fut.set_result(entry)
+            return entry
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()
+            raise
+        finally:
+            self._loading.pop(user_id, None)
+            self._stale.discard(user_id)
+
+    async def samples(self, user_id: str, name: str = "") -> List[Row]:
+        entry = await self.get(user_id)
+        rows = entry.samples
+        if rows is None:
+            rows = await self.storage.gesture_samples(user_id)
+            if len(rows) == sum(entry.counts.values()):  # otherwise a save raced the read
+                entry.samples = rows
+                self._resize(user_id)
+        return [s for s in rows if not name or s["name"] == name]
+
+    async def sequences(self, user_id: str) -> SequenceIndex:
+        entry = await self.get(user_id)
+        if entry.sequences is None:
+            rows = await self.samples(user_id)
+            index = SequenceIndex(self.dtw_band)
+            index.extend([r["name"] for r in rows], [unpack_frames(r["seq_bin"]) for r in rows])
+            if entry.samples is not None and entry.sequences is None:  # only keep it if rows were complete
+                entry.sequences = index
+                self._resize(user_id)
+            return index
+        return entry.sequences
+
+    def add(self, user_id: str, rows: List[Row]) -> None:
+        # write-through after a successful insert; uncached users load lazily later
+        if user_id in self._loading:
+            self._stale.add(user_id)
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        for row in rows:
+            entry.add(row)
+        self._resize(user_id)
+
+    def invalidate(self, user_id: str) -> None:
+        self._drop(user_id)
+
+    def set_projection(self, projection) -> None:
+        self.projection = projection
+        for user_id in list(self._entries):
+            self._drop(user_id)
+
+    def _put(self, user_id: str, entry: UserGestures) -> None:
+        self._drop(user_id)
+        self._entries[user_id] = entry
+        self._sizes[user_id] = entry.nbytes()
+        self._bytes += self._sizes[user_id]
+        self._evict()
+
+    def _resize(self, user_id: str) -> None:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        size = entry.nbytes()
+        self._bytes += size - self._sizes[user_id]
+        self._sizes[user_id] = size
+        self._entries.move_to_end(user_id)
+        self._evict()
+
+    def _drop(self, user_id: str) -> None:
+        if self._entries.pop(user_id, None) is not None:
+            self._bytes -= self._sizes.pop(user_id)
+
+    def _evict(self) -> None:
+        # keep the most recently used entry even if it alone exceeds the budget
+        while len(self._entries) > 1 and (len(self._entries) > self.max_users or self._bytes > self.max_bytes):
+            user_id = next(iter(self._entries))
+            self._drop(user_id)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"users": len(self._entries), "bytes": self._bytes, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
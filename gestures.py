@@ -0,0 +1,205 @@
+# gestures.py
+import base64
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+FRAME_DIM = 63   # 21 hand landmarks x (x, y, z), see flatten63 in app.py
+WINDOW = 36      # frames per recorded sample / recognition window
+
+# Packed sample layout (little-endian):
+#   magic "SCG" | version u8 | dtype u8 | reserved u8 | n_frames u16 | dim u16
+#   [u8 only: lo f32 | step f32]  then n_frames * dim values
+PACK_MAGIC = b"SCG"
+PACK_VERSION = 1
+PACK_HEADER = struct.Struct("<3sBBBHH")
+PACK_QUANT = struct.Struct("<ff")
+PACK_DTYPES = {"f16": (1, "<f2"), "f32": (2, "<f4"), "u8": (3, "u1")}
+_DTYPE_BY_CODE = {code: (name, np_dtype) for name, (code, np_dtype) in PACK_DTYPES.items()}
+
+
+def as_frames(frames: Any) -> np.ndarray:
+    arr = np.asarray(frames, dtype=np.float32)
+    if arr.ndim != 2 or arr.shape[1] != FRAME_DIM or arr.shape[0] == 0:
+        raise ValueError(f"frames must be a non-empty N x {FRAME_DIM} array")
+    if not np.isfinite(arr).all():  # JSON null becomes NaN on the way in
+        raise ValueError("frames must be finite numbers")
+    return arr
+
+
+def pack_frames(frames: Any, dtype: str = "f16") -> bytes:
+    arr = as_frames(frames)
+    if arr.shape[0] > 0xFFFF:
+        raise ValueError("too many frames in one sample")
+    if dtype not in PACK_DTYPES:
+        raise ValueError(f"dtype must be one of {sorted(PACK_DTYPES)}")
+    code, np_dtype = PACK_DTYPES[dtype]
+    head = PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, code, 0, arr.shape[0], arr.shape[1])
+    if dtype == "u8":
+        # per-sample linear quantisation to 256 levels
+        lo, hi = float(arr.min()), float(arr.max())
+        step = (hi - lo) / 255.0 or 1.0
+        q = np.clip(np.rint((arr - lo) / step), 0, 255).astype(np.uint8)
+        return head + PACK_QUANT.pack(lo, step) + q.tobytes()
+    return head + arr.astype(np_dtype).tobytes()
+
+
+def unpack_frames(buf: bytes) -> np.ndarray:
+    if len(buf) < PACK_HEADER.size:
+        raise ValueError("packed sample is truncated")
+    magic, version, code, _, n, dim = PACK_HEADER.unpack_from(buf)
+    if magic != PACK_MAGIC or version != PACK_VERSION or code not in _DTYPE_BY_CODE:
+        raise ValueError("not a packed gesture sample")
+    name, np_dtype = _DTYPE_BY_CODE[code]
+    offset = PACK_HEADER.size
+    if name == "u8":
+        lo, step = PACK_QUANT.unpack_from(buf, offset)
+        offset += PACK_QUANT.size
+        q = np.frombuffer(buf, dtype=np.uint8, count=n * dim, offset=offset)
+        return (q.astype(np.float32) * step + lo).reshape(n, dim)
+    return np.frombuffer(buf, dtype=np_dtype, count=n * dim, offset=offset).astype(np.float32).reshape(n, dim)
+
+
+def sample_bytes(seq_json: Any, dtype: str = "f16") -> bytes:
+    # stored seq_json is either legacy {"frames": [...]} or packed {"packed": base64}
+    if isinstance(seq_json, dict) and seq_json.get("packed"):
+        return base64.b64decode(seq_json["packed"])
+    return pack_frames((seq_json or {}).get("frames"), dtype)
+
+
+def packed_json(buf: bytes) -> Dict[str, str]:
+    return {"packed": base64.b64encode(buf).decode("ascii")}
+
+
+def pack_library(rows: Iterable[Dict[str, Any]]) -> bytes:
+    # samples download: count u32, then per sample: name_len u16 | name utf-8 | size u32 | packed sample
+    parts = []
+    for row in rows:
+        name = (row.get("name") or "custom").encode("utf-8")
+        blob = row["seq_bin"]
+        parts.append(struct.pack("<H", len(name)) + name + struct.pack("<I", len(blob)) + blob)
+    return struct.pack("<I", len(parts)) + b"".join(parts)
+
+
+def embedding_bytes(vec: np.ndarray) -> bytes:
+    return np.asarray(vec, dtype="<f4").tobytes()
+
+
+def embedding_from_bytes(buf: bytes) -> np.ndarray:
+    vec = np.frombuffer(buf, dtype="<f4").astype(np.float32)
+    if vec.shape[0] != FRAME_DIM:
+        raise ValueError("bad embedding size")
+    return vec
+
+
+def normalize(vec: np.ndarray) -> np.ndarray:
+    return vec / (np.linalg.norm(vec, axis=-1, keepdims=True) + 1e-9)
+
+
+def embed(frames: Any) -> np.ndarray:
+    # same as the browser's meanVec, pre-normalised so cosine becomes a dot product
+    return normalize(as_frames(frames).mean(axis=0))
+
+
+class TemplateSet:
+    """One user's templates: a (n, dim) matrix of unit rows plus the sign name of each row.
+
+    Rows and queries come in as 63-d embeddings; with a `projection` (see
+    projection.py) they are stored and compared in its reduced space.
+    """
+
+    def __init__(self, projection=None):
+        self.projection = projection
+        self.dim = projection.dim if projection is not None else FRAME_DIM
+        self.names: List[str] = []              # distinct sign names
+        self._name_ids: Dict[str, int] = {}
+        self.labels = np.zeros(0, dtype=np.int32)  # row -> index into names
+        self.matrix = np.zeros((0, self.dim), dtype=np.float32)
+
+    @classmethod
+    def from_embeddings(cls, rows: Iterable[Dict[str, Any]], projection=None) -> "TemplateSet":
+        # rows: {"name", "embedding"} as returned by Storage.gesture_embeddings
+        ts = cls(projection)
+        rows = [r for r in rows if r.get("embedding") is not None]
+        ts.extend([r.get("name") or "custom" for r in rows], [r["embedding"] for r in rows])
+        return ts
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def _label(self, name: str) -> int:
+        if name not in self._name_ids:
+            self._name_ids[name] = len(self.names)
+            self.names.append(name)
+        return self._name_ids[name]
+
+    def project(self, vecs: Any) -> np.ndarray:
+        # 63-d embeddings -> unit rows in this set's space
+        vecs = np.asarray(vecs, dtype=np.float32)
+        if self.projection is not None:
+            vecs = self.projection.apply(vecs)
+        return normalize(vecs)
+
+    def extend(self, names: List[str], vecs: List[np.ndarray]) -> None:
+        if not vecs:
+            return
+        labels = np.fromiter((self._label(n) for n in names), dtype=np.int32, count=len(names))
+        self.labels = np.concatenate([self.labels, labels])
+        self.matrix = np.vstack([self.matrix, self.project(np.stack(vecs))])
+
+    def add(self, name: str, vec: np.ndarray) -> None:
+        self.extend([name], [vec])
+
+    def grouped(self, decimals: int = 4) -> Dict[str, List[List[float]]]:
+        out: Dict[str, List[List[float]]] = {n: [] for n in self.names}
+        for label, row in zip(self.labels, np.round(self.matrix, decimals).tolist()):
+            out[self.names[label]].append(row)
+        return out
+
+    def top_k(self, query: np.ndarray, k: int = 3) -> List[Tuple[str, float]]:
+        # one mat-vec for every template, then best score per sign name
+        if not len(self):
+            return []
+        scores = self.matrix @ self.project(query)
+        best = np.full(len(self.names), -np.inf, dtype=np.float32)
+        np.maximum.at(best, self.labels, scores)
+        k = min(k, len(self.names))
+        top = np.argpartition(-best, k - 1)[:k]
+        top = top[np.argsort(-best[top])]
+        return [(self.names[i], float(best[i])) for i in top]
+
+
+def sample_embedding(seq_bin: bytes) -> Optional[np.ndarray]:
+    # for rows stored before embeddings were precomputed
+    try:
+        return embed(unpack_frames(seq_bin))
+    except (ValueError, TypeError, struct.error):
+        return None
+
+
+def query_vector(frames: Optional[Any] = None, vector: Optional[Any] = None) -> np.ndarray:
+    # a request body carries either a raw window of frames or its precomputed mean vector
+    if vector is not None:
+        query = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if query.shape[0] != FRAME_DIM:
+            raise ValueError(f"vector must have {FRAME_DIM} values")
+        if not np.isfinite(query).all():
+            raise ValueError("vector must be finite numbers")
+        return query
+    return as_frames(frames).mean(axis=0)
+
+
+def recognize(templates: TemplateSet, frames: Optional[Any] = None, vector: Optional[Any] = None,
+              k: int = 3, min_score: float = 0.92) -> Dict[str, Any]:
+    query = query_vector(frames, vector)
+    matches = templates.top_k(query, k)
+    if templates.projection is not None:
+        # reduced-space cosines run high; report (and threshold) them on the 63-d scale
+        matches = [(n, templates.projection.original_cosine(s)) for n, s in matches]
+    best = matches[0] if matches and matches[0][1] >= min_score else None
+    return {
+        "recognized": best[0] if best else "",
+        "score": best[1] if best else 0.0,
+        "matches": [{"name": n, "score": s} for n, s in matches],
+    }
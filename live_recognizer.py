@@ -0,0 +1,237 @@
+# live_recognizer.py
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+import numpy as np
+
+from classifier import GestureClassifier
+from gestures import FRAME_DIM, WINDOW, normalize
+
+log = logging.getLogger("signcall.live")
+
+FRAME_DTYPES = {"f32": "<f4", "f16": "<f2"}
+
+
+class LiveSession:
+    """One landmark stream: a ring buffer of the last `window` frames and its running sum."""
+
+    def __init__(self, user_id: str, on_caption: Callable[[Dict[str, Any]], Awaitable[None]],
+                 window: int = WINDOW, dtype: str = "f32"):
+        if dtype not in FRAME_DTYPES:
+            raise ValueError(f"dtype must be one of {sorted(FRAME_DTYPES)}")
+        self.user_id = user_id
+        self.on_caption = on_caption
+        self.dtype = np.dtype(FRAME_DTYPES[dtype])
+        self.ring = np.zeros((window, FRAME_DIM), dtype=np.float32)
+        self.sum = np.zeros(FRAME_DIM, dtype=np.float64)
+        self.pos = 0
+        self.count = 0       # frames in the ring (<= window)
+        self.dirty = False   # new frames since the last score
+        self.frames = 0
+        self.label = ""      # label seen on the last scored ticks ...
+        self.run = 0         # ... for this many ticks in a row
+        self.sent = ""       # label of the last caption; "" re-arms
+        self._sending: Optional[asyncio.Task] = None
+
+    def push(self, payload: bytes) -> int:
+        # payload: one or more frames of 63 little-endian values; returns the frame count
+        if not payload or len(payload) % (FRAME_DIM * self.dtype.itemsize):
+            raise ValueError(f"frames must be a multiple of {FRAME_DIM} {self.dtype.name} values")
+        frames = np.frombuffer(payload, dtype=self.dtype).reshape(-1, FRAME_DIM)
+        if not np.isfinite(frames).all():
+            raise ValueError("frames must be finite")
+        window = len(self.ring)
+        for frame in frames[-window:]:
+            if self.count == window:
+                self.sum -= self.ring[self.pos]
+            else:
+                self.count += 1
+            self.ring[self.pos] = frame
+            self.sum += frame
+            self.pos = (self.pos + 1) % window
+            if self.pos == 0:  # re-sum once per lap so float error can't accumulate
+                self.sum = self.ring[:self.count].sum(axis=0, dtype=np.float64)
+        self.frames += len(frames)
+        self.dirty = True
+        return len(frames)
+
+    def reset(self) -> None:
+        # hand left the frame: start a fresh window and allow the same sign again
+        self.sum[:] = 0
+        self.pos = self.count = self.run = 0
+        self.dirty = False
+        self.label = self.sent = ""
+
+    def mean(self) -> np.ndarray:
+        return (self.sum / max(self.count, 1)).astype(np.float32)
+
+
+class LiveRecognizer:
+    """Server-side recognition for streamed landmarks, scored in batches.
+
+    Every `interval` seconds one tick scores every session that received
+    frames since the last tick and holds at least `min_frames`: the window
+    means of all sessions go through their users' classifiers in one batched
+    pass over a padded (sessions, signs, 63) centroid stack, so per-frame work
+    stays at one ring-buffer update. A caption is pushed when a sign has had
+    probability >= `min_confidence` for `stable` ticks in a row, and only once
+    until the stream shows something else (edge-triggered).
+    """
+
+    def __init__(self, load: Callable[[str], Awaitable[GestureClassifier]], interval: float = 1 / 30,
+                 min_frames: int = 12, min_confidence: float = 0.6, stable: int = 2):
+        self.load = load
+        self.interval = interval
+        self.min_frames = min_frames
+        self.min_confidence = min_confidence
+        self.stable = stable
+        self.sessions: Set[LiveSession] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._stack_src: List[GestureClassifier] = []
+        self._stack_versions: List[int] = []
+        self._stack: Optional[Dict[str, np.ndarray]] = None
+        self.ticks = 0
+        self.scored = 0
+        self.captions = 0
+        self.errors = 0
+        self._tick_ms: Deque[float] = deque(maxlen=512)
+
+    def open(self, user_id: str, on_caption, dtype: str = "f32") -> LiveSession:
+        session = LiveSession(user_id, on_caption, dtype=dtype)
+        self.sessions.add(session)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return session
+
+    def close_session(self, session: LiveSession) -> None:
+        self.sessions.discard(session)
+        if session._sending is not None:
+            session._sending.cancel()
+
+    async def close(self) -> None:
+        for session in list(self.sessions):
+            self.close_session(session)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_at = loop.time()
+        while self.sessions:
+            t0 = time.perf_counter()
+            try:
+                await self.tick()
+            except Exception:
+                self.errors += 1
+                log.exception("live recognition tick failed")
+            self._tick_ms.append((time.perf_counter() - t0) * 1000)
+            # fixed rate; a slow tick delays the next one instead of queueing more
+            next_at = max(next_at + self.interval, loop.time())
+            await asyncio.sleep(next_at - loop.time())
+
+    def _padded(self, models: List[GestureClassifier]) -> Dict[str, np.ndarray]:
+        # per-user parameters padded to the largest sign count and model dimension (zero
+        # padding adds nothing to a distance); rebuilt only when a model changes
+        for m in models:
+            m.fit()
+        versions = [m.version for m in models]
+        if len(models) == len(self._stack_src) and versions == self._stack_versions and all(
+                a is b for a, b in zip(models, self._stack_src)):
+            return self._stack
+        width = max(1, max(len(m) for m in models))
+        dim = max(m.dim for m in models)
+        components = np.zeros((len(models), dim, FRAME_DIM), dtype=np.float32)
+        centroids = np.zeros((len(models), width, dim), dtype=np.float32)
+        inv_var = np.zeros((len(models), dim), dtype=np.float32)
+        valid = np.zeros((len(models), width), dtype=bool)
+        for i, m in enumerate(models):
+            projection = m.templates.projection
+            components[i, :m.dim] = projection.components if projection is not None else np.eye(FRAME_DIM)
+            centroids[i, :len(m), :m.dim] = m.centroids
+            inv_var[i, :m.dim] = m.inv_var
+            valid[i, :len(m)] = True
+        self._stack_src, self._stack_versions = list(models), versions
+        self._stack = {
+            "components": components, "centroids": centroids, "valid": valid, "inv_var": inv_var,
+            "temperature": np.array([m.temperature for m in models], dtype=np.float32),
+            "reject": np.array([m.reject for m in models], dtype=np.float32),
+        }
+        return self._stack
+
+    async def tick(self) -> None:
+        due = [s for s in self.sessions if s.dirty and s.count >= self.min_frames]
+        if not due:
+            return
+        self.ticks += 1
+        users = sorted({s.user_id for s in due})
+        loaded = await asyncio.gather(*(self.load(u) for u in users), return_exceptions=True)
+        failed = {u for u, m in zip(users, loaded) if isinstance(m, BaseException)}
+        if failed:
+            # one user's storage error mustn't stall everyone else's captions; their
+            # sessions stay dirty and are retried on the next tick
+            self.errors += len(failed)
+            for u, m in zip(users, loaded):
+                if u in failed:
+                    log.warning("live recognition: loading %s failed: %r", u, m)
+            due = [s for s in due if s.user_id not in failed]
+            if not due:
+                return
+            users = [u for u in users if u not in failed]
+        models = [m for m in loaded if not isinstance(m, BaseException)]
+        slot = {u: i for i, u in enumerate(users)}
+        p = self._padded(list(models))
+        rows = np.fromiter((slot[s.user_id] for s in due), dtype=np.intp, count=len(due))
+        # one batched pass: each session's window mean is projected into its user's model
+        # space and compared with that user's centroids only
+        queries = normalize(np.einsum("sd,skd->sk", np.stack([s.mean() for s in due]), p["components"][rows]))
+        iv = p["inv_var"][rows]
+        diff = queries[:, None, :] - p["centroids"][rows]
+        logits = -np.einsum("scd,sd->sc", diff * diff, iv) / (2 * p["temperature"][rows, None])
+        logits[~p["valid"][rows]] = -np.inf
+        reject = -p["reject"][rows] / (2 * p["temperature"][rows])
+        top = logits.max(axis=1, initial=-np.inf)
+        shift = np.maximum(top, reject)
+        denom = np.exp(logits - shift[:, None]).sum(axis=1) + np.exp(reject - shift)
+        best = logits.argmax(axis=1)
+        confidence = np.exp(top - shift) / denom
+        self.scored += len(due)
+        for s, i, label, conf in zip(due, rows, best, confidence):
+            s.dirty = False
+            model = models[i]
+            ok = len(model) and conf >= self.min_confidence
+            self._update(s, model.names[label] if ok else "", float(conf))
+
+    def _update(self, session: LiveSession, label: str, score: float) -> None:
+        if label == session.label:
+            session.run += 1
+        else:
+            session.label, session.run = label, 1
+        if session.run < self.stable or label == session.sent:
+            return
+        if not label:
+            session.sent = ""
+            return
+        if session._sending is not None and not session._sending.done():
+            # the client isn't keeping up: nothing is marked sent, so a sign that is still
+            # held goes out on a later tick; one replaced meanwhile is skipped
+            return
+        session.sent = label
+        self.captions += 1
+        session._sending = asyncio.get_running_loop().create_task(
+            session.on_caption({"type": "caption", "text": label, "confidence": round(score, 4)}))
+
+    def stats(self) -> Dict[str, Any]:
+        lat = sorted(self._tick_ms)
+        pct = lambda p: round(lat[min(len(lat) - 1, int(p * len(lat)))], 2) if lat else None
+        return {"sessions": len(self.sessions), "frames": sum(s.frames for s in self.sessions),
+                "ticks": self.ticks, "scored": self.scored, "captions": self.captions,
+                "errors": self.errors, "avg_batch": round(self.scored / self.ticks, 2) if self.ticks else 0,
+                "tick_p50_ms": pct(0.5), "tick_p95_ms": pct(0.95)}
@@ -1,42 +1,127 @@
 # main.py
-from fastapi import FastAPI, HTTPException, Body, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Body, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from typing import Dict, Any, List
-from supabase import create_client
-import requests
+from supabase import acreate_client
+from translation import TranslationCache, Translator
+from message_bus import MessageBus, RESYNC
+from message_writer import MessageWriter, WriterOverloaded
+from dedup import CaptionDedup
+from storage import Storage, message_cursor, open_storage, parse_cursor
+from ann import SharedDictionary
+from projection import ProjectionStore
+from gesture_cache import GestureCache
+from rooms import CLOSE_ROOM_FULL, RoomFull, RoomRegistry
+from backplane import open_backplane
+from emotion import EmotionBusy, EmotionService, EmotionStream
+from classifier import classify
+from dtw import recognize_sequence
+from live_recognizer import LiveRecognizer
+from gestures import embed, query_vector, pack_frames, pack_library, recognize, unpack_frames
+import asyncio
+import hashlib
+import json
+import threading
 import os
 
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY) if SUPABASE_URL and SUPABASE_KEY else None
+DB_CONCURRENCY = int(os.getenv("DB_CONCURRENCY", "64"))  # simultaneous Supabase round-trips per worker
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "")      # "supabase" | "sqlite" | "" = Supabase if configured
+SQLITE_PATH = os.getenv("SQLITE_PATH", "signcall.db")
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "4"))
+supabase = None  # AsyncClient, created on startup when configured (auth + Supabase storage)
+storage: Storage = None  # message / gesture persistence, opened on startup
+gesture_cache: GestureCache = None  # per-user template index in front of storage
+dictionary: SharedDictionary = None  # ANN index over every user's templates
+projections: ProjectionStore = None  # global PCA projection the per-user templates are stored in
 
 app = FastAPI(title="SignCall Backend", version="1.1.0")
 
+@app.on_event("startup")
+async def _open_storage():
+    global supabase, storage, gesture_cache, dictionary, projections
+    if SUPABASE_URL and SUPABASE_KEY:
+        supabase = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
+    storage = open_storage(STORAGE_BACKEND, supabase, SQLITE_PATH, DB_CONCURRENCY, SQLITE_POOL_SIZE)
+    projections = ProjectionStore(
+        storage,
+        path=os.getenv("PROJECTION_PATH", "gesture_projection.npz"),
+        dim=int(os.getenv("PROJECTION_DIM", "16")),                    # 0 keeps templates at 63 dims
+        min_samples=int(os.getenv("PROJECTION_MIN_SAMPLES", "256")),   # identity until this many are stored
+        poll=float(os.getenv("PROJECTION_POLL_S", "5")),               # how soon other workers' fits are adopted
+    )
+    if not projections.load():
+        asyncio.get_running_loop().create_task(projections.refit(force=False))
+    projections.start()  # picks up fits written by other workers
+    gesture_cache = GestureCache(
+        storage,
+        max_users=int(os.getenv("GESTURE_CACHE_USERS", "1000")),
+        max_bytes=int(os.getenv("GESTURE_CACHE_MB", "64")) << 20,
+        ttl=float(os.getenv("GESTURE_CACHE_TTL", "300")),
+        dtw_band=int(os.getenv("DTW_BAND", "4")),
+        projection=projections.current,
+    )
+    projections.listeners.append(gesture_cache.set_projection)
+    dictionary = SharedDictionary(
+        storage,
+        path=os.getenv("DICTIONARY_PATH", "gesture_dictionary.npz"),
+        nprobe=int(os.getenv("DICTIONARY_NPROBE", "8")),
+    )
+    if dictionary.load():  # otherwise built from storage on first search
+        loop = asyncio.get_running_loop()
+        loop.create_task(dictionary.verify()).add_done_callback(lambda t: t.cancelled() or t.exception())
+
+@app.on_event("shutdown")
+async def _close_storage():
+    await message_writer.close()
+    await projections.close()
+    await dictionary.flush()
+    dictionary.save()
+    await storage.close()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],          # tighten later
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-History-Count", "X-Next-Cursor"],
 )
 
 EMOJI_MAP = {"yes": "👍", "no": "👎", "hello": "✌"}
+HISTORY_PAGE_MAX = int(os.getenv("HISTORY_PAGE_MAX", "1000"))
+
+_ts_lock = threading.Lock()
+_last_ts = datetime.min
+
+def next_timestamp() -> str:
+    # strictly increasing per process; other workers can stamp the same instant, so
+    # cursors pair the timestamp with the row id (storage.message_cursor)
+    global _last_ts
+    with _ts_lock:
+        now = datetime.now()
+        if now <= _last_ts:
+            now = _last_ts + timedelta(microseconds=1)
+        _last_ts = now
+        return now.isoformat()
 
 @app.get("/health")
-def health():
-    return {"ok": True, "time": datetime.now().isoformat()}
+async def health():
+    return {"ok": True, "time": datetime.now().isoformat(), "storage": storage.name if storage else None}
 
 # ---------- Auth ----------
 @app.post("/signup")
-def signup(email: str, password: str):
+async def signup(email: str, password: str):
     if not supabase:
         raise HTTPException(400, "Supabase not configured on server.")
     try:
-        res = supabase.auth.sign_up({"email": email, "password": password})
+        res = await supabase.auth.sign_up({"email": email, "password": password})
         user = res.user
         if not user:
             raise HTTPException(status_code=400, detail="Signup failed (no user returned)")
@@ -45,11 +130,11 @@ def signup(email: str, password: str):
         raise HTTPException(status_code=400, detail=f"Signup failed: {e}")
 
 @app.post("/login")
-def login(email: str, password: str):
+async def login(email: str, password: str):
     if not supabase:
         raise HTTPException(400, "Supabase not configured on server.")
     try:
-        res = supabase.auth.sign_in_with_password({"email": email, "password": password})
+        res = await supabase.auth.sign_in_with_password({"email": email, "password": password})
         user = res.user
         if not user:
             raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -58,158 +143,560 @@ def login(email: str, password: str):
         raise HTTPException(status_code=401, detail=f"Login failed: {e}")
 
 # ---------- Messages ----------
+MESSAGE_ACK = os.getenv("MESSAGE_ACK", "queued")  # "queued": return once buffered, "saved": once committed (202 "pending" while spilled)
+
+message_bus = MessageBus()
+
+def _publish_committed(rows: List[Dict[str, Any]]):
+    for row in rows:
+        message_bus.publish(row["user_id"], row)
+
+message_writer = MessageWriter(
+    lambda rows: storage.insert_messages(rows),
+    on_commit=_publish_committed,
+    batch_size=int(os.getenv("MESSAGE_BATCH_SIZE", "50")),
+    interval=float(os.getenv("MESSAGE_BATCH_MS", "100")) / 1000,
+    max_pending=int(os.getenv("MESSAGE_QUEUE_MAX", "10000")),
+    max_spill=int(os.getenv("MESSAGE_SPILL_MAX", "50000")),     # failed rows kept for retry while the DB is down
+)
+
+# a recognised-sign caption repeated by the same sender within this window is collapsed
+# (held signs fire every frame); typed chat is never deduped
+caption_dedup = CaptionDedup(window=int(os.getenv("CAPTION_DEDUP_MS", "1500")) / 1000.0)
+
+def queue_message(user_id: str, content: str, emoji: str = "", language: str = "en"):
+    # stamp and enqueue without yielding so commit order matches timestamp order
+    key = (content or "").strip().lower()
+    if not emoji and key in EMOJI_MAP:
+        emoji = EMOJI_MAP[key]
+    data = {
+        "user_id": user_id,
+        "content": content,
+        "emoji": emoji,
+        "language": language,
+    }
+    data["timestamp"] = next_timestamp()
+    return data, message_writer.submit(data)
+
 @app.post("/message")
-def save_message(user_id: str, content: str, emoji: str = "", language: str = "en"):
-    if not supabase:
-        # fall back: pretend saved, return echo (so front-end still works without DB)
-        key = (content or "").strip().lower()
-        emoji = emoji or EMOJI_MAP.get(key, "")
-        return {"status": "ok_no_db", "data": {
-            "user_id": user_id, "content": content, "emoji": emoji,
-            "language": language, "timestamp": datetime.now().isoformat()
-        }}
-    try:
-        key = (content or "").strip().lower()
-        if not emoji and key in EMOJI_MAP:
-            emoji = EMOJI_MAP[key]
-        data = {
-            "user_id": user_id,
-            "content": content,
-            "emoji": emoji,
-            "language": language,
-            "timestamp": datetime.now().isoformat(),
-        }
-        supabase.table("messages").insert(data).execute()
-        return {"status": "saved", "data": data}
+async def save_message(user_id: str, content: str, response: Response, emoji: str = "", language: str = "en",
+                 ack: str = Query("", pattern="^(|queued|saved)$"),
+                 source: str = Query("chat", pattern="^(chat|sign)$")):
+    # source=sign: a recognised-sign caption; repeats within the window return the saved row
+    key = f"user|{user_id}"
+    if source == "sign":
+        repeat = caption_dedup.check(key, content or "")
+        if repeat:
+            data = caption_dedup.attached(key)  # the queued row; it gains its id once committed
+            return {"status": "deduped", "repeat": repeat, "data": {**data, "repeat": repeat} if data else None}
+    try:
+        data, pending = queue_message(user_id, content, emoji, language)
+    except WriterOverloaded as e:
+        if source == "sign":
+            caption_dedup.forget(key)
+        raise HTTPException(status_code=503, detail=f"DB insert failed: {e}")
+    if source == "sign":
+        caption_dedup.attach(key, data)
+    if (ack or MESSAGE_ACK) != "saved":
+        return {"status": "queued", "data": data}
+    try:
+        saved = await message_writer.wait_saved(pending, 10)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"DB insert failed: {e}")
+    if not saved:
+        # the database is down: the row is kept in the writer's spill list and retried
+        response.status_code = 202
+        return {"status": "pending", "data": data}
+    return {"status": "saved", "data": data}
+
+@app.get("/message/stats")
+async def message_stats():
+    return {"writer": message_writer.stats(), "dedup": caption_dedup.stats()}
 
 @app.get("/history/{user_id}")
-def get_history(user_id: str):
-    if not supabase:
-        return []  # no DB -> just return empty history
+async def get_history(user_id: str, request: Request, response: Response, since: str = "",
+                limit: int = Query(HISTORY_PAGE_MAX, ge=1, le=HISTORY_PAGE_MAX)):
+    try:
+        parse_cursor(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bad cursor")
     try:
-        res = (
-            supabase.table("messages")
-            .select("*")
-            .eq("user_id", user_id)
-            .order("timestamp", desc=False)
-            .execute()
-        )
-        return res.data
+        total, newest = await storage.history_head(user_id)
+        etag = 'W/"%s"' % hashlib.sha1(f"{user_id}|{total}|{newest}".encode()).hexdigest()[:20]
+        headers = {"ETag": etag, "X-History-Count": str(total)}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        rows = await storage.fetch_messages(user_id, since, limit)
+        if len(rows) == limit:
+            headers["X-Next-Cursor"] = message_cursor(rows[-1])
+        response.headers.update(headers)
+        return rows
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"DB fetch failed: {e}")
 
 @app.delete("/history/{user_id}")
-def clear_history(user_id: str):
-    if not supabase:
-        return {"status": "ok_no_db"}
+async def clear_history(user_id: str):
     try:
-        supabase.table("messages").delete().eq("user_id", user_id).execute()
+        await storage.clear_messages(user_id)
+        message_bus.publish(user_id, {"type": "cleared"})
         return {"status": "cleared"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"DB delete failed: {e}")
 
+def _sse(event: str, data: Dict[str, Any], event_id: str = "") -> str:
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/stream/{user_id}")
+async def stream_messages(user_id: str, request: Request, since: str = "",
+                          keepalive: float = Query(15.0, ge=0.5, le=60.0)):
+    # Server-sent events: one "message" event per committed row.
+    # Reconnects resume from Last-Event-ID (or ?since=) so nothing is missed in between.
+    cursor = request.headers.get("last-event-id") or since
+    try:
+        start = parse_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bad cursor")
+    sub = message_bus.subscribe(user_id)  # subscribe before the backlog read so no gap
+
+    async def events():
+        last, after = cursor, start
+        sent = set()  # backlog ids: the same rows may also be queued on `sub`
+        try:
+            if cursor:
+                while True:
+                    rows = await storage.fetch_messages(user_id, last, HISTORY_PAGE_MAX)
+                    for row in rows:
+                        last, after = message_cursor(row), (row["timestamp"], row["id"])
+                        sent.add(row["id"])
+                        yield _sse("message", row, last)
+                    if len(rows) < HISTORY_PAGE_MAX:
+                        break
+            while not await request.is_disconnected():
+                try:
+                    ev = await asyncio.wait_for(sub.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if ev is RESYNC:
+                    yield _sse("resync", {"since": last})
+                    break
+                if ev.get("type") == "cleared":
+                    yield _sse("cleared", {})
+                    continue
+                if ev["id"] in sent:
+                    continue  # already sent from the backlog
+                # workers commit independently, so live rows may arrive slightly out of
+                # (timestamp, id) order; the resume cursor stays the newest one sent
+                if (ev["timestamp"], ev["id"]) > after:
+                    last, after = message_cursor(ev), (ev["timestamp"], ev["id"])
+                yield _sse("message", ev, message_cursor(ev))
+        finally:
+            message_bus.unsubscribe(user_id, sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # ---------- Translate ----------
+MAX_TRANSLATE_BATCH = int(os.getenv("MAX_TRANSLATE_BATCH", "200"))
+translator = Translator(TranslationCache())
+
+@app.on_event("shutdown")
+async def _close_translator():
+    await translator.close()
+
 @app.get("/translate")
-def translate(text: str, lang: str):
+async def translate(text: str, lang: str):
     try:
-        url = f"https://api.mymemory.translated.net/get?q={requests.utils.quote(text)}&langpair=en|{lang}"
-        res = requests.get(url, timeout=10).json()
-        out = res.get("responseData", {}).get("translatedText", "")
-        return {"translated": out}
+        return {"translated": await translator.translate(text, lang)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Translate failed: {e}")
 
-# ---------- Personal dictionary (optional; safe if no DB) ----------
+@app.post("/translate/batch")
+async def translate_batch(texts: List[str] = Body(...), langs: List[str] = Body(...)):
+    if len(texts) * max(len(langs), 1) > MAX_TRANSLATE_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_TRANSLATE_BATCH} (text, lang) pairs per batch")
+    return {"translations": await translator.translate_many(texts, langs)}
+
+@app.get("/translate/stats")
+async def translate_stats():
+    return translator.stats()
+
+# ---------- Personal dictionary ----------
+GESTURE_SAMPLE_DTYPE = os.getenv("GESTURE_SAMPLE_DTYPE", "f16")  # "f16" | "f32" | "u8" (quantised)
+MAX_GESTURE_BATCH = int(os.getenv("MAX_GESTURE_BATCH", "64"))
+
+def _gesture_row(user_id: str, name: str, sample_idx: int, seq_json: Any) -> Dict[str, Any]:
+    if not isinstance(seq_json, dict) or "frames" not in seq_json:
+        raise HTTPException(status_code=400, detail="seq_json must contain 'frames'")
+    return {
+        "user_id": user_id,
+        "name": name,
+        "sample_idx": sample_idx,
+        "seq_bin": pack_frames(seq_json["frames"], GESTURE_SAMPLE_DTYPE),
+        "embedding": embed(seq_json["frames"]),
+    }
+
+async def _save_gestures(user_id: str, rows: List[Dict[str, Any]]) -> None:
+    await storage.insert_gestures(rows)
+    gesture_cache.add(user_id, rows)
+    projections.saved(len(rows))
+    for row in rows:
+        dictionary.add(user_id, row["name"], row["embedding"], row.get("id"))
+
 @app.post("/custom_gesture/save")
-def custom_gesture_save(user_id: str, name: str, sample_idx: int, seq_json: Dict[str, Any] = Body(...)):
-    if not supabase:
-        return {"ok": True, "note": "no DB configured"}
-    try:
-        if not isinstance(seq_json, dict) or "frames" not in seq_json:
-            raise HTTPException(status_code=400, detail="seq_json must contain 'frames'")
-        supabase.table("custom_gestures").insert({
-            "user_id": user_id,
-            "name": name,
-            "sample_idx": sample_idx,
-            "seq_json": seq_json,
-        }).execute()
+async def custom_gesture_save(user_id: str, name: str, sample_idx: int, seq_json: Dict[str, Any] = Body(...)):
+    try:
+        await _save_gestures(user_id, [_gesture_row(user_id, name, sample_idx, seq_json)])
         return {"ok": True}
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"save_custom_gesture failed: {e}")
 
+@app.post("/custom_gesture/save_batch")
+async def custom_gesture_save_batch(user_id: str, name: str, body: Dict[str, Any] = Body(...)):
+    # body: {"samples": [{"sample_idx": 1, "frames": [[63 floats] x 36]}, ...]}; one bulk insert,
+    # all-or-nothing (any malformed sample rejects the whole batch)
+    try:
+        samples = body.get("samples")
+        if not isinstance(samples, list) or not samples:
+            raise HTTPException(status_code=400, detail="body must contain a non-empty 'samples' list")
+        if len(samples) > MAX_GESTURE_BATCH:
+            raise HTTPException(status_code=413, detail=f"at most {MAX_GESTURE_BATCH} samples per batch")
+        if not all(isinstance(s, dict) for s in samples):
+            raise HTTPException(status_code=400, detail="each sample must be an object with 'frames'")
+        rows = [_gesture_row(user_id, name, int(s.get("sample_idx", i + 1)), s) for i, s in enumerate(samples)]
+        await _save_gestures(user_id, rows)
+        return {"ok": True, "saved": len(rows)}
+    except HTTPException:
+        raise
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"custom_gesture_save_batch failed: {e}")
+
 @app.get("/custom_gesture/list")
-def custom_gesture_list(user_id: str):
-    if not supabase:
-        return []
+async def custom_gesture_list(user_id: str):
     try:
-        res = supabase.table("custom_gestures").select("name,sample_idx").eq("user_id", user_id).execute()
-        counts: Dict[str, int] = {}
-        for row in (res.data or []):
-            counts[row["name"]] = counts.get(row["name"], 0) + 1
+        counts = (await gesture_cache.get(user_id)).counts
         return [{"name": k, "samples": v} for k, v in counts.items()]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"list_custom_gestures failed: {e}")
 
 @app.get("/custom_gesture/samples")
-def custom_gesture_samples(user_id: str, name: str = ""):
-    if not supabase:
-        return []
+async def custom_gesture_samples(user_id: str, name: str = "",
+                                 format: str = Query("json", pattern="^(json|binary)$")):
+    # format=binary returns the packed samples as stored (see gestures.pack_library)
     try:
-        q = supabase.table("custom_gestures").select("name,seq_json").eq("user_id", user_id)
-        if name:
-            q = q.eq("name", name)
-        res = q.execute()
-        return res.data or []
+        rows = await gesture_cache.samples(user_id, name)
+        if format == "binary":
+            return Response(pack_library(rows), media_type="application/octet-stream")
+        return [{"name": r["name"], "seq_json": {"frames": unpack_frames(r["seq_bin"]).tolist()}} for r in rows]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"custom_gesture_samples failed: {e}")
 
+@app.get("/custom_gesture/templates")
+async def custom_gesture_templates(user_id: str):
+    # one unit-length vector per sample, grouped by sign name, in the space of `projection`
+    # (see /custom_gesture/projection; 16-d once fitted, 63-d "identity" before that)
+    try:
+        templates = (await gesture_cache.get(user_id)).templates
+        projection = templates.projection.version if templates.projection is not None else "identity"
+        return {"dim": templates.dim, "projection": projection, "templates": templates.grouped()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"custom_gesture_templates failed: {e}")
+
+@app.get("/custom_gesture/model")
+async def custom_gesture_model(user_id: str, projection: str = ""):
+    # the user's nearest-centroid classifier (O(signs) to evaluate); "version" grows with every save.
+    # Centroids live in the projected space: pass the projection version you hold and the
+    # matrix is included ("projection_matrix") only when it differs.
+    try:
+        entry = await gesture_cache.get(user_id)
+        model = entry.model.export()
+        if model["projection"] != projection and entry.templates.projection is not None:
+            model["projection_matrix"] = entry.templates.projection.export()
+        return model
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"custom_gesture_model failed: {e}")
+
+@app.get("/custom_gesture/projection")
+async def custom_gesture_projection():
+    # versioned (dim x 63) matrix mapping a normalised landmark embedding into template space
+    return projections.current.export()
+
+@app.post("/custom_gesture/projection/refit")
+async def custom_gesture_projection_refit():
+    try:
+        await projections.refit()
+        return projections.stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"custom_gesture_projection_refit failed: {e}")
+
+@app.get("/custom_gesture/cache_stats")
+async def custom_gesture_cache_stats():
+    return {**gesture_cache.stats(), "projection": projections.stats()}
+
+DTW_MAX_DISTANCE = float(os.getenv("DTW_MAX_DISTANCE", "2.0"))  # mean squared landmark distance per frame
+MIN_CONFIDENCE = float(os.getenv("GESTURE_MIN_CONFIDENCE", "0.6"))  # calibrated probability of the best sign
+@app.post("/custom_gesture/recognize")
+async def custom_gesture_recognize(user_id: str, k: int = Query(3, ge=1, le=50),
+                                   min_confidence: float = Query(MIN_CONFIDENCE, ge=0, le=1), min_score: float = 0.92,
+                                   method: str = Query("model", pattern="^(model|mean|dtw)$"),
+                                   max_distance: float = DTW_MAX_DISTANCE, body: Dict[str, Any] = Body(...)):
+    # body: {"frames": [[63 floats] x N]} (a window, averaged server-side) or {"vector": [63 floats]}
+    # method=model scores with the user's classifier (scores are probabilities, min_confidence applies);
+    # method=mean is nearest-template cosine (min_score applies, on the 63-d cosine scale even when
+    # templates are projected); method=dtw matches the frame
+    # sequence (order-aware), needs "frames" and returns distances
+    try:
+        if method == "model":
+            model = (await gesture_cache.get(user_id)).model
+            return classify(model, frames=body.get("frames"), vector=body.get("vector"),
+                            k=k, min_confidence=min_confidence)
+        if method == "dtw":
+            if body.get("frames") is None:
+                raise ValueError("method=dtw needs 'frames'")
+            index = await gesture_cache.sequences(user_id)
+            return recognize_sequence(index, body["frames"], k, max_distance)
+        templates = (await gesture_cache.get(user_id)).templates
+        return recognize(templates, frames=body.get("frames"), vector=body.get("vector"),
+                         k=k, min_score=min_score)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"custom_gesture_recognize failed: {e}")
+
+# ---------- Live recognition ----------
+async def _live_model(user_id: str):
+    return (await gesture_cache.get(user_id)).model
+
+live_recognizer = LiveRecognizer(
+    _live_model,
+    interval=int(os.getenv("LIVE_TICK_MS", "33")) / 1000.0,   # one batched scoring pass per tick
+    min_frames=int(os.getenv("LIVE_MIN_FRAMES", "12")),
+    min_confidence=MIN_CONFIDENCE,
+    stable=int(os.getenv("LIVE_STABLE_TICKS", "2")),
+)
+LIVE_MAX_BYTES = 64 * 1024
+
+@app.on_event("shutdown")
+async def _close_live():
+    await live_recognizer.close()
+
+@app.get("/live/stats")
+async def live_stats():
+    return live_recognizer.stats()
+
+@app.websocket("/ws/recognize")
+async def ws_recognize(websocket: WebSocket, user_id: str, dtype: str = "f32"):
+    # binary messages: one or more flatten63 frames (little-endian f32, or f16 with ?dtype=f16);
+    # text {"type": "reset"} when the hand leaves the frame. The server pushes {"type": "caption", ...}.
+    await websocket.accept()
+    try:
+        session = live_recognizer.open(user_id, websocket.send_json, dtype)
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "error": str(e)})
+        await websocket.close(code=1003)
+        return
+    try:
+        while True:
+            msg = await websocket.receive()
+            if msg.get("type") == "websocket.disconnect":
+                break
+            if msg.get("bytes") is not None:
+                if len(msg["bytes"]) > LIVE_MAX_BYTES:
+                    continue
+                try:
+                    session.push(msg["bytes"])
+                except ValueError as e:
+                    await websocket.send_json({"type": "error", "error": str(e)})
+            elif msg.get("text"):
+                try:
+                    data = json.loads(msg["text"])
+                except ValueError:
+                    continue
+                if isinstance(data, dict) and data.get("type") == "reset":
+                    session.reset()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_recognizer.close_session(session)
+
+# ---------- Shared dictionary ----------
+@app.post("/dictionary/search")
+async def dictionary_search(k: int = Query(5, ge=1, le=50), nprobe: int = Query(0, ge=0, le=4096),
+                            body: Dict[str, Any] = Body(...)):
+    # same body as /custom_gesture/recognize; nprobe trades recall for latency (0 = server default)
+    try:
+        query = query_vector(body.get("frames"), body.get("vector"))
+        return {"matches": await dictionary.search(query, k, nprobe or None)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"dictionary_search failed: {e}")
+
+@app.post("/dictionary/rebuild")
+async def dictionary_rebuild():
+    try:
+        await dictionary.rebuild()
+        return dictionary.stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"dictionary_rebuild failed: {e}")
+
+@app.get("/dictionary/stats")
+async def dictionary_stats():
+    return dictionary.stats()
+
+# ---------- Emotion ----------
+# targets (CPU, 2 workers, opencv detector): p95 under 150 ms per frame while serving
+# ~30 frames/s in total across callers; the first request is already warm
+emotion_service = EmotionService(
+    workers=int(os.getenv("EMOTION_WORKERS", "2")),               # 0 disables the service
+    max_pending=int(os.getenv("EMOTION_QUEUE_MAX", "256")),
+    detector=os.getenv("EMOTION_DETECTOR", "opencv"),
+)
+EMOTION_MAX_BYTES = int(os.getenv("EMOTION_MAX_BYTES", str(4 << 20)))
+
+@app.on_event("startup")
+async def _start_emotion():
+    if emotion_service.workers > 0:
+        await emotion_service.start()  # loads and warms the model in every worker; on failure it stays disabled
+
+@app.on_event("shutdown")
+async def _close_emotion():
+    await emotion_service.close()
+
+@app.post("/emotion")
+async def emotion_analyze(request: Request, width: int = Query(0, ge=0), height: int = Query(0, ge=0)):
+    # body: a JPEG/PNG (Content-Type image/*) or raw BGR bytes (application/octet-stream + width/height)
+    body = await request.body()
+    if not body:
+        raise HTTPException(status_code=400, detail="empty frame")
+    if len(body) > EMOTION_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="frame too large")
+    kind = "jpeg" if request.headers.get("content-type", "").startswith("image/") else "raw"
+    try:
+        result = await emotion_service.analyze(kind, body, (height, width, 3))
+    except EmotionBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if "error" in result:
+        raise HTTPException(status_code=422, detail=result["error"])
+    return result
+
+@app.get("/emotion/stats")
+async def emotion_stats():
+    return emotion_service.stats()
+
+@app.websocket("/ws/emotion")
+async def ws_emotion(websocket: WebSocket):
+    # binary messages are JPEG frames; for raw BGR frames first send {"width": w, "height": h}.
+    # The server answers {"type": "emotion", ...} after each analysed keyframe.
+    await websocket.accept()
+    if not emotion_service.ready:
+        await websocket.close(code=1013)  # try again later
+        return
+    stream = EmotionStream(
+        emotion_service,
+        threshold=float(os.getenv("EMOTION_CHANGE_THRESHOLD", "6")),
+        max_gap=int(os.getenv("EMOTION_MAX_GAP", "30")),
+        alpha=float(os.getenv("EMOTION_SMOOTHING", "0.4")),
+        on_result=lambda res: websocket.send_json({"type": "emotion", **res}),
+    )
+    shape = ()
+    try:
+        while True:
+            msg = await websocket.receive()
+            if msg.get("type") == "websocket.disconnect":
+                break
+            if msg.get("text"):
+                cfg = json.loads(msg["text"])
+                shape = (int(cfg.get("height", 0)), int(cfg.get("width", 0)), 3)
+            elif msg.get("bytes") and len(msg["bytes"]) <= EMOTION_MAX_BYTES:
+                await stream.push("raw" if shape else "jpeg", msg["bytes"], shape)
+    except Exception:  # disconnect, bad config or an undecodable frame ends the stream
+        pass
+    finally:
+        await stream.close()
+
 # ---------- WebSocket rooms ----------
-class Room:
-    def __init__(self):
-        self.clients: List[WebSocket] = []
-        self.peer_ids: Dict[WebSocket, str] = {}
-
-    async def connect(self, ws: WebSocket):
-        await ws.accept()
-        self.clients.append(ws)
-
-    def disconnect(self, ws: WebSocket):
-        if ws in self.clients:
-            self.clients.remove(ws)
-        self.peer_ids.pop(ws, None)
-
-    async def set_peer(self, ws: WebSocket, peer_id: str):
-        self.peer_ids[ws] = peer_id
-        await self.broadcast_state()
-
-    async def broadcast_state(self):
-        peers = [pid for pid in self.peer_ids.values() if pid]
-        msg = {"type": "peers", "peers": peers}
-        for cli in list(self.clients):
-            try:
-                await cli.send_json(msg)
-            except Exception:
-                pass
-
-ROOMS: Dict[str, Room] = {}
+rooms = RoomRegistry(
+    max_room_size=int(os.getenv("ROOM_MAX_SIZE", "16")),
+    max_rooms=int(os.getenv("ROOM_MAX_ROOMS", "10000")),
+    heartbeat=float(os.getenv("ROOM_HEARTBEAT", "20")),
+    idle_timeout=float(os.getenv("ROOM_IDLE_TIMEOUT", "60")),
+    # "" = this process only; "unix:///tmp/signcall-rooms.sock" shares rooms across
+    # `uvicorn --workers N`, "tcp://host:7979" across hosts
+    backplane=open_backplane(os.getenv("ROOM_BACKPLANE", "")),
+    send_queue=int(os.getenv("ROOM_SEND_QUEUE", "64")),             # messages buffered per socket
+    queue_policy=os.getenv("ROOM_QUEUE_POLICY", "drop_oldest"),     # "drop_oldest" | "drop_newest" | "close"
+    send_timeout=float(os.getenv("ROOM_SEND_TIMEOUT", "10")),       # a send stalled this long closes the socket
+)
+
+@app.on_event("startup")
+async def _start_rooms():
+    await rooms.start()
+    # history streams ride the same backplane, so a message saved by any worker
+    # reaches /stream subscribers on every worker
+    rooms.channels["message"] = lambda msg: message_bus.receive(msg.get("user_id") or "", msg.get("event") or {})
+    message_bus.attach(lambda user_id, event: rooms.send("message", {"user_id": user_id, "event": event}))
+
+@app.on_event("shutdown")
+async def _close_rooms():
+    await rooms.close()
+
+@app.get("/rooms/stats")
+async def rooms_stats():
+    return rooms.stats()
+
+MAX_CAPTION_CHARS = 500
+
+async def _room_caption(room_code: str, member, data: Dict[str, Any]) -> None:
+    # fan out to the room (every server) and persist through the write-behind queue
+    text = str(data.get("text") or "").strip()[:MAX_CAPTION_CHARS]
+    if not text or not member.peer_id:
+        return
+    repeat = caption_dedup.check(f"room|{room_code}|{member.peer_id}", text)
+    if repeat:
+        # not saved again; peers just update the count on the caption they already show
+        await rooms.relay(room_code, member, {"type": "caption_repeat", "from": member.peer_id,
+                                              "text": text, "repeat": repeat})
+        return
+    emoji = str(data.get("emoji") or "") or EMOJI_MAP.get(text.lower(), "")
+    await rooms.relay(room_code, member, {"type": "caption", "from": member.peer_id, "text": text, "emoji": emoji})
+    if member.user_id:
+        try:
+            queue_message(member.user_id, text, emoji, str(data.get("language") or "en"))
+        except WriterOverloaded:
+            pass  # the caption was still delivered; only its history row is lost
 
 @app.websocket("/ws/room/{room_code}")
 async def ws_room(websocket: WebSocket, room_code: str):
-    room = ROOMS.setdefault(room_code, Room())
-    await room.connect(websocket)
+    # client -> server: hello {peerId, userId} | sync | pong | caption {text, emoji}
+    # server -> client: peers {version, peers} | join/leave {version, peerId} | ping | caption {from, text, emoji}
+    #                   | caption_repeat {from, text, repeat}
+    await websocket.accept()
+    try:
+        member = rooms.connect(room_code, websocket)
+    except RoomFull as e:
+        await websocket.send_json({"type": "error", "reason": "room_full", "detail": str(e)})
+        await websocket.close(code=CLOSE_ROOM_FULL)
+        return
     try:
         while True:
             data = await websocket.receive_json()
-            if data.get("type") == "hello":
-                await room.set_peer(websocket, data.get("peerId") or "")
-    except WebSocketDisconnect:
-        room.disconnect(websocket)
-        await room.broadcast_state()
-    except Exception:
-        room.disconnect(websocket)
-        await room.broadcast_state()
-
+            rooms.touch(member)
+            kind = data.get("type")
+            if kind == "hello":
+                await rooms.hello(room_code, member, data.get("peerId") or "", data.get("userId") or "")
+            elif kind == "sync":
+                await rooms.sync(room_code, member)
+            elif kind == "caption":
+                await _room_caption(room_code, member, data)
+    except Exception:  # WebSocketDisconnect, an idle-timeout close, or a malformed frame
+        pass
+    finally:
+        await rooms.disconnect(room_code, member)
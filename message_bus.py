@@ -0,0 +1,85 @@
+# message_bus.py
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+RESYNC = {"type": "resync"}  # sent when a subscriber fell too far behind
+
+
+class MessageBus:
+    """Per-user fan-out of committed messages to live stream subscribers.
+
+    On its own it only reaches subscribers in this process. attach() adds a
+    forwarder (main.py routes it over the rooms backplane) so a message
+    committed by one worker reaches streams held by the others, which hand
+    it to receive().
+    """
+
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = queue_size
+        self._subs: Dict[str, Set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._forward: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None
+
+    def attach(self, forward: Callable[[str, Dict[str, Any]], Awaitable[None]]) -> None:
+        # called on the event loop; every publish() is also passed to forward(user_id, event)
+        self._loop = asyncio.get_running_loop()
+        self._forward = forward
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        q: asyncio.Queue = asyncio.Queue(self.queue_size)
+        with self._lock:
+            self._subs.setdefault(user_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, user_id: str, q: asyncio.Queue) -> None:
+        with self._lock:
+            subs = self._subs.get(user_id)
+            if subs is not None:
+                subs.discard(q)
+                if not subs:
+                    del self._subs[user_id]
+
+    def publish(self, user_id: str, event: Dict[str, Any]) -> None:
+        # safe from the event loop or from threadpool workers (sync routes)
+        if self._forward is not None:
+            self._call_on_loop(self._spawn_forward, user_id, event)
+        self.receive(user_id, event)
+
+    def receive(self, user_id: str, event: Dict[str, Any]) -> None:
+        # local subscribers only (messages forwarded from other workers arrive here)
+        with self._lock:
+            if not self._subs.get(user_id) or self._loop is None:
+                return
+        self._call_on_loop(self._deliver, user_id, event)
+
+    def _call_on_loop(self, fn, *args) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            fn(*args)
+        else:
+            self._loop.call_soon_threadsafe(fn, *args)
+
+    def _spawn_forward(self, user_id: str, event: Dict[str, Any]) -> None:
+        self._loop.create_task(self._forward(user_id, event))
+
+    def _deliver(self, user_id: str, event: Dict[str, Any]) -> None:
+        with self._lock:
+            subs = list(self._subs.get(user_id, ()))
+        for q in subs:
+            try:
+                q.put_nowait(event)
+            except asyncio.QueueFull:
+                # slow consumer: drop its backlog and tell it to refetch from its cursor
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait(RESYNC)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subs.values())
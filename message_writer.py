@@ -0,0 +1,224 @@
+# message_writer.py
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+log = logging.getLogger("signcall.writer")
+
+Row = Dict[str, Any]
+Batch = List[Tuple[Row, asyncio.Future]]
+
+
+class WriterOverloaded(Exception):
+    pass
+
+
+class MessageWriter:
+    """Write-behind queue: rows are grouped into bulk inserts by size or age.
+
+    submit() returns a future that resolves once the row's batch is committed,
+    so callers pick their own durability (fire-and-forget or wait for the ack).
+
+    A batch that still fails after `retries` quick attempts (the database is
+    down, not just busy) moves to a spill list that a background task keeps
+    retrying, oldest first, backing off from `spill_retry` to `spill_retry_max`
+    seconds; its futures stay pending meanwhile. While anything is spilled,
+    newer batches queue behind it instead of being inserted, so rows are
+    always committed in submission (timestamp) order. Rows are only dropped
+    when the spill list outgrows `max_spill` rows (oldest first) or when the
+    writer closes with batches still spilled.
+    """
+
+    def __init__(self, insert_many: Callable[[List[Row]], Awaitable[Any]],
+                 on_commit: Optional[Callable[[List[Row]], None]] = None,
+                 batch_size: int = 50, interval: float = 0.1, max_pending: int = 10000,
+                 retries: int = 3, max_spill: int = 50000, spill_retry: float = 1.0,
+                 spill_retry_max: float = 30.0):
+        self.insert_many = insert_many
+        self.on_commit = on_commit
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.retries = retries
+        self.max_spill = max_spill
+        self.spill_retry = spill_retry
+        self.spill_retry_max = spill_retry_max
+        self._q: Optional[asyncio.Queue] = None
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._spill: Deque[Batch] = deque()
+        self._spill_rows = 0
+        self._retrying: Optional[asyncio.Task] = None
+        self._waiters: Dict[asyncio.Future, asyncio.Future] = {}  # row future -> wait_saved() "spilled" signal
+        self._closing = False
+        self.committed = 0
+        self.batches = 0
+        self.spilled = 0    # rows that went to the spill list ...
+        self.recovered = 0  # ... and were committed from it later
+        self.dropped = 0    # rows given up on
+
+    def _ensure_started(self) -> None:
+        if self._task is None:
+            self._q = asyncio.Queue(self.max_pending)
+            self._full = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def submit(self, row: Row) -> asyncio.Future:
+        # never awaits, so callers can stamp + submit atomically on the event loop
+        if self._closing:
+            raise WriterOverloaded("writer is shut down")
+        self._ensure_started()
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            self._q.put_nowait((row, fut))
+        except asyncio.QueueFull:
+            raise WriterOverloaded("message queue is full")
+        if self._q.qsize() >= self.batch_size:
+            self._full.set()
+        return fut
+
+    async def wait_saved(self, fut: asyncio.Future, timeout: float) -> bool:
+        # True once the row is committed; False as soon as it is in the spill list instead
+        # (kept and retried, not lost). Raises if it was dropped, TimeoutError after `timeout`.
+        if not fut.done() and self.is_spilled(fut):
+            return False
+        spilled = asyncio.get_running_loop().create_future()
+        self._waiters[fut] = spilled
+        try:
+            await asyncio.wait({fut, spilled}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self._waiters.pop(fut, None)
+            spilled.cancel()
+        if fut.done():
+            return fut.result()
+        if spilled.done() and not spilled.cancelled():
+            return False
+        raise asyncio.TimeoutError()
+
+    def is_spilled(self, fut: asyncio.Future) -> bool:
+        return any(f is fut for batch in self._spill for _, f in batch)
+
+    async def _flush(self, batch: Batch) -> None:
+        if self._spill:
+            # older rows are still waiting for the database: inserting these first would
+            # commit them out of order, so they wait in line behind the spilled batches
+            self._spill_batch(batch)
+            return
+        rows = [r for r, _ in batch]
+        for attempt in range(self.retries):
+            try:
+                await self.insert_many(rows)
+                break
+            except Exception as e:
+                if attempt == self.retries - 1:
+                    self._spill_batch(batch, e)
+                    return
+                await asyncio.sleep(0.05 * 2 ** attempt)
+        self._committed(batch)
+
+    def _committed(self, batch: Batch) -> None:
+        rows = [r for r, _ in batch]
+        self.committed += len(rows)
+        self.batches += 1
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_result(True)
+        if self.on_commit:
+            try:
+                self.on_commit(rows)
+            except Exception:
+                log.exception("on_commit hook failed")
+
+    def _spill_batch(self, batch: Batch, error: Optional[Exception] = None) -> None:
+        self._spill.append(batch)
+        self._spill_rows += len(batch)
+        self.spilled += len(batch)
+        if error is not None:
+            log.warning("spilled %d messages after %d attempts: %s", len(batch), self.retries, error)
+        else:
+            error = WriterOverloaded("spill list is full")
+        for _, fut in batch:
+            waiter = self._waiters.get(fut)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(True)
+        while self._spill_rows > self.max_spill:
+            self._drop(self._spill.popleft(), error)
+        if self._retrying is None or self._retrying.done():
+            self._retrying = asyncio.get_running_loop().create_task(self._retry_spill())
+
+    def _drop(self, batch: Batch, error: Exception) -> None:
+        self._spill_rows -= len(batch)
+        self.dropped += len(batch)
+        log.error("dropping %d messages: %s", len(batch), error)
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_exception(error)
+                fut.exception()  # fire-and-forget callers never await it
+
+    async def _retry_spill(self) -> None:
+        delay = self.spill_retry
+        while self._spill:
+            await asyncio.sleep(delay)
+            recovered = False
+            while self._spill and await self._retry_oldest():
+                recovered = True  # the database is back: drain the rest in order without waiting
+            delay = self.spill_retry if recovered else min(delay * 2, self.spill_retry_max)
+
+    async def _retry_oldest(self) -> bool:
+        batch = self._spill[0]
+        try:
+            await self.insert_many([r for r, _ in batch])
+        except Exception:
+            return False
+        if self._spill and self._spill[0] is batch:
+            self._spill.popleft()
+            self._spill_rows -= len(batch)
+        else:  # dropped for space while this attempt ran, but saved after all
+            self.dropped -= len(batch)
+        self.recovered += len(batch)
+        self._committed(batch)
+        return True
+
+    async def _run(self) -> None:
+        stop = False
+        while not stop:
+            first = await self._q.get()
+            if first is None:
+                break
+            batch = [first]
+            self._full.clear()
+            if self._q.qsize() < self.batch_size - 1:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+            while len(batch) < self.batch_size and not self._q.empty():
+                item = self._q.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def close(self) -> None:
+        # stop accepting, drain what is queued, give the spill list one last try, then return
+        self._closing = True
+        if self._task is not None:
+            await self._q.put(None)
+            await self._task
+        if self._retrying is not None:
+            self._retrying.cancel()
+            try:
+                await self._retrying
+            except asyncio.CancelledError:
+                pass
+        while self._spill and await self._retry_oldest():
+            pass
+        while self._spill:
+            self._drop(self._spill.popleft(), WriterOverloaded("writer shut down with unsaved messages"))
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": self._q.qsize() if self._q else 0, "committed": self.committed,
+                "batches": self.batches, "spill": self._spill_rows, "spilled": self.spilled,
+                "recovered": self.recovered, "dropped": self.dropped}
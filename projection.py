@@ -0,0 +1,246 @@
+# projection.py
+import asyncio
+import fcntl
+import hashlib
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from gestures import FRAME_DIM, normalize
+
+log = logging.getLogger("signcall.projection")
+
+
+class Projection:
+    """Orthonormal FRAME_DIM -> dim map onto the principal directions of stored embeddings.
+
+    The fit is uncentred: embeddings are unit vectors compared by cosine and
+    distance, so the subspace is fitted to the vectors themselves and dot
+    products between projected vectors approximate the original ones. The
+    version is a hash of the matrix, so every worker that fits the same data
+    serves the same version.
+
+    Projected (and renormalised) vectors sit closer together than the
+    originals, so a cosine threshold picked in 63 dims means something else
+    after projection. `cosine_map` holds matching quantiles of pairwise cosine
+    before and after projection on the fitted data; original_cosine() maps a
+    reduced-space score back onto the 63-d scale.
+    """
+
+    def __init__(self, components: np.ndarray, samples: int = 0, explained: float = 1.0,
+                 cosine_map: Optional[np.ndarray] = None):
+        self.components = np.ascontiguousarray(components, dtype=np.float32)  # (dim, FRAME_DIM)
+        self.samples = samples        # embeddings it was fitted on
+        self.explained = explained    # share of their energy the subspace keeps
+        self.cosine_map = cosine_map  # (2, levels): 63-d quantiles, reduced-space quantiles
+        self.identity = self.dim == FRAME_DIM and np.array_equal(self.components, np.eye(FRAME_DIM))
+        self.version = "identity" if self.identity else hashlib.sha1(self.components.tobytes()).hexdigest()[:12]
+
+    @classmethod
+    def identity_map(cls) -> "Projection":
+        return cls(np.eye(FRAME_DIM, dtype=np.float32))
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[0]
+
+    def apply(self, vecs: Any) -> np.ndarray:
+        vecs = np.asarray(vecs, dtype=np.float32)
+        return vecs if self.identity else vecs @ self.components.T
+
+    def original_cosine(self, score: float) -> float:
+        if self.identity or self.cosine_map is None:
+            return score
+        return float(np.interp(score, self.cosine_map[1], self.cosine_map[0]))
+
+    def export(self) -> Dict[str, Any]:
+        return {"version": self.version, "dim": self.dim, "input_dim": FRAME_DIM, "samples": self.samples,
+                "explained": round(self.explained, 4), "components": np.round(self.components, 6).tolist()}
+
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            extra = {"cosine_map": self.cosine_map} if self.cosine_map is not None else {}
+            np.savez(f, components=self.components, samples=self.samples, explained=self.explained, **extra)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Projection":
+        with np.load(path) as data:
+            components = data["components"]
+            if components.ndim != 2 or components.shape[1] != FRAME_DIM:
+                raise ValueError("bad projection matrix")
+            cosine_map = data["cosine_map"] if "cosine_map" in data.files else None
+            return cls(components, int(data["samples"]), float(data["explained"]), cosine_map)
+
+
+def fit_projection(vecs: np.ndarray, dim: int = 16) -> Projection:
+    x = np.asarray(vecs, dtype=np.float64).reshape(-1, FRAME_DIM)
+    if dim <= 0 or dim >= FRAME_DIM or len(x) < dim:
+        return Projection.identity_map()
+    _, s, vt = np.linalg.svd(x, full_matrices=False)
+    components = vt[:dim]
+    # SVD signs are arbitrary: make the largest entry of each direction positive
+    flip = np.sign(components[np.arange(dim), np.abs(components).argmax(axis=1)])
+    components *= flip[:, None]
+    energy = float((s ** 2).sum())
+    explained = float((s[:dim] ** 2).sum() / energy) if energy else 1.0
+    return Projection(components, len(x), explained, _cosine_map(x, components))
+
+
+def _cosine_map(x: np.ndarray, components: np.ndarray, pairs_of: int = 1000) -> np.ndarray:
+    # quantiles of pairwise cosine on a sample of the fitted vectors, before and after
+    # projection; levels are dense towards 1, where match thresholds live
+    if len(x) > pairs_of:
+        x = x[np.random.default_rng(0).choice(len(x), pairs_of, replace=False)]
+    u = normalize(x)
+    p = normalize(u @ components.T)
+    upper = np.triu_indices(len(u), 1)
+    levels = np.append(1 - np.geomspace(1, 1e-3, 32), 1.0)
+    return np.stack([np.quantile((u @ u.T)[upper], levels),
+                     np.quantile((p @ p.T)[upper], levels)]).astype(np.float32)
+
+
+class ProjectionStore:
+    """The current global projection: fitted from every user's stored embeddings.
+
+    Starts from `path` (or the identity until `min_samples` embeddings exist)
+    and is refitted in the background once the stored samples have doubled
+    since the last fit -- the same schedule the dictionary index retrains on.
+    Listeners are called with each new projection.
+
+    Every worker of one deployment shares `path`: a refit runs only in the
+    worker holding `path`.lock and is written there, and the others pick the
+    file up within `poll` seconds (watch()), so all of them converge on one
+    version instead of each fitting its own.
+    """
+
+    def __init__(self, storage, path: str = "", dim: int = 16, min_samples: int = 256, poll: float = 5.0):
+        self.storage = storage
+        self.path = path
+        self.dim = dim
+        self.min_samples = min_samples
+        self.poll = poll
+        self.current = Projection.identity_map()
+        self.listeners: List[Callable[[Projection], None]] = []
+        self.stored = 0        # embeddings in storage at the last refit
+        self._saved_since = 0  # ... and inserted since
+        self._fit: Optional[asyncio.Task] = None
+        self._watch: Optional[asyncio.Task] = None
+        self._loaded_mtime = 0.0  # of the file behind `current`
+
+    def _read(self) -> Optional[Tuple[Projection, float]]:
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            mtime = os.stat(self.path).st_mtime
+            return Projection.load(self.path), mtime
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _adopt(self, read: Optional[Tuple[Projection, float]]) -> bool:
+        if read is None:
+            return False
+        projection, self._loaded_mtime = read
+        self._set(projection)
+        self.stored = max(self.stored, projection.samples)
+        return True
+
+    def load(self) -> bool:
+        return self._adopt(self._read())
+
+    def _changed_on_disk(self) -> bool:
+        try:
+            return os.stat(self.path).st_mtime != self._loaded_mtime
+        except OSError:
+            return False
+
+    async def watch(self) -> None:
+        # adopt fits written by other workers
+        if not self.path:
+            return
+        while True:
+            await asyncio.sleep(self.poll)
+            if self._changed_on_disk() and (self._fit is None or self._fit.done()):
+                self._adopt(await asyncio.to_thread(self._read))
+
+    def start(self) -> None:
+        if self._watch is None:
+            self._watch = asyncio.get_running_loop().create_task(self.watch())
+
+    def _try_lock(self) -> Optional[int]:
+        fd = os.open(self.path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+        return fd
+
+    def _outgrown(self, stored: int) -> bool:
+        if stored < self.min_samples:
+            return False
+        return self.current.identity or stored >= 2 * self.current.samples
+
+    def _set(self, projection: Projection) -> None:
+        changed = projection.version != self.current.version
+        self.current = projection
+        if changed:
+            log.info("gesture projection %s (%d dims, %.1f%% kept)", projection.version,
+                     projection.dim, projection.explained * 100)
+            for listener in self.listeners:
+                listener(projection)
+
+    async def _refit(self, force: bool = False) -> Projection:
+        self._saved_since = 0
+        lock = None
+        try:
+            if self.path:
+                lock = await asyncio.to_thread(self._try_lock)
+                if lock is None:
+                    return self.current  # another worker is fitting; watch() adopts its result
+                if self._changed_on_disk():
+                    self._adopt(await asyncio.to_thread(self._read))
+                # the decision is made on the global row count, not on this worker's inserts
+                if not force and not self._outgrown(await self.storage.gesture_count()):
+                    return self.current
+            rows = await self.storage.all_gesture_embeddings()
+            vecs = [r["embedding"] for r in rows if r.get("embedding") is not None]
+            self.stored = len(vecs)
+            if self.dim and len(vecs) >= self.min_samples:
+                projection = await asyncio.to_thread(fit_projection, np.stack(vecs), self.dim)
+                if self.path:
+                    await asyncio.to_thread(projection.save, self.path)
+                    self._loaded_mtime = os.stat(self.path).st_mtime
+                self._set(projection)
+        except Exception:
+            log.exception("gesture projection refit failed")  # keep serving the current one
+        finally:
+            if lock is not None:
+                os.close(lock)  # releases the flock
+        return self.current
+
+    async def refit(self, force: bool = True) -> Projection:
+        if self._fit is None or self._fit.done():
+            self._fit = asyncio.get_running_loop().create_task(self._refit(force))
+        return await asyncio.shield(self._fit)
+
+    def saved(self, n: int) -> None:
+        # called after every insert; schedules a refit when the data has outgrown the fit
+        self._saved_since += n
+        if not self.dim or (self._fit is not None and not self._fit.done()):
+            return
+        if self._saved_since >= max(self.stored, self.min_samples - self.stored):
+            self._fit = asyncio.get_running_loop().create_task(self._refit())
+
+    async def close(self) -> None:
+        for task in (self._fit, self._watch):
+            if task is not None and not task.done():
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        p = self.current
+        return {"version": p.version, "dim": p.dim, "samples": p.samples, "explained": round(p.explained, 4),
+                "stored": self.stored, "saved_since": self._saved_since}
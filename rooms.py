@@ -0,0 +1,454 @@
+# rooms.py
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from fastapi import WebSocket
+
+from backplane import Backplane, MemoryBackplane
+
+log = logging.getLogger("signcall.rooms")
+
+CLOSE_IDLE = 4000       # no traffic (not even a pong) within the idle timeout
+CLOSE_ROOM_FULL = 4001  # room already has max_room_size connections
+CLOSE_REPLACED = 4002   # the same peer id said hello on a newer socket
+CLOSE_SLOW = 4003       # a send stalled, or the outbox overflowed under the "close" policy
+
+QUEUE_POLICIES = ("drop_oldest", "drop_newest", "close")
+_SNAPSHOT = object()  # outbox placeholder: send the room snapshot as of dequeue time
+
+
+class RoomFull(Exception):
+    pass
+
+
+class Outbox:
+    """Bounded per-socket send queue drained by its own task, so one slow
+    browser never delays the rest of the room.
+
+    Presence messages (snapshot/join/leave) coalesce when the queue is full:
+    queued ones are replaced by a single snapshot taken when it is sent,
+    since only the newest state matters. Other messages follow `policy`.
+    """
+
+    def __init__(self, ws: WebSocket, snapshot: Callable[[], Dict[str, Any]], maxsize: int = 64,
+                 policy: str = "drop_oldest", send_timeout: float = 10.0):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"queue policy must be one of {QUEUE_POLICIES}")
+        self.ws = ws
+        self.snapshot = snapshot
+        self.maxsize = maxsize
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self._q: Deque[Tuple[Any, bool]] = deque()  # (message, is_presence)
+        self._wake = asyncio.Event()
+        self._resync = False  # a _SNAPSHOT is queued; later presence deltas are already covered
+        self._task = asyncio.get_running_loop().create_task(self._drain())
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.stalled = False
+
+    def __len__(self) -> int:
+        return len(self._q)
+
+    def put(self, msg: Dict[str, Any], presence: bool = False) -> bool:
+        if self._task.done():
+            return False
+        if presence and self._resync:
+            self.coalesced += 1
+            return True
+        if len(self._q) >= self.maxsize:
+            if presence:
+                kept = deque(item for item in self._q if not item[1])
+                self.coalesced += len(self._q) - len(kept) + 1
+                self._q = kept
+                msg, self._resync = _SNAPSHOT, True
+            elif self.policy == "drop_newest":
+                self.dropped += 1
+                return False
+            elif self.policy == "close":
+                self.dropped += 1
+                self._abort()
+                return False
+            if len(self._q) >= self.maxsize:  # drop_oldest (presence is never dropped, only collapsed)
+                for i, item in enumerate(self._q):
+                    if not item[1]:
+                        del self._q[i]
+                        self.dropped += 1
+                        break
+        self._q.append((msg, presence))
+        self._wake.set()
+        return True
+
+    async def _drain(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while self._q:
+                msg, _ = self._q.popleft()
+                if msg is _SNAPSHOT:
+                    self._resync = False
+                    msg = self.snapshot()
+                try:
+                    await asyncio.wait_for(self.ws.send_json(msg), self.send_timeout)
+                    self.sent += 1
+                except asyncio.TimeoutError:
+                    self.stalled = True
+                    self._abort()
+                    return
+                except Exception:
+                    return  # disconnected; the socket's own handler cleans up
+
+    def _abort(self) -> None:
+        self._q.clear()
+        self._task.cancel()
+        asyncio.get_running_loop().create_task(self._close_ws())
+
+    async def _close_ws(self) -> None:
+        try:
+            await self.ws.close(code=CLOSE_SLOW)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        self._q.clear()
+        self._task.cancel()
+
+
+class Member:
+    __slots__ = ("ws", "peer_id", "user_id", "last_seen", "outbox")
+
+    def __init__(self, ws: WebSocket, outbox: Outbox):
+        self.ws = ws
+        self.peer_id = ""   # set by "hello"; until then the socket holds a slot but isn't announced
+        self.user_id = ""
+        self.last_seen = time.monotonic()
+        self.outbox = outbox
+
+
+class Room:
+    """Connections for one room code plus a version counter bumped on every join/leave.
+
+    `members` are this server's sockets; `remote` holds peers connected to other
+    servers, as reported over the backplane. Clients get one full snapshot when
+    they say hello (or ask to resync), and join/leave deltas afterwards; a gap
+    in the versions they see means they missed a delta and should send
+    {"type": "sync"}. Versions are per server, which is all a client compares.
+    """
+
+    def __init__(self, code: str):
+        self.code = code
+        self.members: Dict[WebSocket, Member] = {}
+        self.remote: Dict[str, str] = {}  # peer_id -> node_id
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self.members) + len(self.remote)
+
+    def peers(self) -> List[str]:
+        return [m.peer_id for m in self.members.values() if m.peer_id] + list(self.remote)
+
+    def local_peers(self) -> List[str]:
+        return [m.peer_id for m in self.members.values() if m.peer_id]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"type": "peers", "version": self.version, "peers": self.peers()}
+
+    def find(self, peer_id: str) -> Optional[Member]:
+        for m in self.members.values():
+            if m.peer_id == peer_id:
+                return m
+        return None
+
+    def send(self, member: Member, msg: Dict[str, Any], presence: bool = False) -> None:
+        member.outbox.put(msg, presence)
+
+    def broadcast(self, msg: Dict[str, Any], exclude: Optional[Member] = None, presence: bool = False) -> None:
+        # enqueue only: every socket's outbox drains concurrently
+        for m in self.members.values():
+            if m is not exclude and m.peer_id:
+                m.outbox.put(msg, presence)
+
+    def delta(self, kind: str, peer_id: str, exclude: Optional[Member] = None) -> None:
+        self.version += 1
+        self.broadcast({"type": kind, "version": self.version, "peerId": peer_id}, exclude, presence=True)
+
+
+class RoomRegistry:
+    """Live rooms keyed by code. Rooms are created on first connect and dropped when
+    the last peer leaves; a background sweep pings every socket and closes the
+    ones that stayed silent for longer than `idle_timeout`.
+
+    Membership changes and relayed messages are also published on `backplane`
+    so that every worker/host sharing it serves the same rooms. Each server
+    re-announces its members every heartbeat; servers that stop doing so for
+    `idle_timeout` (crashed workers) have their peers removed. Other
+    components share the backplane through `channels`: send(op, msg) reaches
+    the handler registered for `op` on every other server.
+    """
+
+    def __init__(self, max_room_size: int = 16, max_rooms: int = 10000,
+                 heartbeat: float = 20.0, idle_timeout: float = 60.0,
+                 backplane: Optional[Backplane] = None, node_id: str = "",
+                 send_queue: int = 64, queue_policy: str = "drop_oldest", send_timeout: float = 10.0):
+        if queue_policy not in QUEUE_POLICIES:
+            raise ValueError(f"queue policy must be one of {QUEUE_POLICIES}")
+        self.max_room_size = max_room_size
+        self.max_rooms = max_rooms
+        self.heartbeat = heartbeat
+        self.idle_timeout = idle_timeout
+        self.backplane = backplane or MemoryBackplane()
+        self.node_id = node_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.rooms: Dict[str, Room] = {}
+        self._nodes: Dict[str, float] = {}  # other servers -> last time we heard from them
+        self.channels: Dict[str, Callable[[Dict[str, Any]], None]] = {}  # non-room op -> handler
+        self._sweeper: Optional[asyncio.Task] = None
+        self.send_queue = send_queue
+        self.queue_policy = queue_policy
+        self.send_timeout = send_timeout
+        self.joins = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self._retired = {"sent": 0, "dropped": 0, "coalesced": 0, "stalled": 0}  # closed outboxes
+
+    async def start(self) -> None:
+        if self._sweeper is None:
+            await self.backplane.start(self._on_backplane)
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep())
+
+    async def close(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+            await self._publish({"op": "bye"})
+            await self.backplane.close()
+
+    def _room(self, code: str) -> Room:
+        room = self.rooms.get(code)
+        if room is None:
+            room = self.rooms[code] = Room(code)
+        return room
+
+    def _gc(self, code: str) -> None:
+        room = self.rooms.get(code)
+        if room is not None and not len(room):
+            del self.rooms[code]
+
+    async def _publish(self, msg: Dict[str, Any]) -> None:
+        msg["node"] = self.node_id
+        try:
+            await self.backplane.publish(msg)
+        except Exception:
+            log.exception("backplane publish failed")
+
+    async def send(self, op: str, msg: Dict[str, Any]) -> None:
+        # a non-room message for `op`'s handler on the other servers
+        await self._publish({**msg, "op": op})
+
+    # ---- local sockets ----
+    def connect(self, code: str, ws: WebSocket) -> Member:
+        room = self.rooms.get(code)
+        if room is None and len(self.rooms) >= self.max_rooms:
+            self.rejected += 1
+            raise RoomFull("too many rooms")
+        if room is not None and len(room) >= self.max_room_size:
+            self.rejected += 1
+            raise RoomFull(f"room is full ({self.max_room_size})")
+        room = self._room(code)
+        outbox = Outbox(ws, room.snapshot, self.send_queue, self.queue_policy, self.send_timeout)
+        member = room.members[ws] = Member(ws, outbox)
+        return member
+
+    def _retire(self, member: Member) -> None:
+        box = member.outbox
+        box.close()
+        for key, value in (("sent", box.sent), ("dropped", box.dropped),
+                           ("coalesced", box.coalesced), ("stalled", int(box.stalled))):
+            self._retired[key] += value
+
+    async def hello(self, code: str, member: Member, peer_id: str, user_id: str = "") -> None:
+        room = self.rooms.get(code)
+        if room is None or member.ws not in room.members:
+            return
+        if member.peer_id and member.peer_id != peer_id:  # new PeerJS id on the same socket
+            await self._leave(room, member)
+        old = room.find(peer_id) if peer_id else None
+        if old is not None and old is not member:  # reconnect before the old socket timed out
+            room.members.pop(old.ws, None)
+            self._retire(old)
+            await self._leave(room, old)
+            try:
+                await old.ws.close(code=CLOSE_REPLACED)
+            except Exception:
+                pass
+        member.user_id = user_id
+        if peer_id and member.peer_id != peer_id:
+            moved = room.remote.pop(peer_id, None) is not None  # reconnected to this server
+            member.peer_id = peer_id
+            self.joins += 1
+            if not moved:
+                room.delta("join", peer_id, exclude=member)
+            await self._publish({"op": "join", "room": code, "peer": peer_id})
+        room.send(member, room.snapshot(), presence=True)
+
+    async def sync(self, code: str, member: Member) -> None:
+        room = self.rooms.get(code)
+        if room is not None and member.ws in room.members:
+            room.send(member, room.snapshot(), presence=True)
+
+    async def relay(self, code: str, member: Member, msg: Dict[str, Any]) -> None:
+        # fan a client message out to everyone else in the room, on every server
+        room = self.rooms.get(code)
+        if room is None or not member.peer_id:
+            return
+        room.broadcast(msg, exclude=member)
+        await self._publish({"op": "relay", "room": code, "peer": member.peer_id, "data": msg})
+
+    def touch(self, member: Member) -> None:
+        member.last_seen = time.monotonic()
+
+    async def _leave(self, room: Room, member: Member) -> None:
+        if not member.peer_id:
+            return
+        peer_id, member.peer_id = member.peer_id, ""
+        room.delta("leave", peer_id, exclude=member)
+        await self._publish({"op": "leave", "room": room.code, "peer": peer_id})
+
+    async def disconnect(self, code: str, member: Member) -> None:
+        # idempotent: both the socket handler and the idle sweep may call it
+        room = self.rooms.get(code)
+        if room is None or room.members.pop(member.ws, None) is None:
+            return
+        self._retire(member)
+        await self._leave(room, member)
+        self._gc(code)
+
+    # ---- other servers ----
+    async def _on_backplane(self, msg: Dict[str, Any]) -> None:
+        op, node = msg.get("op"), msg.get("node")
+        if op == "_connected":  # (re)joined the backplane: ask the others for their rooms
+            await self._publish({"op": "hello"})
+            await self._publish_state()
+            return
+        if not node or node == self.node_id:
+            return
+        self._nodes[node] = time.monotonic()
+        code = msg.get("room") or ""
+        if op == "join":
+            await self._remote_join(code, msg.get("peer") or "", node)
+        elif op == "leave":
+            await self._remote_leave(code, msg.get("peer") or "", node)
+        elif op == "relay":
+            room = self.rooms.get(code)
+            if room is not None:
+                room.broadcast(msg.get("data") or {})
+        elif op == "state":
+            await self._reconcile(node, msg.get("rooms") or {})
+        elif op == "hello":
+            await self._publish_state()
+        elif op == "bye":
+            await self._purge(node)
+        elif op in self.channels:
+            self.channels[op](msg)
+
+    async def _remote_join(self, code: str, peer_id: str, node: str) -> None:
+        if not peer_id:
+            return
+        if code not in self.rooms and len(self.rooms) >= self.max_rooms:
+            # remote rooms count against the same cap as local ones; the next "state"
+            # heartbeat from `node` re-announces the peer once there is room again
+            self.rejected += 1
+            return
+        room = self._room(code)
+        present = peer_id in room.remote
+        old = room.find(peer_id)
+        if old is not None:  # the peer reconnected to another server; drop our stale socket quietly
+            room.members.pop(old.ws, None)
+            self._retire(old)
+            present = True
+            try:
+                await old.ws.close(code=CLOSE_REPLACED)
+            except Exception:
+                pass
+        room.remote[peer_id] = node
+        if not present:
+            room.delta("join", peer_id)
+
+    async def _remote_leave(self, code: str, peer_id: str, node: str) -> None:
+        room = self.rooms.get(code)
+        if room is None or room.remote.get(peer_id) != node:
+            return
+        del room.remote[peer_id]
+        room.delta("leave", peer_id)
+        self._gc(code)
+
+    async def _reconcile(self, node: str, rooms: Dict[str, List[str]]) -> None:
+        # another server's full membership: repairs anything we missed while disconnected
+        for code, room in list(self.rooms.items()):
+            listed = set(rooms.get(code, ()))
+            for peer_id in [p for p, n in room.remote.items() if n == node and p not in listed]:
+                await self._remote_leave(code, peer_id, node)
+        for code, peers in rooms.items():
+            for peer_id in peers:
+                room = self.rooms.get(code)
+                if room is None or room.remote.get(peer_id) != node:
+                    await self._remote_join(code, peer_id, node)
+
+    async def _purge(self, node: str) -> None:
+        self._nodes.pop(node, None)
+        await self._reconcile(node, {})
+
+    async def _publish_state(self) -> None:
+        rooms = {code: room.local_peers() for code, room in self.rooms.items() if room.local_peers()}
+        await self._publish({"op": "state", "rooms": rooms})
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            now = time.monotonic()
+            for code, room in list(self.rooms.items()):
+                for member in list(room.members.values()):
+                    if now - member.last_seen > self.idle_timeout:
+                        self.timeouts += 1
+                        await self.disconnect(code, member)
+                        try:
+                            await member.ws.close(code=CLOSE_IDLE)
+                        except Exception:
+                            pass
+                    else:
+                        room.send(member, {"type": "ping", "t": now})
+            for node, seen in list(self._nodes.items()):
+                if now - seen > self.idle_timeout:
+                    log.warning("room server %s went silent; dropping its peers", node)
+                    await self._purge(node)
+            await self._publish_state()
+
+    def queue_stats(self) -> Dict[str, int]:
+        boxes = [m.outbox for r in self.rooms.values() for m in r.members.values()]
+        totals = dict(self._retired)
+        for box in boxes:
+            totals["sent"] += box.sent
+            totals["dropped"] += box.dropped
+            totals["coalesced"] += box.coalesced
+            totals["stalled"] += int(box.stalled)
+        depths = [len(box) for box in boxes]
+        return {"depth": sum(depths), "max_depth": max(depths, default=0), **totals}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"rooms": len(self.rooms),
+                "connections": sum(len(r.members) for r in self.rooms.values()),
+                "remote_peers": sum(len(r.remote) for r in self.rooms.values()),
+                "largest": max((len(r) for r in self.rooms.values()), default=0),
+                "joins": self.joins, "timeouts": self.timeouts, "rejected": self.rejected,
+                "node": self.node_id, "backplane": self.backplane.name, "servers": len(self._nodes) + 1,
+                "queues": self.queue_stats()}
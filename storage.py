@@ -0,0 +1,356 @@
+# storage.py
+import asyncio
+import base64
+import json
+import queue
+import sqlite3
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, List, Tuple
+
+from gestures import embedding_bytes, embedding_from_bytes, packed_json, sample_bytes, sample_embedding
+
+Row = Dict[str, Any]
+
+# id bound for a cursor without one: a bare timestamp means "after everything at that instant"
+MAX_ID = 2 ** 63 - 1
+
+
+def message_cursor(row: Row) -> str:
+    # "timestamp|id": timestamps only increase within one process, so the id breaks ties
+    return f"{row['timestamp']}|{row['id']}"
+
+
+def parse_cursor(cursor: str) -> Tuple[str, int]:
+    # -> (timestamp, id); raises ValueError on a malformed id
+    ts, _, row_id = (cursor or "").partition("|")
+    return ts, int(row_id) if row_id else MAX_ID
+
+
+class Storage(ABC):
+    """What the routes need from a database. Engines: Supabase (remote) and SQLite (embedded)."""
+
+    name = "base"
+
+    @abstractmethod
+    async def insert_messages(self, rows: List[Row]) -> None:
+        # sets each row's "id", so committed rows carry their full cursor
+        ...
+
+    @abstractmethod
+    async def history_head(self, user_id: str) -> Tuple[int, str]:
+        # (row count, newest timestamp) - identifies the current history version
+        ...
+
+    @abstractmethod
+    async def fetch_messages(self, user_id: str, since: str, limit: int) -> List[Row]:
+        # rows after the cursor `since` (see message_cursor), in (timestamp, id) order
+        ...
+
+    @abstractmethod
+    async def clear_messages(self, user_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def insert_gestures(self, rows: List[Row]) -> None:
+        # rows: user_id, name, sample_idx, seq_bin (packed sample, see gestures.pack_frames),
+        # embedding (unit-length mean vector, see gestures.embed); sets each row's "id"
+        ...
+
+    @abstractmethod
+    async def gesture_samples(self, user_id: str, name: str = "") -> List[Row]:
+        # -> [{"name", "seq_bin"}]; legacy JSON frames are packed on the way out
+        ...
+
+    @abstractmethod
+    async def gesture_embeddings(self, user_id: str) -> List[Row]:
+        # -> [{"name", "embedding"}] without shipping the frames; older rows are embedded on read
+        ...
+
+    @abstractmethod
+    async def all_gesture_embeddings(self) -> List[Row]:
+        # every user's embeddings -> [{"id", "user_id", "name", "embedding"}], for the shared dictionary
+        ...
+
+    @abstractmethod
+    async def gesture_count(self) -> int:
+        # rows in custom_gestures, to check a persisted dictionary against
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class SupabaseStorage(Storage):
+    name = "supabase"
+
+    def __init__(self, client, concurrency: int = 64):
+        self.client = client
+        self._slots = asyncio.Semaphore(concurrency)
+
+    async def _run(self, query):
+        # every PostgREST call goes through here so `concurrency` bounds the pool
+        async with self._slots:
+            return await query.execute()
+
+    async def insert_messages(self, rows: List[Row]) -> None:
+        res = await self._run(self.client.table("messages").insert(rows))
+        for row, saved in zip(rows, res.data or []):
+            row["id"] = saved["id"]
+
+    async def history_head(self, user_id: str) -> Tuple[int, str]:
+        res = await self._run(
+            self.client.table("messages")
+            .select("timestamp", count="exact")
+            .eq("user_id", user_id)
+            .order("timestamp", desc=True)
+            .limit(1)
+        )
+        newest = res.data[0]["timestamp"] if res.data else ""
+        return res.count or 0, newest
+
+    async def fetch_messages(self, user_id: str, since: str, limit: int) -> List[Row]:
+        q = self.client.table("messages").select("*").eq("user_id", user_id)
+        if since:
+            ts, row_id = parse_cursor(since)
+            q = q.or_(f'timestamp.gt."{ts}",and(timestamp.eq."{ts}",id.gt.{row_id})')
+        q = q.order("timestamp", desc=False).order("id", desc=False).limit(limit)
+        return (await self._run(q)).data or []
+
+    async def clear_messages(self, user_id: str) -> None:
+        await self._run(self.client.table("messages").delete().eq("user_id", user_id))
+
+    async def insert_gestures(self, rows: List[Row]) -> None:
+        # the table keeps its jsonb column; the packed bytes travel base64-encoded inside it
+        res = await self._run(self.client.table("custom_gestures").insert([
+            {"user_id": r["user_id"], "name": r["name"], "sample_idx": r["sample_idx"],
+             "seq_json": {**packed_json(r["seq_bin"]),
+                          "embedding": base64.b64encode(embedding_bytes(r["embedding"])).decode("ascii")}}
+            for r in rows
+        ]))
+        for row, saved in zip(rows, res.data or []):
+            row["id"] = saved["id"]
+
+    async def gesture_samples(self, user_id: str, name: str = "") -> List[Row]:
+        q = self.client.table("custom_gestures").select("name,seq_json").eq("user_id", user_id)
+        if name:
+            q = q.eq("name", name)
+        rows = (await self._run(q)).data or []
+        return [{"name": r["name"], "seq_bin": sample_bytes(r["seq_json"])} for r in rows]
+
+    async def gesture_embeddings(self, user_id: str) -> List[Row]:
+        res = await self._run(
+            self.client.table("custom_gestures").select("name,emb:seq_json->>embedding").eq("user_id", user_id)
+        )
+        rows = res.data or []
+        if all(r.get("emb") for r in rows):
+            return [{"name": r["name"], "embedding": embedding_from_bytes(base64.b64decode(r["emb"]))}
+                    for r in rows]
+        # some rows predate stored embeddings: fall back to the frames once
+        return [{"name": r["name"], "embedding": sample_embedding(r["seq_bin"])}
+                for r in await self.gesture_samples(user_id)]
+
+    async def all_gesture_embeddings(self, page: int = 1000) -> List[Row]:
+        rows, start = [], 0
+        while True:
+            res = await self._run(
+                self.client.table("custom_gestures")
+                .select("id,user_id,name,emb:seq_json->>embedding")
+                .order("user_id")
+                .range(start, start + page - 1)
+            )
+            rows.extend(res.data or [])
+            if len(res.data or []) < page:
+                break
+            start += page
+        legacy = {r["user_id"] for r in rows if not r.get("emb")}
+        out = [{"id": r["id"], "user_id": r["user_id"], "name": r["name"],
+                "embedding": embedding_from_bytes(base64.b64decode(r["emb"]))}
+               for r in rows if r["user_id"] not in legacy]
+        for user_id in legacy:
+            out.extend({"user_id": user_id, **r} for r in await self.gesture_embeddings(user_id))
+        return out
+
+    async def gesture_count(self) -> int:
+        res = await self._run(self.client.table("custom_gestures").select("id", count="exact").limit(1))
+        return res.count or 0
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id   TEXT NOT NULL,
+    content   TEXT NOT NULL DEFAULT '',
+    emoji     TEXT NOT NULL DEFAULT '',
+    language  TEXT NOT NULL DEFAULT 'en',
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_user_ts ON messages(user_id, timestamp, id);
+CREATE TABLE IF NOT EXISTS custom_gestures (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id    TEXT NOT NULL,
+    name       TEXT NOT NULL,
+    sample_idx INTEGER NOT NULL DEFAULT 0,
+    seq_json   TEXT NOT NULL DEFAULT '{}',
+    seq_bin    BLOB,
+    embedding  BLOB
+);
+CREATE INDEX IF NOT EXISTS custom_gestures_user_name ON custom_gestures(user_id, name);
+"""
+
+# Statement text is kept constant so each pooled connection prepares it once
+# (sqlite3's per-connection statement cache) and reuses it afterwards.
+SQL_INSERT_MESSAGE = ("INSERT INTO messages(user_id, content, emoji, language, timestamp) VALUES (?,?,?,?,?)"
+                      " RETURNING id")
+SQL_HEAD = ("SELECT COUNT(*), COALESCE(MAX(timestamp), '') FROM messages WHERE user_id=?")
+SQL_FETCH = ("SELECT id, user_id, content, emoji, language, timestamp FROM messages"
+             " WHERE user_id=? AND (timestamp>? OR (timestamp=? AND id>?)) ORDER BY timestamp, id LIMIT ?")
+SQL_CLEAR = "DELETE FROM messages WHERE user_id=?"
+SQL_INSERT_GESTURE = ("INSERT INTO custom_gestures(user_id, name, sample_idx, seq_json, seq_bin, embedding)"
+                      " VALUES (?,?,?,'{}',?,?) RETURNING id")
+SQL_GESTURE_SAMPLES = "SELECT name, seq_bin, seq_json FROM custom_gestures WHERE user_id=? ORDER BY id"
+SQL_GESTURE_SAMPLES_BY_NAME = ("SELECT name, seq_bin, seq_json FROM custom_gestures"
+                               " WHERE user_id=? AND name=? ORDER BY id")
+_EMBEDDING_COLUMNS = ("id, user_id, name, embedding,"
+                      " CASE WHEN embedding IS NULL THEN seq_bin END AS seq_bin,"
+                      " CASE WHEN embedding IS NULL AND seq_bin IS NULL THEN seq_json END AS seq_json")
+SQL_GESTURE_EMBEDDINGS = f"SELECT {_EMBEDDING_COLUMNS} FROM custom_gestures WHERE user_id=? ORDER BY id"
+SQL_ALL_GESTURE_EMBEDDINGS = f"SELECT {_EMBEDDING_COLUMNS} FROM custom_gestures ORDER BY id"
+SQL_GESTURE_COUNT = "SELECT COUNT(*) FROM custom_gestures"
+
+
+class SQLiteStorage(Storage):
+    """Embedded engine: WAL-mode SQLite behind a small connection pool.
+
+    Queries run in worker threads (asyncio.to_thread); readers never block the
+    single writer thanks to WAL.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = "signcall.db", pool_size: int = 4):
+        self.path = path
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for i in range(max(pool_size, 1)):
+            conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None,
+                                   cached_statements=64)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            if i == 0:
+                conn.executescript(SCHEMA)
+                self._migrate(conn)
+            self._pool.put(conn)
+        self._conns = max(pool_size, 1)
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection) -> None:
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(custom_gestures)")}
+        for col in ("seq_bin", "embedding"):
+            if col not in cols:
+                conn.execute(f"ALTER TABLE custom_gestures ADD COLUMN {col} BLOB")
+
+    @contextmanager
+    def _conn(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def _write_many(self, sql: str, params: List[tuple]) -> None:
+        with self._conn() as c:
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                c.executemany(sql, params)
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                raise
+
+    def _insert_returning(self, sql: str, params: List[tuple]) -> List[int]:
+        # like _write_many, but one statement per row to collect the RETURNING ids
+        with self._conn() as c:
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [c.execute(sql, p).fetchone()[0] for p in params]
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                raise
+        return ids
+
+    def _query(self, sql: str, params: tuple) -> List[sqlite3.Row]:
+        with self._conn() as c:
+            return c.execute(sql, params).fetchall()
+
+    async def insert_messages(self, rows: List[Row]) -> None:
+        params = [(r["user_id"], r.get("content") or "", r.get("emoji") or "",
+                   r.get("language") or "en", r["timestamp"]) for r in rows]
+        ids = await asyncio.to_thread(self._insert_returning, SQL_INSERT_MESSAGE, params)
+        for row, row_id in zip(rows, ids):
+            row["id"] = row_id
+
+    async def history_head(self, user_id: str) -> Tuple[int, str]:
+        (row,) = await asyncio.to_thread(self._query, SQL_HEAD, (user_id,))
+        return row[0], row[1]
+
+    async def fetch_messages(self, user_id: str, since: str, limit: int) -> List[Row]:
+        ts, row_id = parse_cursor(since)
+        rows = await asyncio.to_thread(self._query, SQL_FETCH, (user_id, ts, ts, row_id, limit))
+        return [dict(r) for r in rows]
+
+    async def clear_messages(self, user_id: str) -> None:
+        await asyncio.to_thread(self._write_many, SQL_CLEAR, [(user_id,)])
+
+    async def insert_gestures(self, rows: List[Row]) -> None:
+        params = [(r["user_id"], r["name"], int(r.get("sample_idx") or 0), r["seq_bin"],
+                   embedding_bytes(r["embedding"])) for r in rows]
+        ids = await asyncio.to_thread(self._insert_returning, SQL_INSERT_GESTURE, params)
+        for row, row_id in zip(rows, ids):
+            row["id"] = row_id
+
+    async def gesture_samples(self, user_id: str, name: str = "") -> List[Row]:
+        if name:
+            rows = await asyncio.to_thread(self._query, SQL_GESTURE_SAMPLES_BY_NAME, (user_id, name))
+        else:
+            rows = await asyncio.to_thread(self._query, SQL_GESTURE_SAMPLES, (user_id,))
+        return [{"name": r["name"], "seq_bin": r["seq_bin"] or sample_bytes(json.loads(r["seq_json"]))}
+                for r in rows]
+
+    @staticmethod
+    def _embedding(r: sqlite3.Row):
+        if r["embedding"] is not None:
+            return embedding_from_bytes(r["embedding"])
+        return sample_embedding(r["seq_bin"] or sample_bytes(json.loads(r["seq_json"])))
+
+    async def gesture_embeddings(self, user_id: str) -> List[Row]:
+        rows = await asyncio.to_thread(self._query, SQL_GESTURE_EMBEDDINGS, (user_id,))
+        return [{"name": r["name"], "embedding": self._embedding(r)} for r in rows]
+
+    async def all_gesture_embeddings(self) -> List[Row]:
+        rows = await asyncio.to_thread(self._query, SQL_ALL_GESTURE_EMBEDDINGS, ())
+        return [{"id": r["id"], "user_id": r["user_id"], "name": r["name"], "embedding": self._embedding(r)}
+                for r in rows]
+
+    async def gesture_count(self) -> int:
+        (row,) = await asyncio.to_thread(self._query, SQL_GESTURE_COUNT, ())
+        return row[0]
+
+    async def close(self) -> None:
+        for _ in range(self._conns):
+            self._pool.get().close()
+
+
+def open_storage(backend: str, supabase_client=None, sqlite_path: str = "signcall.db",
+                 concurrency: int = 64, sqlite_pool: int = 4) -> Storage:
+    # backend: "supabase", "sqlite", or "" (Supabase when configured, else SQLite)
+    backend = (backend or "").lower()
+    if backend in ("", "supabase") and supabase_client is not None:
+        return SupabaseStorage(supabase_client, concurrency)
+    if backend == "supabase":
+        raise RuntimeError("STORAGE_BACKEND=supabase but SUPABASE_URL/SUPABASE_KEY are not set")
+    if backend not in ("", "sqlite"):
+        raise RuntimeError(f"Unknown STORAGE_BACKEND {backend!r}")
+    return SQLiteStorage(sqlite_path, pool_size=sqlite_pool)
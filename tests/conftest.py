@@ -0,0 +1,101 @@
+import asyncio
+import importlib
+import os
+import sys
+
+import pytest
+
+# the backend is a flat set of modules next to main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# read at import time by main.py / translation.py
+os.environ.setdefault("EMOTION_WORKERS", "0")
+os.environ.setdefault("TRANSLATE_CACHE_PATH", "")
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # a fresh backend on its own SQLite file; main is re-imported so module-level
+    # singletons (writer, caches, rooms) don't leak between tests
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "signcall.db"))
+    monkeypatch.setenv("PROJECTION_PATH", str(tmp_path / "projection.npz"))
+    monkeypatch.setenv("DICTIONARY_PATH", str(tmp_path / "dictionary.npz"))
+    sys.modules.pop("main", None)
+    main = importlib.import_module("main")
+    with TestClient(main.app) as c:
+        c.main = main
+        yield c
+
+
+class FakeStorage:
+    """Stored gesture rows in memory, behind the Storage reads that the gesture
+    cache, the shared dictionary and the projection store make.
+
+    `delay` slows every read so a test can land writes while one is running;
+    `loads` counts per-user reads.
+    """
+
+    def __init__(self, rows=(), delay=0.0):
+        self.rows = list(rows)  # [{"id", "user_id", "name", "embedding"}]
+        self.delay = delay
+        self.loads = 0
+
+    async def gesture_embeddings(self, user_id):
+        self.loads += 1
+        await asyncio.sleep(self.delay)
+        return [{"name": r["name"], "embedding": r["embedding"]} for r in self.rows if r["user_id"] == user_id]
+
+    async def all_gesture_embeddings(self):
+        await asyncio.sleep(self.delay)
+        return [dict(r) for r in self.rows]
+
+    async def gesture_count(self):
+        return len(self.rows)
+
+
+@pytest.fixture
+def fake_storage():
+    return FakeStorage
+
+
+@pytest.fixture
+def gesture_rows():
+    # make(n) -> n stored rows with ids 0..n-1: row i belongs to users[i % len(users)] and is
+    # named s<i>, or cycles through `names` one full round of users at a time
+    import numpy as np
+
+    from gestures import FRAME_DIM, normalize
+
+    def make(n, users=("u0", "u1", "u2"), names=None, seed=0):
+        vecs = normalize(np.random.default_rng(seed).normal(size=(n, FRAME_DIM))).astype(np.float32)
+        return [{"id": i, "user_id": users[i % len(users)],
+                 "name": names[i // len(users) % len(names)] if names else f"s{i}", "embedding": vecs[i]}
+                for i in range(n)]
+
+    return make
+
+
+@pytest.fixture
+def sign_samples():
+    # make() -> (names, vecs, centres): `per_sign` noisy unit vectors around each of `n_signs`
+    # random centres (drawn from a `rank`-dimensional subspace if given, as real embeddings
+    # are); another `draw` gives fresh samples of the same signs
+    import numpy as np
+
+    from gestures import FRAME_DIM, normalize
+
+    def make(n_signs=4, per_sign=10, noise=0.05, seed=0, draw=0, rank=0):
+        rng = np.random.default_rng(seed)
+        if rank:
+            centres = normalize(rng.normal(size=(n_signs, rank)) @ rng.normal(size=(rank, FRAME_DIM)))
+        else:
+            centres = normalize(rng.normal(size=(n_signs, FRAME_DIM)))
+        rng = np.random.default_rng((seed, draw))
+        names = [f"s{i}" for i in range(n_signs) for _ in range(per_sign)]
+        vecs = normalize(np.repeat(centres, per_sign, axis=0) + noise * rng.normal(size=(len(names), FRAME_DIM)))
+        return names, list(vecs.astype(np.float32)), centres
+
+    return make
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+
+import numpy as np
+
+import ann
+from ann import IVFIndex, SharedDictionary
+
+
+def test_add_during_background_save_is_kept(tmp_path, monkeypatch, fake_storage, gesture_rows):
+    started, release = threading.Event(), threading.Event()
+    write = IVFIndex.write
+
+    def slow_write(path, snap):
+        started.set()
+        release.wait(5)
+        write(path, snap)
+
+    monkeypatch.setattr(ann.IVFIndex, "write", staticmethod(slow_write))
+
+    async def run():
+        d = SharedDictionary(fake_storage(gesture_rows(10)), path=str(tmp_path / "dict.npz"))
+        await d.rebuild()
+        await asyncio.to_thread(started.wait, 5)  # the save is now in progress
+        d.add("u9", "late", np.ones(63, dtype=np.float32))
+        release.set()
+        await d.flush()
+        return d
+
+    d = asyncio.run(run())
+    assert len(d.index) == 11
+    assert ("u9", "late") in d.index.meta
+    assert len(IVFIndex.load(str(tmp_path / "dict.npz"))) == 10  # snapshot taken before the add
+
+
+def test_add_does_not_train_on_the_loop(monkeypatch):
+    index = IVFIndex(train_min=8)
+    trained = []
+    monkeypatch.setattr(index, "train", lambda: trained.append(1))
+    rng = np.random.default_rng(1)
+    index.add(rng.normal(size=(16, 63)), [("u", "s")] * 16, train=False)
+    assert not trained and index.needs_training()
+
+
+def test_verify_rebuilds_a_stale_index(tmp_path, fake_storage, gesture_rows):
+    async def run():
+        path = str(tmp_path / "dict.npz")
+        old = SharedDictionary(fake_storage(gesture_rows(5)), path=path)
+        await old.rebuild()
+        await old.flush()
+        d = SharedDictionary(fake_storage(gesture_rows(8)), path=path)
+        assert d.load() and len(d.index) == 5
+        await d.verify()
+        return d
+
+    assert len(asyncio.run(run()).index) == 8
+
+
+def test_search_finds_exact_vector():
+    rng = np.random.default_rng(2)
+    vecs = rng.normal(size=(50, 63))
+    index = IVFIndex(train_min=16)
+    index.add(vecs, [("u", f"s{i}") for i in range(50)])
+    (best, score), = index.search(vecs[7], k=1, nprobe=index.nlist)
+    assert best == 7 and score > 0.999
+
+
+def test_search_names_is_not_crowded_out_by_one_sign():
+    rng = np.random.default_rng(3)
+    base = rng.normal(size=63)
+    # 40 near-identical samples of one sign outrank every other sign for this query
+    vecs = [base + rng.normal(scale=0.01, size=63) for _ in range(40)]
+    vecs += [rng.normal(size=63) for _ in range(10)]
+    meta = [("u", "hello")] * 40 + [("u", f"s{i}") for i in range(10)]
+    index = IVFIndex(train_min=16)
+    index.add(np.stack(vecs), meta)
+    found = index.search_names(base, k=5, nprobe=index.nlist)
+    assert len(found) == 5
+    assert found[0]["name"] == "hello"
+    assert len({(r["user_id"], r["name"]) for r in found}) == 5
+
+
+def test_saves_during_rebuild_are_not_counted_twice(fake_storage, gesture_rows):
+    rows = gesture_rows(10)
+    extra = gesture_rows(12)[10:]  # ids 10 and 11
+
+    class RacingStorage(fake_storage):
+        async def all_gesture_embeddings(self):
+            # both rows are saved while the build is reading; only id 10 made it into the read
+            for r in extra:
+                d.add(r["user_id"], r["name"], r["embedding"], r["id"])
+            self.rows = rows + extra
+            return rows + extra[:1]
+
+    d = SharedDictionary(RacingStorage(rows))
+
+    async def run():
+        index = await d.rebuild()
+        await d.verify()  # sizes match, so this must not start another build
+        assert d.index is index
+        return index
+
+    assert len(asyncio.run(run())) == 12
+    assert d.index.meta.count(("u1", "s10")) == 1
@@ -0,0 +1,85 @@
+import asyncio
+import os
+
+from backplane import SocketBackplane
+
+
+def _collect(box):
+    async def handler(msg):
+        if msg.get("op") != "_connected":
+            box.append(msg)
+    return handler
+
+
+async def _until(check, timeout=3.0, action=None):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not check() and loop.time() < deadline:
+        if action is not None:
+            await action()
+        await asyncio.sleep(0.02)
+    return check()
+
+
+def _crash(bp):
+    # what a killed hub process leaves behind: connections reset, lock released, no goodbye
+    bp._closing = True
+    bp._task.cancel()
+    bp._server.close()
+    for w in list(bp._hub_clients):
+        w.transport.abort()
+    os.close(bp._lock_fd)
+    bp._lock_fd, bp._server = None, None
+
+
+def test_hub_failover_over_a_unix_socket(tmp_path):
+    url = f"unix://{tmp_path}/bp.sock"
+
+    async def main():
+        got = {n: [] for n in "abc"}
+        bps = {n: SocketBackplane(url, reconnect=0.05) for n in "abc"}
+        for n, bp in bps.items():
+            await bp.start(_collect(got[n]))
+        first_hubs = [n for n, bp in bps.items() if bp.is_hub]
+        await bps["b"].publish({"op": "x", "n": 1})
+        before = await _until(lambda: all({"op": "x", "n": 1} in got[n] for n in "abc"))
+
+        _crash(bps["a"])
+        b, c = bps["b"], bps["c"]
+        after = await _until(lambda: {"op": "x", "n": 2} in got["b"] and {"op": "x", "n": 2} in got["c"],
+                             action=lambda: c.publish({"op": "x", "n": 2}))
+        new_hubs = [n for n in "bc" if bps[n].is_hub]
+        await b.close()
+        await c.close()
+        return first_hubs, before, after, new_hubs
+
+    first_hubs, before, after, new_hubs = asyncio.run(main())
+    assert first_hubs == ["a"] and before
+    assert after and len(new_hubs) == 1  # one survivor took over the hub
+
+
+def test_hub_drops_a_subscriber_that_stops_reading(tmp_path):
+    path = f"{tmp_path}/bp.sock"
+
+    async def main():
+        got = []
+        hub, fast = SocketBackplane(f"unix://{path}"), SocketBackplane(f"unix://{path}")
+        hub.MAX_BUFFER = 64 << 10
+        await hub.start(_collect([]))
+        await fast.start(_collect(got))
+        _, slow = await asyncio.open_unix_connection(path)  # connected, never reads
+        await _until(lambda: len(hub._hub_clients) == 3)
+        payload = "x" * 1024
+        for i in range(2000):
+            await fast.publish({"op": "x", "n": i, "pad": payload})
+            await asyncio.sleep(0)  # let the fast subscriber read: it shares this loop
+        delivered = await _until(lambda: len(got) == 2000)
+        subscribers = len(hub._hub_clients)
+        slow.close()
+        await fast.close()
+        await hub.close()
+        return delivered, subscribers
+
+    delivered, subscribers = asyncio.run(main())
+    assert delivered  # the fast subscriber got everything ...
+    assert subscribers == 2  # ... and the slow one was cut off instead of buffering without bound
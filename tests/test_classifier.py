@@ -0,0 +1,60 @@
+import numpy as np
+
+from classifier import GestureClassifier, classify
+from gestures import FRAME_DIM, TemplateSet, normalize
+
+
+def _model(names, vecs):
+    ts = TemplateSet()
+    ts.extend(names, vecs)
+    return GestureClassifier(ts)
+
+
+def test_incremental_updates_match_a_fresh_fit(sign_samples):
+    names, vecs, _ = sign_samples()
+    grown = _model(names[:20], vecs[:20])
+    grown.fit()
+    grown.templates.extend(names[20:], vecs[20:])
+    grown.fit()
+    fresh = _model(names, vecs)
+    fresh.fit()
+    assert grown.version == fresh.version == len(vecs)
+    assert np.allclose(grown.centroids, fresh.centroids, atol=1e-5)
+    assert np.allclose(grown.inv_var, fresh.inv_var, rtol=1e-4)
+    assert grown.temperature == fresh.temperature
+
+
+def test_probabilities_are_calibrated_and_reject_unknowns(sign_samples):
+    names, vecs, centres = sign_samples()
+    model = _model(names, vecs)
+    p = model.probabilities(np.stack(vecs))
+    assert np.allclose(p.sum(axis=1), 1)
+    assert model.temperature >= 1 and model.reject >= model._chi2()
+    assert (p[:, :-1].argmax(axis=1) == model.templates.labels).all()
+    # far from every sign: "none of these" wins and nothing is recognised
+    rng = np.random.default_rng(9)
+    unknown = normalize(rng.normal(size=FRAME_DIM))
+    assert model.probabilities(unknown)[0, -1] > 0.5
+    assert classify(model, vector=unknown)["recognized"] == ""
+    assert classify(model, vector=centres[2])["recognized"] == "s2"
+
+
+def test_overlapping_signs_get_softer_confidence(sign_samples):
+    sharp = _model(*sign_samples(noise=0.02)[:2])
+    blurry = _model(*sign_samples(noise=0.5)[:2])
+    sharp.fit()
+    blurry.fit()
+    assert blurry.temperature >= sharp.temperature
+    _, vecs, _ = sign_samples(noise=0.5, draw=1)  # held-out draws from the same signs
+    p = blurry.probabilities(np.stack(vecs))[:, :-1]
+    accuracy = (p.argmax(axis=1) == blurry.templates.labels).mean()
+    assert p.max(axis=1).mean() <= accuracy + 0.1  # not overconfident
+
+
+def test_single_sample_per_sign_falls_back_to_defaults(sign_samples):
+    names, vecs, _ = sign_samples(per_sign=1)
+    model = _model(names, vecs)
+    model.fit()
+    assert model.temperature == 1.0
+    assert model.reject == model._chi2()
+    assert model.top_k(vecs[1], 1)[0][0] == "s1"
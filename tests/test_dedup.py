@@ -0,0 +1,41 @@
+from dedup import CaptionDedup
+
+
+def test_repeats_within_the_window_collapse():
+    d = CaptionDedup(window=1.5)
+    assert d.check("a", "Hello", now=0.0) == 0
+    assert d.check("a", " hello ", now=1.0) == 1  # case and whitespace don't matter
+    assert d.check("a", "hello", now=2.4) == 2    # each repeat slides the window
+    assert d.check("a", "hello", now=4.0) == 0    # quiet for longer than the window
+    assert d.stats()["collapsed"] == 2 and d.stats()["passed"] == 2
+
+
+def test_other_caption_or_sender_starts_a_new_run():
+    d = CaptionDedup(window=1.5)
+    assert d.check("a", "hello", now=0.0) == 0
+    assert d.check("b", "hello", now=0.1) == 0
+    assert d.check("a", "thanks", now=0.2) == 0
+    assert d.check("a", "hello", now=0.3) == 0
+
+
+def test_attached_value_follows_the_run():
+    d = CaptionDedup(window=1.5)
+    d.check("a", "hello", now=0.0)
+    d.attach("a", {"id": 1})
+    assert d.check("a", "hello", now=0.5) == 1
+    assert d.attached("a") == {"id": 1}
+    d.check("a", "thanks", now=0.6)
+    assert d.attached("a") is None
+    d.forget("a")
+    assert d.check("a", "thanks", now=0.7) == 0
+
+
+def test_keys_are_lru_bounded():
+    d = CaptionDedup(window=10, max_keys=2)
+    d.check("a", "x", now=0.0)
+    d.check("b", "x", now=0.0)
+    d.check("a", "x", now=0.1)  # refreshes a
+    d.check("c", "x", now=0.2)  # evicts b
+    assert d.stats()["senders"] == 2
+    assert d.check("b", "x", now=0.3) == 0
+    assert d.check("c", "x", now=0.4) == 1
@@ -0,0 +1,44 @@
+import numpy as np
+
+from dtw import SequenceIndex, dtw_distance
+from gestures import FRAME_DIM
+
+
+def _walks(n, length, seed):
+    rng = np.random.default_rng(seed)
+    return np.cumsum(0.1 * rng.normal(size=(n, length, FRAME_DIM)), axis=1).astype(np.float32)
+
+
+def _exact(index, q):
+    t = index.seqs
+    cost = ((t[:, None, :, :] - q[None, :, None, :]) ** 2).sum(axis=3)
+    return dtw_distance(cost, index.band)
+
+
+def test_lower_bounds_never_exceed_banded_dtw():
+    index = SequenceIndex(band=4, length=20)
+    index.extend([f"s{i}" for i in range(30)], list(_walks(30, 20, seed=0)))
+    for q in _walks(5, 20, seed=1):
+        assert (index.lower_bounds(q) <= _exact(index, q) + 1e-4).all()
+
+
+def test_search_with_pruning_matches_brute_force():
+    index = SequenceIndex(band=4, length=20)
+    walks = _walks(40, 20, seed=2)
+    index.extend([f"s{i % 10}" for i in range(40)], list(walks))
+    q = walks[7] + 0.01
+    exact = _exact(index, q)
+    per_sign = {}
+    for label, d in zip(index.labels, exact):
+        name = index.names[label]
+        per_sign[name] = min(per_sign.get(name, np.inf), d)
+    want = sorted(per_sign.items(), key=lambda kv: kv[1])[:3]
+    got = index.search(q, k=3)
+    assert [n for n, _ in got] == [n for n, _ in want]
+    assert np.allclose([d for _, d in got], [d / index.length for _, d in want], rtol=1e-4)
+
+
+def test_abandoned_candidates_are_inf():
+    cost = np.ones((2, 5, 5))
+    out = dtw_distance(cost, band=1, abandon_at=[10.0, 2.0])
+    assert out[0] == 5.0 and np.isinf(out[1])
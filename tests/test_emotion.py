@@ -0,0 +1,92 @@
+import asyncio
+
+import numpy as np
+
+from emotion import EmotionBusy, EmotionStream
+
+
+class FakeService:
+    # stands in for EmotionService: replays `results` (or raises them) one keyframe at a time
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = 0
+        self.stream_frames = 0
+        self.stream_keyframes = 0
+
+    async def analyze(self, kind, payload, shape=()):
+        self.calls += 1
+        res = self.results.pop(0)
+        if isinstance(res, Exception):
+            raise res
+        return res
+
+
+def _frame(level):
+    return "raw", np.full((64, 64, 3), level, dtype=np.uint8).tobytes(), (64, 64, 3)
+
+
+async def _push(stream, level):
+    sent = await stream.push(*_frame(level))
+    if stream._busy is not None:
+        await stream._busy
+    return sent
+
+
+def _scores(happy, sad):
+    return {"emotion": "", "scores": {"happy": happy, "sad": sad}, "face": {}}
+
+
+def test_only_changed_frames_and_max_gap_are_keyframes():
+    async def main():
+        service = FakeService([_scores(100, 0)] * 3)
+        stream = EmotionStream(service, threshold=6.0, max_gap=5)
+        sent = [await _push(stream, 100)]                  # first frame: no reference yet
+        sent += [await _push(stream, 102) for _ in range(4)]  # below the threshold
+        sent.append(await _push(stream, 102))              # the 5th frame since the keyframe
+        sent.append(await _push(stream, 150))              # a real change
+        return sent, stream, service
+
+    sent, stream, service = asyncio.run(main())
+    assert sent == [True, False, False, False, False, True, True]
+    assert stream.frames == 7 and stream.keyframes == service.calls == 3
+    assert service.stream_frames == 7 and service.stream_keyframes == 3
+
+
+def test_scores_are_smoothed_and_frames_skipped_while_busy():
+    async def main():
+        release = asyncio.Event()
+        service = FakeService([_scores(100, 0), _scores(0, 100)])
+        analyze = service.analyze
+
+        async def slow(*args):
+            await release.wait()
+            return await analyze(*args)
+
+        service.analyze = slow
+        stream = EmotionStream(service, alpha=0.4)
+        first = await stream.push(*_frame(0))
+        skipped = await stream.push(*_frame(200))  # analysis still running
+        release.set()
+        await stream._busy
+        second = await _push(stream, 200)
+        return first, skipped, second, stream.result()
+
+    first, skipped, second, result = asyncio.run(main())
+    assert (first, skipped, second) == (True, False, True)
+    assert result["scores"] == {"happy": 60.0, "sad": 40.0} and result["emotion"] == "happy"
+
+
+def test_face_move_rebases_and_busy_service_retries():
+    async def main():
+        face = {"x": 0, "y": 0, "w": 32, "h": 32}
+        service = FakeService([{**_scores(100, 0), "face": face}, EmotionBusy("queue full"), _scores(100, 0)])
+        stream = EmotionStream(service)
+        sent = [await _push(stream, 100)]
+        sent.append(await _push(stream, 100))  # new face box: becomes the reference, unanalysed
+        sent.append(await _push(stream, 180))  # changed: analysed, but the service is busy
+        sent.append(await _push(stream, 180))  # so the next frame is retried
+        return sent, stream
+
+    sent, stream = asyncio.run(main())
+    assert sent == [True, False, True, True]
+    assert stream.face == {"x": 0, "y": 0, "w": 32, "h": 32}
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+import gesture_cache
+from gesture_cache import GestureCache
+
+
+@pytest.fixture
+def storage(fake_storage, gesture_rows):
+    # users a-d, each with one "hello" and one "thanks" sample
+    return fake_storage(gesture_rows(8, users="abcd", names=("hello", "thanks")))
+
+
+def test_lru_evicts_least_recently_used_user(storage):
+    cache = GestureCache(storage, max_users=2)
+
+    async def main():
+        await cache.get("a")
+        await cache.get("b")
+        await cache.get("a")  # a is now the most recent
+        await cache.get("c")  # evicts b
+        await cache.get("a")
+        await cache.get("b")
+
+    asyncio.run(main())
+    assert storage.loads == 4
+    assert cache.stats()["evictions"] == 2 and cache.stats()["users"] == 2
+
+
+def test_byte_budget_keeps_at_least_the_newest_entry(storage):
+    cache = GestureCache(storage, max_bytes=1)
+
+    async def main():
+        await cache.get("a")
+        await cache.get("b")
+
+    asyncio.run(main())
+    assert list(cache._entries) == ["b"]
+    assert cache.stats()["bytes"] == cache._sizes["b"] > 1
+
+
+def test_entries_expire_after_ttl(storage, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(gesture_cache.time, "monotonic", lambda: now[0])
+    cache = GestureCache(storage, ttl=60)
+
+    async def main():
+        await cache.get("a")
+        now[0] += 59
+        await cache.get("a")
+        now[0] += 2
+        await cache.get("a")
+
+    asyncio.run(main())
+    assert storage.loads == 2
+    assert cache.stats()["hits"] == 1
+
+
+def test_concurrent_misses_share_one_load(storage):
+    storage.delay = 0.01
+    cache = GestureCache(storage)
+
+    async def main():
+        return await asyncio.gather(*(cache.get("a") for _ in range(5)))
+
+    entries = asyncio.run(main())
+    assert storage.loads == 1
+    assert all(e is entries[0] for e in entries)
+
+
+def test_writes_go_through_and_a_save_racing_a_load_is_not_cached(storage, gesture_rows):
+    storage.delay = 0.01
+    cache = GestureCache(storage)
+    new = {**gesture_rows(1, users="a", names=("hello",), seed=7)[0], "seq_bin": b""}
+
+    async def main():
+        entry = await cache.get("a")
+        cache.add("a", [new])
+        counts = dict(entry.counts)
+        loading = asyncio.ensure_future(cache.get("b"))
+        await asyncio.sleep(0)
+        cache.add("b", [new])  # lands while b's rows are being read
+        await loading
+        return counts, "b" in cache._entries
+
+    counts, cached = asyncio.run(main())
+    assert counts == {"hello": 2, "thanks": 1}
+    assert not cached
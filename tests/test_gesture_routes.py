@@ -0,0 +1,47 @@
+import numpy as np
+
+from gestures import FRAME_DIM
+
+
+def _frames(n=36, seed=0):
+    return np.random.default_rng(seed).uniform(0, 1, size=(n, FRAME_DIM)).tolist()
+
+
+def test_save_batch_rejects_non_finite_frames(client):
+    # JSON null would otherwise become NaN, be stored, and break every later recognise
+    bad = {"samples": [{"frames": _frames(seed=1)}, {"frames": [[None] * FRAME_DIM] * 36}]}
+    r = client.post("/custom_gesture/save_batch", params={"user_id": "u", "name": "hello"}, json=bad)
+    assert r.status_code == 400
+    assert client.get("/custom_gesture/list", params={"user_id": "u"}).json() == []
+    r = client.post("/custom_gesture/recognize", params={"user_id": "u"}, json={"frames": _frames()})
+    assert r.status_code == 200
+    r = client.post("/custom_gesture/recognize", params={"user_id": "u"}, json={"frames": [[None] * FRAME_DIM]})
+    assert r.status_code == 400
+
+
+def test_save_batch_stores_every_sample(client):
+    body = {"samples": [{"sample_idx": i + 1, "frames": _frames(seed=i)} for i in range(5)]}
+    r = client.post("/custom_gesture/save_batch", params={"user_id": "u", "name": "hello"}, json=body)
+    assert r.status_code == 200 and r.json() == {"ok": True, "saved": 5}
+    assert client.get("/custom_gesture/list", params={"user_id": "u"}).json() == [{"name": "hello", "samples": 5}]
+    r = client.post("/custom_gesture/recognize", params={"user_id": "u", "method": "mean", "k": 1},
+                    json={"frames": _frames(seed=2)})
+    assert r.json()["recognized"] == "hello"
+
+
+def test_save_batch_rejects_empty_and_oversized_batches(client):
+    params = {"user_id": "u", "name": "hello"}
+    assert client.post("/custom_gesture/save_batch", params=params, json={"samples": []}).status_code == 400
+    assert client.post("/custom_gesture/save_batch", params=params, json={}).status_code == 400
+    too_many = {"samples": [{"frames": _frames(2)}] * (client.main.MAX_GESTURE_BATCH + 1)}
+    assert client.post("/custom_gesture/save_batch", params=params, json=too_many).status_code == 413
+
+
+def test_save_batch_is_all_or_nothing_on_malformed_samples(client):
+    params = {"user_id": "u", "name": "hello"}
+    good = {"frames": _frames()}
+    for bad in ("not an object", {"sample_idx": 1}, {"frames": [[0.1] * 10]}, {"frames": []},
+                {"frames": [["x"] * FRAME_DIM]}, {"frames": _frames(), "sample_idx": "one"}):
+        r = client.post("/custom_gesture/save_batch", params=params, json={"samples": [good, bad]})
+        assert r.status_code == 400, bad
+    assert client.get("/custom_gesture/list", params={"user_id": "u"}).json() == []
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from gestures import FRAME_DIM, PACK_HEADER, pack_frames, packed_json, sample_bytes, unpack_frames
+
+
+def _frames(n=36, seed=0):
+    return np.random.default_rng(seed).uniform(-1, 1, size=(n, FRAME_DIM)).astype(np.float32)
+
+
+@pytest.mark.parametrize("dtype, tol", [("f32", 0), ("f16", 1e-3), ("u8", 2 / 255)])
+def test_pack_round_trip(dtype, tol):
+    frames = _frames()
+    out = unpack_frames(pack_frames(frames, dtype))
+    assert out.shape == frames.shape and out.dtype == np.float32
+    assert np.abs(out - frames).max() <= tol
+
+
+def test_u8_is_smallest():
+    frames = _frames()
+    sizes = {d: len(pack_frames(frames, d)) for d in ("u8", "f16", "f32")}
+    assert sizes["u8"] < sizes["f16"] < sizes["f32"]
+
+
+def test_constant_sample_packs_as_u8():
+    frames = np.full((4, FRAME_DIM), 0.5, dtype=np.float32)
+    assert np.allclose(unpack_frames(pack_frames(frames, "u8")), 0.5)
+
+
+def test_legacy_json_and_packed_json_agree():
+    frames = _frames(10)
+    legacy = sample_bytes({"frames": frames.tolist()})
+    assert sample_bytes(packed_json(legacy)) == legacy
+    assert np.allclose(unpack_frames(legacy), frames, atol=1e-3)
+
+
+@pytest.mark.parametrize("buf", [b"", b"XYZ" + bytes(PACK_HEADER.size), b"nope"])
+def test_unpack_rejects_garbage(buf):
+    with pytest.raises(ValueError):
+        unpack_frames(buf)
+
+
+def test_unpack_rejects_truncated_body():
+    with pytest.raises(ValueError):
+        unpack_frames(pack_frames(_frames(), "f16")[:-10])
+
+
+def test_pack_rejects_bad_input():
+    with pytest.raises(ValueError):
+        pack_frames(np.zeros((3, 10)))
+    with pytest.raises(ValueError):
+        pack_frames(_frames(), "f64")
@@ -0,0 +1,74 @@
+import asyncio
+
+import numpy as np
+
+from classifier import GestureClassifier
+from gestures import FRAME_DIM, TemplateSet, normalize
+from live_recognizer import LiveRecognizer, LiveSession
+
+
+def _model(seed):
+    rng = np.random.default_rng(seed)
+    ts = TemplateSet()
+    for name in ("hello", "thanks"):
+        centre = rng.normal(size=FRAME_DIM)
+        ts.extend([name] * 4, [normalize(centre + 0.01 * rng.normal(size=FRAME_DIM)) for _ in range(4)])
+    return GestureClassifier(ts)
+
+
+def test_tick_skips_users_whose_model_failed_to_load():
+    good = _model(0)
+
+    async def load(user_id):
+        if user_id == "bad":
+            raise RuntimeError("storage down")
+        return good
+
+    async def main():
+        rec = LiveRecognizer(load, min_frames=1, stable=1)
+        captions = []
+
+        async def on_caption(msg):
+            captions.append(msg)
+
+        # sessions added directly: tick() is driven by hand rather than by the timer task
+        ok, broken = LiveSession("good", on_caption), LiveSession("bad", on_caption)
+        rec.sessions = {ok, broken}
+        good.fit()
+        frame = good.templates.matrix[0].astype("<f4").tobytes()
+        ok.push(frame)
+        broken.push(frame)
+        await rec.tick()
+        await asyncio.sleep(0)
+        return rec, ok, broken, captions
+
+    rec, ok, broken, captions = asyncio.run(main())
+    assert rec.errors == 1
+    assert rec.scored == 1
+    assert not ok.dirty and broken.dirty  # the failed user's session is retried next tick
+    assert [c["text"] for c in captions] == ["hello"]
+
+
+def test_caption_held_back_by_a_slow_send_goes_out_later():
+    async def main():
+        rec = LiveRecognizer(None, stable=1)
+        release, captions = asyncio.Event(), []
+
+        async def on_caption(msg):
+            captions.append(msg["text"])
+            await release.wait()
+
+        s = LiveSession("u", on_caption)
+        rec._update(s, "hello", 0.9)
+        await asyncio.sleep(0)
+        rec._update(s, "thanks", 0.9)  # "hello" is still being sent
+        held = (rec.captions, s.sent)
+        release.set()
+        await asyncio.sleep(0)
+        rec._update(s, "thanks", 0.9)  # still signing "thanks" on the next tick
+        await asyncio.sleep(0)
+        return held, rec.captions, captions
+
+    held, count, captions = asyncio.run(main())
+    assert held == (1, "hello")
+    assert count == 2 and captions == ["hello", "thanks"]
@@ -0,0 +1,30 @@
+import asyncio
+
+from backplane import MemoryBackplane
+from message_bus import MessageBus
+from rooms import RoomRegistry
+
+
+def test_messages_reach_subscribers_on_other_workers():
+    async def main():
+        backplane = MemoryBackplane()
+        workers = []
+        for _ in range(2):
+            rooms, bus = RoomRegistry(backplane=backplane), MessageBus()
+            await rooms.start()
+            rooms.channels["message"] = lambda msg, bus=bus: bus.receive(msg["user_id"], msg["event"])
+            bus.attach(lambda user_id, event, rooms=rooms: rooms.send("message", {"user_id": user_id, "event": event}))
+            workers.append((rooms, bus))
+        (_, a), (_, b) = workers
+        local, remote = a.subscribe("u"), b.subscribe("u")
+        a.publish("u", {"id": 1, "content": "hi"})
+        got = await asyncio.wait_for(remote.get(), 1), local.get_nowait()
+        await asyncio.sleep(0)
+        echoed = local.qsize()  # the publisher's own copy isn't delivered twice
+        for rooms, _ in workers:
+            await rooms.close()
+        return got, echoed
+
+    (remote, local), echoed = asyncio.run(main())
+    assert remote == local == {"id": 1, "content": "hi"}
+    assert echoed == 0
@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+
+def test_ack_saved_reports_spilled_rows_as_pending(client):
+    async def down(rows):
+        raise ConnectionError("database unavailable")
+
+    client.main.storage.insert_messages = down
+    r = client.post("/message", params={"user_id": "u1", "content": "hello", "ack": "saved"})
+    assert r.status_code == 202
+    assert r.json()["status"] == "pending"
+    assert client.get("/message/stats").json()["writer"]["spill"] == 1
+
+
+def _post(client, user_id, content):
+    r = client.post("/message", params={"user_id": user_id, "content": content, "ack": "saved"})
+    assert r.status_code == 200
+    return r.json()["data"]
+
+
+def test_history_pages_with_next_cursor(client):
+    for text in ("a", "b", "c"):
+        _post(client, "u1", text)
+    first = client.get("/history/u1", params={"limit": 2})
+    cursor = first.headers["X-Next-Cursor"]
+    rest = client.get("/history/u1", params={"limit": 2, "since": cursor})
+    assert [m["content"] for m in first.json()] == ["a", "b"]
+    assert [m["content"] for m in rest.json()] == ["c"]
+    assert "X-Next-Cursor" not in rest.headers  # a short page is the last one
+    assert first.headers["X-History-Count"] == "3"
+    assert client.get("/history/u1", params={"since": "not|a|cursor"}).status_code == 400
+
+
+def test_history_etag_revalidates_until_a_new_message(client):
+    _post(client, "u1", "a")
+    etag = client.get("/history/u1").headers["ETag"]
+    unchanged = client.get("/history/u1", headers={"If-None-Match": etag})
+    _post(client, "u1", "b")
+    changed = client.get("/history/u1", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304 and not unchanged.content
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert [m["content"] for m in changed.json()] == ["a", "b"]
+
+
+class FakeRequest:
+    # the two things stream_messages() reads from its request
+    headers = {}
+
+    async def is_disconnected(self):
+        return False
+
+
+def _event(chunk):
+    fields = dict(line.split(": ", 1) for line in chunk.strip().split("\n"))
+    return fields["event"], json.loads(fields["data"]), fields.get("id", "")
+
+
+def test_stream_replays_the_backlog_then_sends_live_messages(client):
+    main = client.main
+    a, b = _post(client, "u1", "a"), _post(client, "u1", "b")
+
+    async def run():
+        # on the app's own loop: TestClient would buffer the endless response
+        resp = await main.stream_messages("u1", FakeRequest(), since=main.message_cursor(a), keepalive=15.0)
+        body = resp.body_iterator
+        backlog = await asyncio.wait_for(body.__anext__(), 2)
+        main.queue_message("u1", "c")
+        live = await asyncio.wait_for(body.__anext__(), 2)
+        await body.aclose()
+        return _event(backlog), _event(live), main.message_bus.subscriber_count()
+
+    backlog, live, subscribers = client.portal.call(run)
+    assert backlog == ("message", b, main.message_cursor(b))
+    assert live[0] == "message" and live[1]["content"] == "c"
+    assert live[2] == main.message_cursor(live[1])  # the client's Last-Event-ID on reconnect
+    assert subscribers == 0
+
+
+def test_stream_asks_a_lagging_client_to_resync(client):
+    main = client.main
+    a = _post(client, "u1", "a")
+    main.message_bus.queue_size = 2
+
+    async def run():
+        resp = await main.stream_messages("u1", FakeRequest(), since=main.message_cursor(a), keepalive=15.0)
+        body = resp.body_iterator
+        for i in range(3):  # overflows the subscriber's queue before it reads anything
+            main.message_bus.publish("u1", {"id": 100 + i, "timestamp": "x", "content": str(i)})
+        first = await asyncio.wait_for(body.__anext__(), 2)
+        rest = [chunk async for chunk in body]
+        return _event(first), rest
+
+    first, rest = client.portal.call(run)
+    assert first[:2] == ("resync", {"since": main.message_cursor(a)})
+    assert rest == []  # the stream ends; the client refetches /history from its cursor
@@ -0,0 +1,81 @@
+import asyncio
+
+from message_writer import MessageWriter
+
+
+class FlakyDB:
+    def __init__(self, down_for: int):
+        self.down_for = down_for  # calls that fail before the database comes back
+        self.rows = []
+
+    async def insert_many(self, rows):
+        if self.down_for > 0:
+            self.down_for -= 1
+            raise ConnectionError("database unavailable")
+        self.rows.extend(rows)
+
+
+def test_failed_batch_is_spilled_and_retried():
+    db = FlakyDB(down_for=5)
+
+    async def main():
+        writer = MessageWriter(db.insert_many, batch_size=2, interval=0.01, spill_retry=0.01)
+        futs = [writer.submit({"content": str(i)}) for i in range(2)]
+        await asyncio.wait_for(asyncio.gather(*futs), 2)
+        stats = writer.stats()
+        await writer.close()
+        return stats
+
+    stats = asyncio.run(main())
+    assert [r["content"] for r in db.rows] == ["0", "1"]
+    assert stats["spilled"] == 2 and stats["recovered"] == 2
+    assert stats["dropped"] == 0 and stats["spill"] == 0
+
+
+def test_spill_overflow_drops_oldest_rows():
+    db = FlakyDB(down_for=10 ** 6)
+
+    async def main():
+        writer = MessageWriter(db.insert_many, batch_size=1, interval=0.01, retries=1, max_spill=2,
+                               spill_retry=10)
+        futs = [writer.submit({"content": str(i)}) for i in range(3)]
+        await asyncio.sleep(0.1)
+        done = [f.done() for f in futs]
+        stats = writer.stats()
+        await writer.close()
+        return done, stats, writer.stats()
+
+    done, stats, closed = asyncio.run(main())
+    assert done == [True, False, False]  # the oldest was given up on; the rest still wait
+    assert stats["spill"] == 2 and stats["dropped"] == 1
+    assert closed["dropped"] == 3
+
+
+def test_newer_batches_wait_behind_the_spill_list():
+    db = FlakyDB(down_for=1)
+
+    async def main():
+        writer = MessageWriter(db.insert_many, batch_size=1, interval=0.01, retries=1, spill_retry=0.05)
+        first = writer.submit({"content": "0"})
+        await asyncio.sleep(0.03)  # "0" failed and is spilled; the database is back for the rest
+        later = [writer.submit({"content": str(i)}) for i in range(1, 4)]
+        await asyncio.wait_for(asyncio.gather(first, *later), 2)
+        await writer.close()
+
+    asyncio.run(main())
+    assert [r["content"] for r in db.rows] == ["0", "1", "2", "3"]
+
+
+def test_wait_saved_reports_spilled_rows():
+    db = FlakyDB(down_for=10 ** 6)
+
+    async def main():
+        writer = MessageWriter(db.insert_many, batch_size=1, interval=0.01, retries=1, spill_retry=10)
+        fut = writer.submit({"content": "0"})
+        saved = await writer.wait_saved(fut, 2)  # returns on the spill, not after the timeout
+        spilled = writer.is_spilled(fut)
+        db.down_for = 0
+        await writer.close()
+        return saved, spilled, await writer.wait_saved(fut, 1)
+
+    assert asyncio.run(main()) == (False, True, True)
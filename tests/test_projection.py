@@ -0,0 +1,47 @@
+import asyncio
+
+import numpy as np
+
+from gestures import FRAME_DIM, TemplateSet, normalize, recognize
+from projection import ProjectionStore, fit_projection
+
+
+def test_mean_scores_are_reported_on_the_63d_scale(sign_samples):
+    names, vecs, _ = sign_samples(n_signs=20, per_sign=20, rank=8)
+    vecs = np.stack(vecs)
+    projection = fit_projection(vecs, 16)
+    full, reduced = TemplateSet(), TemplateSet(projection)
+    full.extend(names, list(vecs))
+    reduced.extend(names, list(vecs))
+    rng = np.random.default_rng(1)
+    query = normalize(vecs[0] + 0.3 * rng.normal(size=FRAME_DIM))
+    raw = reduced.top_k(query, 1)[0][1]
+    mapped = recognize(reduced, vector=query, k=1, min_score=0)["score"]
+    original = recognize(full, vector=query, k=1, min_score=0)["score"]
+    assert raw > original  # projection alone would make a fixed threshold too lenient
+    assert abs(mapped - original) < abs(raw - original)
+
+
+def test_workers_sharing_a_path_converge_on_one_version(tmp_path, fake_storage, sign_samples):
+    _, vecs, _ = sign_samples(n_signs=20, per_sign=20, rank=8)
+    rows = [{"id": i, "user_id": "u", "name": "x", "embedding": v} for i, v in enumerate(vecs)]
+    path = str(tmp_path / "p.npz")
+
+    async def main():
+        a = ProjectionStore(fake_storage(rows), path, dim=16, min_samples=64, poll=0.01)
+        b = ProjectionStore(fake_storage(rows), path, dim=16, min_samples=64, poll=0.01)
+        b.start()
+        await a.refit(force=False)
+        for _ in range(100):
+            if b.current.version == a.current.version:
+                break
+            await asyncio.sleep(0.01)
+        # b's own refit finds the shared file already covers the stored rows
+        await b.refit(force=False)
+        await a.close()
+        await b.close()
+        return a.current, b.current
+
+    a, b = asyncio.run(main())
+    assert not a.identity and a.version == b.version
+    assert b.cosine_map is not None
@@ -0,0 +1,237 @@
+import asyncio
+
+import pytest
+
+from backplane import MemoryBackplane
+from rooms import CLOSE_IDLE, CLOSE_SLOW, Outbox, RoomFull, RoomRegistry
+
+
+class FakeSocket:
+    def __init__(self, blocked=False):
+        self.sent = []
+        self.closed = None
+        self.gate = asyncio.Event()  # send_json() waits on it: a client that isn't reading
+        if not blocked:
+            self.gate.set()
+
+    async def send_json(self, msg):
+        await self.gate.wait()
+        self.sent.append(msg)
+
+    async def close(self, code=1000):
+        self.closed = code
+
+
+async def _join(rooms, code, peer_id, ws=None):
+    ws = ws or FakeSocket()
+    member = rooms.connect(code, ws)
+    await rooms.hello(code, member, peer_id)
+    return ws, member
+
+
+async def _close(rooms):
+    # retire every socket first, as the socket handlers would, so no outbox task outlives the loop
+    for code, room in list(rooms.rooms.items()):
+        for member in list(room.members.values()):
+            await rooms.disconnect(code, member)
+    await rooms.close()
+
+
+def test_hello_gets_a_snapshot_then_deltas():
+    async def main():
+        rooms = RoomRegistry()
+        await rooms.start()
+        a, _ = await _join(rooms, "r", "pa")
+        b, mb = await _join(rooms, "r", "pb")
+        await asyncio.sleep(0.01)
+        await rooms.disconnect("r", mb)
+        await asyncio.sleep(0.01)
+        await _close(rooms)
+        return a.sent, b.sent
+
+    a, b = asyncio.run(main())
+    assert a == [{"type": "peers", "version": 1, "peers": ["pa"]},
+                 {"type": "join", "version": 2, "peerId": "pb"},
+                 {"type": "leave", "version": 3, "peerId": "pb"}]
+    assert b == [{"type": "peers", "version": 2, "peers": ["pa", "pb"]}]
+
+
+def test_empty_rooms_are_collected():
+    async def main():
+        rooms = RoomRegistry()
+        await rooms.start()
+        _, ma = await _join(rooms, "r", "pa")
+        _, mb = await _join(rooms, "r", "pb")
+        await rooms.disconnect("r", ma)
+        kept = "r" in rooms.rooms
+        await rooms.disconnect("r", mb)
+        await rooms.disconnect("r", mb)  # the socket handler and the sweep may both call it
+        await _close(rooms)
+        return kept, rooms.stats()
+
+    kept, stats = asyncio.run(main())
+    assert kept
+    assert stats["rooms"] == 0 and stats["connections"] == 0 and stats["joins"] == 2
+
+
+def test_caps_reject_new_connections():
+    async def main():
+        rooms = RoomRegistry(max_room_size=2, max_rooms=1)
+        await rooms.start()
+        await _join(rooms, "r", "pa")
+        await _join(rooms, "r", "pb")
+        with pytest.raises(RoomFull):
+            rooms.connect("r", FakeSocket())
+        with pytest.raises(RoomFull):
+            rooms.connect("other", FakeSocket())
+        await _close(rooms)
+        return rooms.rejected
+
+    assert asyncio.run(main()) == 2
+
+
+def test_sweep_pings_live_sockets_and_closes_idle_ones():
+    async def main():
+        rooms = RoomRegistry(heartbeat=0.02, idle_timeout=0.5)
+        await rooms.start()
+        live, _ = await _join(rooms, "r", "live")
+        idle, member = await _join(rooms, "r", "idle")
+        member.last_seen -= 1
+        await asyncio.sleep(0.05)
+        peers = rooms.rooms["r"].peers()
+        await _close(rooms)
+        return rooms, live, idle, peers
+
+    rooms, live, idle, peers = asyncio.run(main())
+    assert idle.closed == CLOSE_IDLE and rooms.timeouts == 1
+    assert {"type": "leave", "version": 3, "peerId": "idle"} in live.sent
+    assert any(m["type"] == "ping" for m in live.sent)
+    assert peers == ["live"]
+
+
+def test_remote_joins_respect_max_rooms():
+    async def main():
+        rooms = RoomRegistry(max_rooms=1)
+        await rooms.start()
+        for code in ("r1", "r2", "r1"):
+            await rooms._on_backplane({"op": "join", "room": code, "peer": f"p-{code}", "node": "other"})
+        await _close(rooms)
+        return rooms
+
+    rooms = asyncio.run(main())
+    assert list(rooms.rooms) == ["r1"]
+    assert rooms.rejected == 1
+
+
+async def _overflow(policy):
+    # "0" is in flight on a socket that isn't reading; "1"-"3" hit a 2-slot queue
+    ws = FakeSocket(blocked=True)
+    box = Outbox(ws, lambda: {}, maxsize=2, policy=policy)
+    box.put({"n": 0})
+    await asyncio.sleep(0)
+    accepted = [box.put({"n": i}) for i in (1, 2, 3)]
+    ws.gate.set()
+    await asyncio.sleep(0.01)
+    box.close()
+    return box, ws, accepted
+
+
+def test_outbox_drop_oldest():
+    box, ws, accepted = asyncio.run(_overflow("drop_oldest"))
+    assert accepted == [True, True, True]
+    assert [m["n"] for m in ws.sent] == [0, 2, 3] and box.dropped == 1
+
+
+def test_outbox_drop_newest():
+    box, ws, accepted = asyncio.run(_overflow("drop_newest"))
+    assert accepted == [True, True, False]
+    assert [m["n"] for m in ws.sent] == [0, 1, 2] and box.dropped == 1
+
+
+def test_outbox_close_policy_closes_the_socket():
+    box, ws, accepted = asyncio.run(_overflow("close"))
+    assert accepted == [True, True, False]
+    assert ws.closed == CLOSE_SLOW and [m["n"] for m in ws.sent] == [0]
+
+
+def test_outbox_coalesces_presence_into_one_late_snapshot():
+    async def main():
+        state = {"version": 0}
+        ws = FakeSocket(blocked=True)
+        box = Outbox(ws, lambda: {"type": "peers", "version": state["version"]}, maxsize=2)
+        box.put({"type": "chat", "n": 0})
+        await asyncio.sleep(0)
+        box.put({"type": "join", "version": 1}, presence=True)
+        box.put({"type": "chat", "n": 1})
+        for v in (2, 3):  # queue full: queued presence collapses into one snapshot, then is absorbed
+            box.put({"type": "leave", "version": v}, presence=True)
+        state["version"] = 3
+        ws.gate.set()
+        await asyncio.sleep(0.01)
+        box.close()
+        return box, ws.sent
+
+    box, sent = asyncio.run(main())
+    assert sent == [{"type": "chat", "n": 0}, {"type": "chat", "n": 1}, {"type": "peers", "version": 3}]
+    assert box.coalesced == 3 and box.dropped == 0
+
+
+def test_outbox_stalled_send_closes_the_socket():
+    async def main():
+        ws = FakeSocket(blocked=True)
+        box = Outbox(ws, lambda: {}, send_timeout=0.01)
+        box.put({"n": 0})
+        await asyncio.sleep(0.05)
+        return box, ws, box.put({"n": 1})
+
+    box, ws, accepted = asyncio.run(main())
+    assert box.stalled and ws.closed == CLOSE_SLOW
+    assert not accepted and not ws.sent
+
+
+def test_two_registries_share_a_room_over_one_backplane():
+    async def main():
+        backplane = MemoryBackplane()
+        a, b = RoomRegistry(backplane=backplane, node_id="a"), RoomRegistry(backplane=backplane, node_id="b")
+        await a.start()
+        await b.start()
+        sa, ma = await _join(a, "r", "pa")
+        sb, _ = await _join(b, "r", "pb")
+        await a.relay("r", ma, {"type": "chat", "text": "hi"})
+        await asyncio.sleep(0.01)
+        await _close(a)  # says "bye": b forgets a's peers at once
+        await asyncio.sleep(0.01)
+        await _close(b)
+        return sa.sent, sb.sent
+
+    sa, sb = asyncio.run(main())
+    assert sa == [{"type": "peers", "version": 1, "peers": ["pa"]},
+                  {"type": "join", "version": 2, "peerId": "pb"}]
+    assert sb == [{"type": "peers", "version": 2, "peers": ["pb", "pa"]},
+                  {"type": "chat", "text": "hi"},
+                  {"type": "leave", "version": 3, "peerId": "pa"}]
+
+
+def test_silent_server_expires_after_idle_timeout():
+    async def main():
+        backplane = MemoryBackplane()
+        a, b = (RoomRegistry(backplane=backplane, node_id=n, heartbeat=0.02, idle_timeout=0.1) for n in "ab")
+        await a.start()
+        await b.start()
+        for rooms, peer_id in ((a, "pa"), (b, "pb")):
+            _, member = await _join(rooms, "r", peer_id)
+            member.last_seen += 60  # the fake sockets never pong; only the server should time out
+        await asyncio.sleep(0.15)  # a's state heartbeats keep it alive past the timeout
+        alive = b.rooms["r"].peers()
+        # a crashes: no "bye", no more heartbeats
+        a._sweeper.cancel()
+        backplane._handlers.remove(a._on_backplane)
+        await asyncio.sleep(0.2)
+        expired = b.rooms["r"].peers()
+        await _close(a)
+        await _close(b)
+        return alive, expired
+
+    alive, expired = asyncio.run(main())
+    assert alive == ["pb", "pa"]
+    assert expired == ["pb"]
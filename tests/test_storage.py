@@ -0,0 +1,33 @@
+import asyncio
+
+from storage import SQLiteStorage, message_cursor, parse_cursor
+
+
+def test_pages_do_not_skip_rows_sharing_a_timestamp(tmp_path):
+    # two workers can stamp the same instant; the (timestamp, id) cursor keeps both
+    async def main():
+        db = SQLiteStorage(str(tmp_path / "t.db"), pool_size=1)
+        rows = [{"user_id": "u", "content": str(i), "timestamp": "2024-01-01T00:00:00"} for i in range(3)]
+        rows.append({"user_id": "u", "content": "3", "timestamp": "2024-01-01T00:00:01"})
+        await db.insert_messages(rows)
+        assert [r["id"] for r in rows] == [1, 2, 3, 4]
+        seen, since = [], ""
+        while True:
+            page = await db.fetch_messages("u", since, 2)
+            seen += [r["content"] for r in page]
+            if len(page) < 2:
+                break
+            since = message_cursor(page[-1])
+        # a bare timestamp (older clients) means "after that instant"
+        legacy = await db.fetch_messages("u", "2024-01-01T00:00:00", 10)
+        await db.close()
+        return seen, legacy
+
+    seen, legacy = asyncio.run(main())
+    assert seen == ["0", "1", "2", "3"]
+    assert [r["content"] for r in legacy] == ["3"]
+
+
+def test_parse_cursor():
+    assert parse_cursor("2024-01-01T00:00:00|7") == ("2024-01-01T00:00:00", 7)
+    assert parse_cursor("")[0] == ""
@@ -0,0 +1,108 @@
+import asyncio
+
+import httpx
+import pytest
+
+from translation import TranslationCache, Translator
+
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    path = str(tmp_path / "t.db")
+
+    async def main():
+        await TranslationCache(path).set("hello", "ta", "vanakkam")
+        fresh = TranslationCache(path)
+        return await fresh.get("hello", "ta"), fresh.stats()
+
+    value, stats = asyncio.run(main())
+    assert value == "vanakkam"
+    assert stats["disk_hits"] == 1
+
+
+def test_http_errors_are_not_cached():
+    def handler(request):
+        return httpx.Response(502, json={"responseData": {"translatedText": "Bad Gateway"},
+                                         "responseStatus": 200})
+
+    async def main():
+        translator = Translator(TranslationCache(path=""))
+        translator._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with pytest.raises(httpx.HTTPStatusError):
+            await translator.translate("hello", "ta")
+        cached = await translator.cache.get("hello", "ta")
+        await translator.close()
+        return cached
+
+    assert asyncio.run(main()) is None
+
+
+def test_padded_text_is_fetched_and_cached_stripped():
+    queries = []
+
+    def handler(request):
+        queries.append((request.url.params["q"], request.url.params["langpair"]))
+        return httpx.Response(200, json={"responseData": {"translatedText": "vanakkam"},
+                                         "responseStatus": 200})
+
+    async def main():
+        translator = Translator(TranslationCache(path=""))
+        translator._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        first = await translator.translate("  hello\n", " TA")
+        second = await translator.translate("hello", "ta")
+        await translator.close()
+        return first, second
+
+    assert asyncio.run(main()) == ("vanakkam", "vanakkam")
+    assert queries == [("hello", "en|ta")]
+
+
+def _slow_upstream(release, calls):
+    async def handler(request):
+        calls.append(request.url.params["q"])
+        await release.wait()
+        return httpx.Response(200, json={"responseData": {"translatedText": request.url.params["q"].upper()},
+                                         "responseStatus": 200})
+    return handler
+
+
+def test_identical_lookups_in_flight_share_one_request():
+    async def main():
+        release, calls = asyncio.Event(), []
+        translator = Translator(TranslationCache(path=""))
+        translator._client = httpx.AsyncClient(transport=httpx.MockTransport(_slow_upstream(release, calls)))
+        tasks = [asyncio.create_task(translator.translate(t, "ta")) for t in ("hello", "hello", " hello ")]
+        await asyncio.sleep(0.01)
+        in_flight = translator.stats()["in_flight"]
+        release.set()
+        out = await asyncio.gather(*tasks)
+        batch = await translator.translate_many(["hello", "bye", "bye"], ["ta", "ta"])
+        stats = translator.stats()
+        await translator.close()
+        return out, in_flight, batch, calls, stats
+
+    out, in_flight, batch, calls, stats = asyncio.run(main())
+    assert out == ["HELLO"] * 3 and in_flight == 1
+    assert batch == {"hello": {"ta": "HELLO"}, "bye": {"ta": "BYE"}}
+    assert calls == ["hello", "bye"]  # the batch's "hello" came from the cache
+    assert stats["coalesced"] == 2 and stats["upstream_calls"] == 2
+
+
+def test_waiter_takes_over_when_the_owner_is_cancelled():
+    async def main():
+        release, calls = asyncio.Event(), []
+        translator = Translator(TranslationCache(path=""))
+        translator._client = httpx.AsyncClient(transport=httpx.MockTransport(_slow_upstream(release, calls)))
+        owner = asyncio.create_task(translator.translate("hello", "ta"))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(translator.translate("hello", "ta"))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        await asyncio.sleep(0.01)
+        release.set()
+        out = await waiter
+        await translator.close()
+        return out, calls, owner.cancelled()
+
+    out, calls, cancelled = asyncio.run(main())
+    assert cancelled and out == "HELLO"
+    assert calls == ["hello", "hello"]
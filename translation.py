@@ -0,0 +1,219 @@
+# translation.py
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+MYMEMORY_URL = "https://api.mymemory.translated.net/get"
+
+CACHE_PATH = os.getenv("TRANSLATE_CACHE_PATH", "translate_cache.db")
+CACHE_SIZE = int(os.getenv("TRANSLATE_CACHE_SIZE", "5000"))          # in-memory entries
+CACHE_DISK_ROWS = int(os.getenv("TRANSLATE_CACHE_DISK_ROWS", "200000"))
+CACHE_TTL = int(os.getenv("TRANSLATE_CACHE_TTL", str(30 * 24 * 3600)))  # seconds
+UPSTREAM_CONNECTIONS = int(os.getenv("TRANSLATE_UPSTREAM_CONNECTIONS", "20"))
+UPSTREAM_TIMEOUT = float(os.getenv("TRANSLATE_UPSTREAM_TIMEOUT", "10"))
+
+
+class TranslationCache:
+    """Memory LRU in front of a SQLite table; both tiers honour the same TTL.
+
+    get() and set() are coroutines: the memory tier answers on the event loop,
+    and SQLite reads and writes run in a worker thread under their own lock, so
+    a slow disk never holds up memory hits.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_items: int = CACHE_SIZE,
+                 max_rows: int = CACHE_DISK_ROWS, ttl: int = CACHE_TTL):
+        self.max_items = max_items
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self._mem: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()     # memory tier and counters
+        self._db_lock = threading.Lock()  # the SQLite connection
+        self._writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS translations ("
+                    " lang TEXT NOT NULL, text TEXT NOT NULL, translated TEXT NOT NULL,"
+                    " created_at REAL NOT NULL, PRIMARY KEY (lang, text))"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS translations_created ON translations(created_at)")
+            except sqlite3.Error:
+                self._db = None  # disk tier is best-effort; memory tier still works
+
+    @staticmethod
+    def key(text: str, lang: str) -> Tuple[str, str]:
+        return (lang.strip().lower(), text.strip())
+
+    async def get(self, text: str, lang: str) -> Optional[str]:
+        k = self.key(text, lang)
+        now = time.time()
+        with self._lock:
+            hit = self._mem.get(k)
+            if hit is not None:
+                if now - hit[1] < self.ttl:
+                    self._mem.move_to_end(k)
+                    self.hits += 1
+                    return hit[0]
+                del self._mem[k]
+        row = await asyncio.to_thread(self._read_disk, k) if self._db is not None else None
+        with self._lock:
+            if row and now - row[1] < self.ttl:
+                self._remember(k, row[0], row[1])
+                self.disk_hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    async def set(self, text: str, lang: str, translated: str) -> None:
+        k = self.key(text, lang)
+        now = time.time()
+        with self._lock:
+            self._remember(k, translated, now)
+        if self._db is not None:
+            await asyncio.to_thread(self._write_disk, k, translated, now)
+
+    def _read_disk(self, k: Tuple[str, str]) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            try:
+                return self._db.execute(
+                    "SELECT translated, created_at FROM translations WHERE lang=? AND text=?", k
+                ).fetchone()
+            except sqlite3.Error:
+                return None
+
+    def _write_disk(self, k: Tuple[str, str], translated: str, now: float) -> None:
+        with self._db_lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO translations(lang, text, translated, created_at) VALUES (?,?,?,?)",
+                    (k[0], k[1], translated, now),
+                )
+                self._writes += 1
+                if self._writes % 500 == 0:
+                    self._evict_disk(now)
+            except sqlite3.Error:
+                pass
+
+    def _remember(self, k: Tuple[str, str], value: str, created_at: float) -> None:
+        self._mem[k] = (value, created_at)
+        self._mem.move_to_end(k)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    def _evict_disk(self, now: float) -> None:
+        self._db.execute("DELETE FROM translations WHERE created_at < ?", (now - self.ttl,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM translations").fetchone()
+        if count > self.max_rows:
+            self._db.execute(
+                "DELETE FROM translations WHERE rowid IN ("
+                " SELECT rowid FROM translations ORDER BY created_at ASC LIMIT ?)",
+                (count - self.max_rows,),
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_items": len(self._mem),
+            }
+
+
+class Translator:
+    """Cached MyMemory client; identical (text, lang) lookups in flight share one request."""
+
+    def __init__(self, cache: TranslationCache, max_connections: int = UPSTREAM_CONNECTIONS,
+                 timeout: float = UPSTREAM_TIMEOUT):
+        self.cache = cache
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _fetch(self, text: str, lang: str) -> str:
+        self.upstream_calls += 1
+        r = await self._http().get(MYMEMORY_URL, params={"q": text, "langpair": f"en|{lang}"})
+        r.raise_for_status()  # an error page is never a translation to cache
+        res = r.json()
+        out = res.get("responseData", {}).get("translatedText", "") or ""
+        # only cache real answers; quota warnings / errors come back with another status
+        if out and str(res.get("responseStatus", "")) == "200":
+            await self.cache.set(text, lang, out)
+        return out
+
+    async def translate(self, text: str, lang: str) -> str:
+        # normalise once: the cache key and the upstream query must be the same string
+        text, lang = text.strip(), lang.strip().lower()
+        cached = await self.cache.get(text, lang)
+        if cached is not None:
+            return cached
+        k = self.cache.key(text, lang)
+        pending = self._inflight.get(k)
+        if pending is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if pending.cancelled():  # the owning request went away; take over
+                    return await self.translate(text, lang)
+                raise
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[k] = fut
+        try:
+            out = await self._fetch(text, lang)
+            fut.set_result(out)
+            return out
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved when nobody else was waiting
+            raise
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        finally:
+            self._inflight.pop(k, None)
+
+    async def translate_many(self, texts: Iterable[str], langs: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        texts = list(dict.fromkeys(t for t in texts if t and t.strip()))
+        langs = list(dict.fromkeys(l for l in langs if l))
+        pairs: List[Tuple[str, str]] = [(t, l) for t in texts for l in langs]
+        results = await asyncio.gather(*(self.translate(t, l) for t, l in pairs), return_exceptions=True)
+        out: Dict[str, Dict[str, str]] = {t: {} for t in texts}
+        for (t, l), r in zip(pairs, results):
+            out[t][l] = "" if isinstance(r, BaseException) else r
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.cache.stats(), "upstream_calls": self.upstream_calls,
+                "coalesced": self.coalesced, "in_flight": len(self._inflight)}